@@ -0,0 +1,136 @@
+from GMS import SceneTracer
+
+from typing import Any, Optional
+
+import hashlib
+import pickle
+import shutil
+import os
+
+
+class ArtifactCache:
+    """
+    Content-addressed on disk cache of intermediate results of decompile (inflated GMS body, geoms table, decoded PRP
+    instructions, scene dump).
+
+    Artifact is stored as file '<kind>-<key>' where key is digest of contents of all inputs of the artifact (see
+    digest_file and key). Reading artifact marks it as recently used; when total size of cache exceeds max_size the
+    least recently used artifacts are removed.
+    """
+
+    # Bump when format of any artifact is changed, so old artifacts are never read
+    FORMAT_VERSION: int = 1
+
+    DEFAULT_DIR: str = os.path.join(os.path.expanduser('~'), '.cache', 'gmstool')
+    DEFAULT_MAX_SIZE: int = 1 << 30
+
+    def __init__(self, cache_dir: str = DEFAULT_DIR, max_size: int = DEFAULT_MAX_SIZE,
+                 tracer: Optional[SceneTracer] = None):
+        self._cache_dir: str = cache_dir
+        self._max_size: int = max_size
+        self._tracer: SceneTracer = tracer if tracer is not None else SceneTracer()
+        os.makedirs(self._cache_dir, exist_ok=True)
+
+    @staticmethod
+    def digest_file(path: str) -> str:
+        digest = hashlib.sha1()
+        with open(path, "rb") as input_file:
+            for chunk in iter(lambda: input_file.read(1 << 20), b''):
+                digest.update(chunk)
+
+        return digest.hexdigest()
+
+    @staticmethod
+    def key(*digests: str) -> str:
+        """Key of artifact made from digests of its inputs"""
+        return hashlib.sha1(f"{ArtifactCache.FORMAT_VERSION}:{':'.join(digests)}".encode("ascii")).hexdigest()
+
+    def get(self, kind: str, key: str) -> Optional[bytes]:
+        artifact_path: Optional[str] = self._use(kind, key)
+        if artifact_path is None:
+            return None
+
+        with open(artifact_path, "rb") as artifact_file:
+            return artifact_file.read()
+
+    def put(self, kind: str, key: str, data):
+        self._store(kind, key, lambda artifact_file: artifact_file.write(data))
+
+    def get_object(self, kind: str, key: str) -> Optional[Any]:
+        artifact_path: Optional[str] = self._use(kind, key)
+        if artifact_path is None:
+            return None
+
+        try:
+            with open(artifact_path, "rb") as artifact_file:
+                return pickle.load(artifact_file)
+        except (EOFError, ValueError, TypeError, AttributeError, pickle.UnpicklingError) as ex:
+            self._tracer.error(f"Artifact {artifact_path} is broken and will be removed. Reason: {ex}")
+            os.remove(artifact_path)
+            return None
+
+    def put_object(self, kind: str, key: str, value: Any):
+        self._store(kind, key,
+                    lambda artifact_file: pickle.dump(value, artifact_file, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def get_file(self, kind: str, key: str, out_path: str) -> bool:
+        """Copy artifact to file. Returns False when there is no such artifact"""
+        artifact_path: Optional[str] = self._use(kind, key)
+        if artifact_path is None:
+            return False
+
+        shutil.copyfile(artifact_path, out_path)
+        return True
+
+    def put_file(self, kind: str, key: str, in_path: str):
+        with open(in_path, "rb") as in_file:
+            self._store(kind, key, lambda artifact_file: shutil.copyfileobj(in_file, artifact_file))
+
+    def _path(self, kind: str, key: str) -> str:
+        return os.path.join(self._cache_dir, f"{kind}-{key}")
+
+    def _use(self, kind: str, key: str) -> Optional[str]:
+        """Path of artifact (which is marked as recently used) or None when artifact is not cached"""
+        artifact_path: str = self._path(kind, key)
+        try:
+            os.utime(artifact_path)
+        except FileNotFoundError:
+            return None
+
+        return artifact_path
+
+    def _store(self, kind: str, key: str, write):
+        # Write whole artifact aside first, so readers never see partially written artifact
+        artifact_path: str = self._path(kind, key)
+        temp_path: str = f"{artifact_path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, "wb") as artifact_file:
+                write(artifact_file)
+
+            os.replace(temp_path, artifact_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        self._evict()
+
+    def _evict(self):
+        artifacts: [tuple] = []
+        total_size: int = 0
+        with os.scandir(self._cache_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and not entry.name.endswith('.tmp'):
+                    stat = entry.stat()
+                    artifacts.append((stat.st_mtime, stat.st_size, entry.path))
+                    total_size += stat.st_size
+
+        artifacts.sort()
+        for _, size, artifact_path in artifacts:
+            if total_size <= self._max_size:
+                break
+
+            try:
+                os.remove(artifact_path)
+                total_size -= size
+            except FileNotFoundError:
+                pass
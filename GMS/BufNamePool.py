@@ -0,0 +1,60 @@
+from typing import Optional
+
+import mmap
+import sys
+
+
+class BufNamePool:
+    """
+    Names of geoms which are stored in BUF file as C strings. Name is decoded once per offset (many geoms share their
+    names), names are interned. Pool works over bytes or memory-mapped BUF file (see map_file)
+    """
+
+    def __init__(self, buf_buffer):
+        self._buffer = buf_buffer
+        self._names: dict = dict()
+        self._geoms_by_name: Optional[dict] = None
+
+    @staticmethod
+    def map_file(buf_path: str):
+        """Memory-mapped contents of BUF file (read-only). Empty file can't be mapped, its contents is empty bytes"""
+        with open(buf_path, "rb") as buf_file:
+            try:
+                return mmap.mmap(buf_file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                return bytes()
+
+    def name_at(self, offset: int) -> str:
+        name: Optional[str] = self._names.get(offset)
+        if name is None:
+            end: int = self._buffer.find(b"\x00", offset)
+            if end < 0:
+                raise RuntimeError(f"Name at offset 0x{offset:X} of BUF is not terminated")
+
+            name = sys.intern(self._buffer[offset:end].decode("latin-1"))
+            self._names[offset] = name
+
+        return name
+
+    def index_geoms(self, name_offsets: [int]):
+        """Build lookup from name to geoms. name_offsets holds offset of name of each geom (see GeomStore)"""
+        geoms_by_name: dict = dict()
+        for geom, offset in enumerate(name_offsets):
+            geoms_by_name.setdefault(self.name_at(offset), []).append(geom)
+
+        self._geoms_by_name = geoms_by_name
+
+    def geoms_named(self, name: str) -> [int]:
+        """Indices of geoms with name (requires index_geoms)"""
+        if self._geoms_by_name is None:
+            raise RuntimeError("Geoms are not indexed by name yet")
+
+        return self._geoms_by_name.get(name, [])
+
+    @property
+    def geoms_indexed(self) -> bool:
+        return self._geoms_by_name is not None
+
+    @property
+    def buffer(self):
+        return self._buffer
@@ -1,86 +1,333 @@
-from PRP import PRPReader
+from PRP import PRPReader, PRPInstruction, PRPInstructionStore, PRPInstructionStream, PRPStructureIndex, \
+    PRPSidecarIndex
 
 from .GeomTable import GeomTable
+from .GeomStore import GeomStore
 from .GeomStats import GeomStats
 from .GeomHeader import GeomHeader
+from .BufNamePool import BufNamePool
 from .GeomPropertiesVisitor import GeomPropertiesVisitor
+from .PhaseProfiler import PhaseProfiler
+from .SceneTracer import SceneTracer
+from .ArtifactCache import ArtifactCache
 
 from GMS.TDB.TypeDataBase import TypeDataBase
 
-from typing import Optional, Any
+from typing import Optional, Any, Sequence
+from concurrent.futures import ProcessPoolExecutor
 
+import multiprocessing
+import mmap
 import logging
+import os
 import struct
 import json
 import zlib
 
 
 class GameScene:
-    def __init__(self, gms_path: str, buf_path: str, prp_path: str, tdb_path: str):
+    # Size of compressed GMS data which is passed to inflater at once and max size of inflated data it returns
+    INFLATE_CHUNK_SIZE: int = 1 << 16
+    INFLATE_OUTPUT_SIZE: int = 1 << 18
+
+    # Scene of parallel decompile worker process (inherited by forked workers or loaded by worker initializer)
+    _worker_scene: Optional['GameScene'] = None
+
+    def __init__(self, gms_path: str, buf_path: str, prp_path: str, tdb_path: str, streaming: bool = False,
+                 write_prp_index: bool = False, jobs: int = 1, profiler: Optional[PhaseProfiler] = None,
+                 tdb: Optional[TypeDataBase] = None, cache: Optional[ArtifactCache] = None,
+                 tracer: Optional[SceneTracer] = None):
+        """
+        tdb is already loaded types database which could be shared between scenes (it's loaded from tdb_path
+        otherwise). With cache results of stages are taken from cache when their inputs are not changed. tracer
+        receives messages of scene and its visitors (messages of INFO level and above are printed by default)
+        """
         self._gms_path: str = gms_path
         self._buf_path: str = buf_path
         self._prp_path: str = prp_path
         self._tdb_path: str = tdb_path
 
-        self._gms_buffer: bytes = bytes()
+        self._gms_buffer: memoryview = memoryview(bytes())
         self._buf_buffer: bytes = bytes()
         self._gms_geom_table: Optional[GeomTable] = None
         self._gms_geom_stats: Optional[GeomStats] = None
 
         self._prp_reader: PRPReader = PRPReader(prp_path)
-        self._tdb: TypeDataBase = TypeDataBase(tdb_path)
+        self._prp_streaming: bool = streaming
+        self._prp_write_index: bool = write_prp_index
+        self._prp_instructions: Optional[Sequence[PRPInstruction]] = None
+        self._tdb: TypeDataBase = tdb if tdb is not None else TypeDataBase(tdb_path)
+        self._jobs: int = jobs
+        self._profiler: PhaseProfiler = profiler if profiler is not None else PhaseProfiler()
+        self._tracer: SceneTracer = tracer if tracer is not None else SceneTracer()
+
+        self._cache: Optional[ArtifactCache] = cache
+        self._input_digests: dict = dict()
 
         self._scene_props: Any = None
 
+    def __enter__(self) -> 'GameScene':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Unmap BUF file (scene could be used as context manager to do it). Visited properties stay available, but
+        names of geoms which were not accessed before are not available after it
+        """
+        if isinstance(self._buf_buffer, mmap.mmap):
+            self._buf_buffer.close()
+
+        self._buf_buffer = bytes()
+
     def prepare(self) -> bool:
+        if not self._load():
+            return False
+
+        # Prepare GMS body
+        return self._prepare_gms()
+
+    def visit_geom(self, geom: int) -> Optional[dict]:
+        """
+        Visit subtree of single geom (traversal index: ROOT is 0, geom N is described by N-1 entry of geoms table)
+        using sidecar index of PRP file (see PRPReader.write_index): PRP file is not parsed, only instructions of the
+        subtree are decoded. Returns None when PRP file has no valid index
+        """
+        index: Optional[PRPSidecarIndex] = self._prp_reader.load_index()
+        if index is None:
+            return None
+
+        if not self._load(parse_prp=False):
+            raise RuntimeError(f"Failed to load scene {self._gms_path}")
+
+        with self._profiler.phase('gms.geom_table') as phase:
+            self._gms_geom_table = self._make_geom_table_cached()
+            phase['items'] = len(self.geoms)
+
+        if index.geoms_count != len(self.geoms) + 1:
+            raise RuntimeError(f"Index of PRP file describes {index.geoms_count - 1} geoms, "
+                               f"but GMS file has {len(self.geoms)} geoms")
+
+        if not 0 < geom < index.geoms_count:
+            raise RuntimeError(f"Geom {geom} is out of range 1-{index.geoms_count - 1}")
+
+        with self._profiler.phase('prp.read_geom') as phase:
+            end_geom: int = geom + self.geoms.hierarchy.subtree_size(geom - 1)
+            instructions: PRPInstructionStore = self._prp_reader.read_geom_subtree(index, geom, end_geom)
+            phase['items'] = len(instructions)
+
+        with self._profiler.phase('scene.visit'):
+            visitor: GeomPropertiesVisitor = GeomPropertiesVisitor(self.geoms, self.properties, instructions,
+                                                                   self._tracer)
+            try:
+                return visitor.visit_geom(self.type_db, geom, 0)
+            except Exception as ex:
+                self._tracer.dump_flight_recorder(f"{type(ex).__name__} at instruction {visitor.current_instruction} "
+                                                  f"of geom {geom}: {ex}")
+                raise
+
+    def _load(self, parse_prp: bool = True) -> bool:
+        """Load GMS, BUF and types database. PRP file is parsed too unless parse_prp is False"""
         # Read GMS
         try:
-            # Load & decompress GMS body
-            with open(self._gms_path, "rb") as gms_file:
-                whole_gms: bytes = gms_file.read()
-                uncompressed_size, buffer_size, is_not_compressed = struct.unpack('<iib', whole_gms[0:9])
-                is_compressed = not is_not_compressed
-
-                if is_compressed:
-                    real_size: int = (uncompressed_size + 15) & 0xFFFFFFF0
-                    self._gms_buffer = zlib.decompress(whole_gms[9:], wbits=-15, bufsize=real_size)
-                else:
-                    self._gms_buffer = whole_gms[9:]
+            with self._profiler.phase('gms.inflate') as phase:
+                self._gms_buffer = self._read_gms_body_cached()
+                phase['bytes'] = len(self._gms_buffer)
         except Exception as of_ex:
-            print(f"Failed to open GMS file {self._gms_path}. Reason: {of_ex}")
+            self._tracer.error(f"Failed to open GMS file {self._gms_path}. Reason: {of_ex}")
             return False
 
         # Read BUF
         try:
-            with open(self._buf_path, "rb") as buf_file:
-                self._buf_buffer = buf_file.read()
+            with self._profiler.phase('buf.read') as phase:
+                self._buf_buffer = BufNamePool.map_file(self._buf_path)
+                phase['bytes'] = len(self._buf_buffer)
         except Exception as of_ex:
-            print(f"Failed to open BUF file {self._buf_path}. Reason: {of_ex}")
-            self._gms_buffer = bytes()
+            self._tracer.error(f"Failed to open BUF file {self._buf_path}. Reason: {of_ex}")
+            self._gms_buffer = memoryview(bytes())
             return False
 
         # Read properties
-        try:
-            self._prp_reader.parse()
-        except Exception as e:
-            print(f"Failed to prepare PRP file {self._prp_path}. Reason: {e}")
-            return False
+        if parse_prp:
+            try:
+                with self._profiler.phase('prp.parse') as phase:
+                    self._load_prp()
+                    phase['bytes'] = os.path.getsize(self._prp_path)
+                    phase['items'] = len(self._prp_instructions) if not self._prp_streaming else None
+            except Exception as e:
+                self._tracer.error(f"Failed to prepare PRP file {self._prp_path}. Reason: {e}")
+                return False
 
         # Prepare types database
-        if not self._tdb.load():
-            print(f"Failed to load types database from file {self._tdb_path}")
+        with self._profiler.phase('tdb.load'):
+            if not self._tdb.is_loaded and not self._tdb.load():
+                self._tracer.error(f"Failed to load types database from file {self._tdb_path}")
+                return False
+
+        return True
+
+    def _load_prp(self):
+        if self._prp_streaming:
+            # Instructions will be decoded while visiting, here we read header and first instruction only
+            self._prp_instructions = PRPInstructionStream(self._prp_reader.iter_instructions())
+            self._prp_instructions.prefetch()
+        else:
+            self._parse_prp_cached()
+            self._prp_instructions = self._prp_reader.instructions
+
+            if self._prp_write_index:
+                self._write_prp_index()
+
+    def _write_prp_index(self):
+        self._prp_reader.write_index()
+        self._tracer.info(f"PRP index saved to file {self._prp_reader.index_path}")
+
+    def _input_digest(self, path: str) -> str:
+        digest: Optional[str] = self._input_digests.get(path)
+        if digest is None:
+            digest = ArtifactCache.digest_file(path)
+            self._input_digests[path] = digest
+
+        return digest
+
+    def _read_gms_body_cached(self) -> memoryview:
+        if self._cache is None:
+            return GameScene.read_gms_body(self._gms_path)
+
+        key: str = ArtifactCache.key(self._input_digest(self._gms_path))
+        body: Optional[bytes] = self._cache.get('gms-body', key)
+        if body is not None:
+            return memoryview(body)
+
+        body_view: memoryview = GameScene.read_gms_body(self._gms_path)
+        self._cache.put('gms-body', key, body_view)
+        return body_view
+
+    def _parse_prp_cached(self):
+        if self._cache is None:
+            self._prp_reader.parse()
+            return
+
+        key: str = ArtifactCache.key(self._input_digest(self._prp_path))
+        parsed_state: Optional[dict] = self._cache.get_object('prp-instructions', key)
+        if parsed_state is not None:
+            self._prp_reader.restore_parsed_state(parsed_state)
+            return
+
+        self._prp_reader.parse()
+        self._cache.put_object('prp-instructions', key, self._prp_reader.parsed_state())
+
+    def _make_geom_table_cached(self) -> GeomTable:
+        if self._cache is None:
+            return GeomTable(self._gms_buffer, self._buf_buffer)
+
+        key: str = ArtifactCache.key(self._input_digest(self._gms_path))
+        columns: Optional[tuple] = self._cache.get_object('geom-table', key)
+        if columns is not None:
+            return GeomTable(self._gms_buffer, self._buf_buffer, GeomStore(self._gms_buffer, columns))
+
+        geom_table: GeomTable = GeomTable(self._gms_buffer, self._buf_buffer)
+        self._cache.put_object('geom-table', key, geom_table.store.columns)
+        return geom_table
+
+    def _dump_key(self) -> str:
+        """Key of scene dump in cache. Requires loaded types database"""
+        return ArtifactCache.key(self._input_digest(self._gms_path), self._input_digest(self._buf_path),
+                                 self._input_digest(self._prp_path), self._tdb.version)
+
+    def restore_dump(self, out_file: str) -> bool:
+        """
+        Save scene dump which was made by previous decompile of same inputs (GMS, BUF, PRP and types database) without
+        decompiling anything. PRP index is written too when it's requested (PRP is parsed or taken from cache for it).
+        Returns False when there is no such dump in cache (or cache is not used)
+        """
+        if self._cache is None:
             return False
 
-        # Prepare GMS body
-        return self._prepare_gms()
+        with self._profiler.phase('tdb.load'):
+            if not self._tdb.is_loaded and not self._tdb.load():
+                self._tracer.error(f"Failed to load types database from file {self._tdb_path}")
+                return False
+
+        with self._profiler.phase('scene.restore') as phase:
+            if not self._cache.get_file('scene-dump', self._dump_key(), out_file):
+                return False
+
+            phase['bytes'] = os.path.getsize(out_file)
+
+        self._tracer.info(f"Scene dump restored from cache to file {out_file}")
+        if self._prp_streaming or self._jobs > 1:
+            self._tracer.info("Scene was not decompiled, so streaming and parallel visiting options are not used")
+
+        if self._prp_write_index:
+            try:
+                with self._profiler.phase('prp.parse') as phase:
+                    self._parse_prp_cached()
+                    phase['bytes'] = os.path.getsize(self._prp_path)
+
+                self._write_prp_index()
+            except Exception as e:
+                self._tracer.error(f"Failed to save index of PRP file {self._prp_path}. Reason: {e}")
+                return False
+
+        return True
+
+    @staticmethod
+    def read_gms_body(gms_path: str) -> memoryview:
+        """
+        Load & decompress GMS body. File is memory-mapped and inflated chunk by chunk into buffer which is allocated
+        once, so whole compressed file is not copied. Mapping is closed before return (body which is not compressed
+        is copied out of it)
+        """
+        with open(gms_path, "rb") as gms_file:
+            whole_gms: mmap.mmap = mmap.mmap(gms_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            uncompressed_size, buffer_size, is_not_compressed = struct.unpack_from('<iib', whole_gms, 0)
+            is_compressed = not is_not_compressed
+
+            if not is_compressed:
+                return memoryview(whole_gms[9:])
+
+            real_size: int = (uncompressed_size + 15) & 0xFFFFFFF0
+            body: bytearray = bytearray(real_size)
+            body_size: int = 0
+            inflater = zlib.decompressobj(wbits=-15)
+
+            with memoryview(whole_gms) as compressed:
+                for chunk_begin in range(9, len(compressed), GameScene.INFLATE_CHUNK_SIZE):
+                    with compressed[chunk_begin:chunk_begin + GameScene.INFLATE_CHUNK_SIZE] as chunk:
+                        pending = chunk
+                        while pending and not inflater.eof:
+                            # Output is bounded too, so only small piece of inflated data exists besides body
+                            inflated: bytes = inflater.decompress(pending, GameScene.INFLATE_OUTPUT_SIZE)
+                            body[body_size:body_size + len(inflated)] = inflated
+                            body_size += len(inflated)
+                            pending = inflater.unconsumed_tail
+
+                    if inflater.eof:
+                        break
+
+            inflated = inflater.flush()
+            body[body_size:body_size + len(inflated)] = inflated
+            body_size += len(inflated)
+
+            if not inflater.eof:
+                raise zlib.error(f"GMS body of {gms_path} is truncated")
+
+            return memoryview(body)[:body_size]
+        finally:
+            whole_gms.close()
 
     def dump(self, out_file: str) -> bool:
         if self._scene_props is None:
             return False
 
         try:
-            with open(out_file, "w") as out_scene_file:
-                print("Dumping to json... (it's very slow process, cuz Python is so stupid)")
+            with self._profiler.phase('scene.dump') as phase, open(out_file, "w") as out_scene_file:
+                self._tracer.info("Dumping to json... (it's very slow process, cuz Python is so stupid)")
                 scene_dump: dict = dict()
                 scene_dump["flags"] = self._prp_reader.flags
                 scene_dump["is_raw"] = self._prp_reader.is_raw
@@ -88,19 +335,24 @@ class GameScene:
                 scene_dump["scene"] = self._scene_props
 
                 json.dump(scene_dump, out_scene_file, indent=2)
-                print(f"Scene dump saved to file {out_file} successfully!")
-                return True
+                phase['bytes'] = out_scene_file.tell()
+                self._tracer.info(f"Scene dump saved to file {out_file} successfully!")
         except IOError as ioe:
-            print(f"Failed to save scene file to {out_file}. IOError: {ioe}")
+            self._tracer.error(f"Failed to save scene file to {out_file}. IOError: {ioe}")
             return False
 
+        if self._cache is not None:
+            self._cache.put_file('scene-dump', self._dump_key(), out_file)
+
+        return True
+
     @property
     def properties(self) -> PRPReader:
         return self._prp_reader
 
     @property
-    def geoms(self) -> [GeomHeader]:
-        return self._gms_geom_table.entries
+    def geoms(self) -> GeomTable:
+        return self._gms_geom_table
 
     @property
     def geom_stats(self) -> GeomStats:
@@ -112,15 +364,107 @@ class GameScene:
 
     def _prepare_gms(self) -> bool:
         # Load entries
-        self._gms_geom_table = GeomTable(self._gms_buffer, self._buf_buffer)
-        self._gms_geom_stats = GeomStats(self._gms_buffer)
+        with self._profiler.phase('gms.geom_table') as phase:
+            self._gms_geom_table = self._make_geom_table_cached()
+            self._gms_geom_stats = GeomStats(self._gms_buffer)
+            phase['bytes'] = len(self._gms_buffer)
+            phase['items'] = len(self.geoms)
 
         # Load properties for each entry
-        visitor: GeomPropertiesVisitor = GeomPropertiesVisitor(self.geoms, self.properties)
-        visited_geoms = visitor.visit(self.type_db, 'ROOT', GeomPropertiesVisitor.ZROOM)
+        ignored_instructions: int
+        with self._profiler.phase('scene.visit') as phase:
+            if self._jobs > 1 and isinstance(self._prp_instructions, PRPInstructionStore):
+                visited_geoms, ignored_instructions = self._visit_geoms_parallel()
+            else:
+                visitor: GeomPropertiesVisitor = GeomPropertiesVisitor(self.geoms, self.properties,
+                                                                       self._prp_instructions, self._tracer)
+                try:
+                    visited_geoms = visitor.visit(self.type_db, 'ROOT', GeomPropertiesVisitor.ZROOM)
+                except Exception as ex:
+                    self._tracer.dump_flight_recorder(f"{type(ex).__name__} at instruction "
+                                                      f"{visitor.current_instruction}: {ex}")
+                    raise
+
+                if isinstance(self._prp_instructions, PRPInstructionStream):
+                    self._prp_instructions.drain()
+
+                ignored_instructions = visitor.total_instructions - visitor.current_instruction - 1
 
-        print(f" --- DECOMPILE FINISHED ({len(self.geoms)} GEOMS) --- ")
-        print(f" Ignored instructions: {visitor.total_instructions - visitor.current_instruction - 1} (0 - 1 is OK; More - FAILURE)")
+            phase['items'] = len(self._prp_instructions)
+
+        self._tracer.info(f" --- DECOMPILE FINISHED ({len(self.geoms)} GEOMS) --- ")
+        self._tracer.info(f" Ignored instructions: {ignored_instructions} (0 - 1 is OK; More - FAILURE)")
 
         self._scene_props = visited_geoms
         return True
+
+    def _visit_geoms_parallel(self) -> (dict, int):
+        """
+        Visit ROOT here and subtree of each top level geom in pool of processes. Subtrees are found by structure index,
+        results are merged in scene order. Returns visited ROOT and count of ignored instructions
+        """
+        structure: PRPStructureIndex = self._prp_instructions.structure
+
+        visitor: GeomPropertiesVisitor = GeomPropertiesVisitor(self.geoms, self.properties, self._prp_instructions,
+                                                               self._tracer)
+        try:
+            visited_root: dict = visitor.visit(self.type_db, 'ROOT', GeomPropertiesVisitor.ZROOM, visit_children=False)
+        except Exception as ex:
+            self._tracer.dump_flight_recorder(f"{type(ex).__name__} at instruction {visitor.current_instruction}: {ex}")
+            raise
+
+        top_level_geoms: [int] = []
+        geom: int = 1
+        while geom < structure.geoms_count:
+            top_level_geoms.append(geom)
+            geom += structure.geom_subtree_count(geom)
+
+        # Forked workers share already loaded scene, otherwise each worker loads scene by itself
+        context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+        chunk_size: int = max(1, len(top_level_geoms) // (self._jobs * 4))
+
+        GameScene._worker_scene = self
+        try:
+            with ProcessPoolExecutor(max_workers=self._jobs, mp_context=context, initializer=GameScene._init_worker,
+                                     initargs=(self._gms_path, self._buf_path, self._prp_path, self._tdb_path,
+                                               self._tracer.level, self._tracer.flight_recorder_size)) as pool:
+                for visited_geom in pool.map(GameScene._visit_geom_in_worker, top_level_geoms, chunksize=chunk_size):
+                    visited_root['children'].append(visited_geom)
+        finally:
+            GameScene._worker_scene = None
+
+        return visited_root, len(self._prp_instructions) - structure.geom_end(0) - 2
+
+    @staticmethod
+    def _init_worker(gms_path: str, buf_path: str, prp_path: str, tdb_path: str, trace_level: int,
+                     flight_recorder_size: int):
+        if GameScene._worker_scene is not None:
+            return
+
+        scene: GameScene = GameScene(gms_path, buf_path, prp_path, tdb_path,
+                                     tracer=SceneTracer(trace_level, flight_recorder_size))
+        if not scene._load():
+            raise RuntimeError(f"Failed to load scene {gms_path} in worker process")
+
+        scene._gms_geom_table = GeomTable(scene._gms_buffer, scene._buf_buffer)
+        GameScene._worker_scene = scene
+
+    @staticmethod
+    def _visit_geom_in_worker(geom: int) -> dict:
+        scene: GameScene = GameScene._worker_scene
+        structure: PRPStructureIndex = scene._prp_instructions.structure
+
+        visitor: GeomPropertiesVisitor = GeomPropertiesVisitor(scene.geoms, scene.properties, scene._prp_instructions,
+                                                               scene._tracer)
+        try:
+            visited_geom: dict = visitor.visit_geom(scene.type_db, geom, structure.geom_begin(geom))
+        except Exception as ex:
+            scene._tracer.dump_flight_recorder(f"{type(ex).__name__} at instruction {visitor.current_instruction} "
+                                               f"of geom {geom}: {ex}")
+            raise
+
+        if visitor.current_instruction != structure.geom_end(geom) + 1:
+            raise RuntimeError(f"Geom {geom} was visited until instruction {visitor.current_instruction}, "
+                               f"but its subtree ends at {structure.geom_end(geom)}")
+
+        return visited_geom
@@ -15,15 +15,19 @@ class GeomHeader:
 
     @staticmethod
     def _read_c_string_at(where: bytes, offset: int) -> str:
-        chars: [str] = []
-        current_offset: int = offset
-        while True:
-            c = chr(where[current_offset])
-            current_offset += 1
-            if c == chr(0):
-                return "".join(chars)
-
-            chars.append(c)
+        end: int = where.find(b"\x00", offset)
+        if end < 0:
+            raise IndexError(f"C string at offset 0x{offset:X} is not terminated")
+
+        return where[offset:end].decode("latin-1")
+
+    @staticmethod
+    def from_store(store, geom: int, names) -> 'GeomHeader':
+        """Header of geom which is read to columnar store (see GeomStore), name is taken from BufNamePool"""
+        header: GeomHeader = GeomHeader(store.offset(geom), store.unk4(geom))
+        header._geom_base = store.geom_base(geom)
+        header._name = names.name_at(header._geom_base.name_offset_in_buf)
+        return header
 
     def from_buffer(self, gms_buffer: bytes, buf_buffer: bytes):
         self_address: int = 4 * (self._offset & 0xFFFFFF)
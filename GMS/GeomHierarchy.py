@@ -0,0 +1,117 @@
+from GMS import GeomStore, BufNamePool
+
+from typing import Iterator, Optional
+from array import array
+
+
+class GeomHierarchy:
+    """
+    Parent/children relations of geoms restored from depth levels of geoms table (see GeomHeader.depth_level).
+
+    Geoms are stored in pre-order (parent is followed by its subtree), so relations are restored in one pass with
+    stack of open geoms, and subtree of any geom is contiguous range of geoms. Top level geoms have no parent (-1),
+    they are children of ROOT which is not presented in geoms table.
+    """
+
+    NO_GEOM: int = -1
+
+    def __init__(self, store: GeomStore, names: Optional[BufNamePool] = None):
+        self._store: GeomStore = store
+        self._names: Optional[BufNamePool] = names
+
+        geoms_count: int = len(store)
+        depth_levels: array = store.depth_levels
+        self._parents: array = array('i', [GeomHierarchy.NO_GEOM]) * geoms_count
+        self._subtree_sizes: array = array('i', [1]) * geoms_count
+        self._next_siblings: array = array('i', [GeomHierarchy.NO_GEOM]) * geoms_count
+        self._geoms_by_type: Optional[dict] = None
+
+        # Geoms whose subtrees are not closed yet and last closed child of each depth
+        open_geoms: [int] = []
+        last_children: dict = dict()
+
+        for geom, depth_level in enumerate(depth_levels):
+            while open_geoms and depth_levels[open_geoms[-1]] >= depth_level:
+                closed_geom: int = open_geoms.pop()
+                self._subtree_sizes[closed_geom] = geom - closed_geom
+
+            if open_geoms and depth_levels[open_geoms[-1]] != depth_level - 1:
+                raise RuntimeError(f"Depth level of geom {geom} ({depth_level}) is deeper than child of geom "
+                                   f"{open_geoms[-1]} ({depth_levels[open_geoms[-1]]})")
+
+            parent: int = open_geoms[-1] if open_geoms else GeomHierarchy.NO_GEOM
+            self._parents[geom] = parent
+
+            previous_sibling: Optional[int] = last_children.get(parent)
+            if previous_sibling is not None:
+                self._next_siblings[previous_sibling] = geom
+
+            last_children[parent] = geom
+            open_geoms.append(geom)
+
+        for open_geom in open_geoms:
+            self._subtree_sizes[open_geom] = geoms_count - open_geom
+
+    def __len__(self) -> int:
+        return len(self._parents)
+
+    def parent(self, geom: int) -> int:
+        return self._parents[geom]
+
+    def first_child(self, geom: int) -> int:
+        return geom + 1 if self._subtree_sizes[geom] > 1 else GeomHierarchy.NO_GEOM
+
+    def next_sibling(self, geom: int) -> int:
+        return self._next_siblings[geom]
+
+    def subtree_size(self, geom: int) -> int:
+        """Count of geoms in subtree of geom (including itself)"""
+        return self._subtree_sizes[geom]
+
+    def children(self, geom: int) -> Iterator[int]:
+        child: int = self.first_child(geom)
+        while child != GeomHierarchy.NO_GEOM:
+            yield child
+            child = self._next_siblings[child]
+
+    def descendants(self, geom: int) -> range:
+        return range(geom + 1, geom + self._subtree_sizes[geom])
+
+    def ancestors(self, geom: int) -> Iterator[int]:
+        parent: int = self._parents[geom]
+        while parent != GeomHierarchy.NO_GEOM:
+            yield parent
+            parent = self._parents[parent]
+
+    def top_level_geoms(self) -> Iterator[int]:
+        geom: int = 0
+        while geom < len(self._parents):
+            yield geom
+            geom += self._subtree_sizes[geom]
+
+    def geoms_of_type(self, type_id: int) -> [int]:
+        if self._geoms_by_type is None:
+            geoms_by_type: dict = dict()
+            for geom, geom_type_id in enumerate(self._store.type_ids):
+                geoms_by_type.setdefault(geom_type_id, []).append(geom)
+
+            self._geoms_by_type = geoms_by_type
+
+        return self._geoms_by_type.get(type_id, [])
+
+    def geoms_named(self, name: str) -> [int]:
+        if self._names is None:
+            raise RuntimeError("Names of geoms are not available")
+
+        if not self._names.geoms_indexed:
+            self._names.index_geoms(self._store.name_offsets)
+
+        return self._names.geoms_named(name)
+
+    @property
+    def parents(self) -> array:
+        return self._parents
+
+    @property
+    def subtree_sizes(self) -> array:
+        return self._subtree_sizes
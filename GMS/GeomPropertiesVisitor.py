@@ -1,22 +1,25 @@
-from GMS import GeomHeader
-from PRP import PRPReader, PRPOpCode
+from GMS import GeomHeader, SceneTracer
+from PRP import PRPReader, PRPOpCode, PRPInstruction, PRPInstructionStream
 
 import GMS.TDB as TDB
 
-from typing import Optional
+from typing import Optional, Sequence
 from ctypes import c_ulong
 
-import inspect
-
 
 class GeomPropertiesVisitor:
     ZROOM = 0x100021
 
-    def __init__(self, geoms: [GeomHeader], prp: PRPReader):
+    def __init__(self, geoms: [GeomHeader], prp: PRPReader, instructions: Optional[Sequence[PRPInstruction]] = None,
+                 tracer: Optional[SceneTracer] = None):
         self._geoms: [GeomHeader] = geoms
         self._prp: PRPReader = prp
+        # Instructions could be provided as PRPInstructionStream to visit them while decoding
+        self._instructions: Sequence[PRPInstruction] = instructions if instructions is not None else prp.instructions
+        self._is_stream: bool = isinstance(self._instructions, PRPInstructionStream)
         self._instruction_index = 0
         self._geom_index = -1
+        self._tracer: SceneTracer = tracer if tracer is not None else SceneTracer()
 
     @property
     def current_instruction(self) -> int:
@@ -24,16 +27,73 @@ class GeomPropertiesVisitor:
 
     @property
     def total_instructions(self) -> int:
-        return len(self._prp.instructions)
+        return len(self._instructions)
+
+    def visit_geom(self, tdb: TDB.TypeDataBase.TypeDataBase, geom: int, instruction_index: int) -> dict:
+        """
+        Visit subtree of single geom. Geom is given by traversal index (ROOT is 0, so geom N is described by N-1 entry
+        of geoms table) and its properties must begin at instruction_index (see PRPStructureIndex.geom_begin)
+        """
+        self._instruction_index = instruction_index
+        self._geom_index = geom - 1
+
+        geom_header: GeomHeader = self._geoms[self._geom_index]
+        return self.visit(tdb, geom_header.name, geom_header.geom_base.type_id)
+
+    def visit(self, tdb: TDB.TypeDataBase.TypeDataBase, geom_name: str = 'ROOT', geom_type: int = ZROOM,
+              visit_children: bool = True) -> dict:
+        """
+        Visit geom which properties begin at current instruction and all its children. When visit_children is False
+        visiting stops at children region of the geom (current instruction is left on it) and 'children' stays empty.
+
+        Hierarchy is walked with explicit stack of children regions which are not visited yet (children of each geom
+        follow its controllers region), so depth of hierarchy is not limited by recursion
+        """
+        result: dict = self._visit_geom_properties(tdb, geom_name, geom_type)
+        if not visit_children:
+            return result
+
+        geoms: [GeomHeader] = self._geoms
+
+        # Each entry is [children of geom, count of its children which are not visited yet]
+        stack: [list] = []
+        children_count: int = self._enter_children()
+        if children_count > 0:
+            stack.append([result['children'], children_count])
+
+        while stack:
+            region: list = stack[-1]
+            region[1] -= 1
+            if region[1] == 0:
+                stack.pop()
+
+            current_geom: GeomHeader = geoms[self._geom_index]
+            visited_geom: dict = self._visit_geom_properties(tdb, current_geom.name, current_geom.geom_base.type_id)
+            region[0].append(visited_geom)
+
+            children_count = self._enter_children()
+            if children_count > 0:
+                stack.append([visited_geom['children'], children_count])
+
+        return result
 
-    def visit(self, tdb: TDB.TypeDataBase.TypeDataBase, geom_name: str = 'ROOT', geom_type: int = ZROOM) -> dict:
+    def _visit_geom_properties(self, tdb: TDB.TypeDataBase.TypeDataBase, geom_name: str, geom_type: int) -> dict:
+        """
+        Visit properties and controllers of geom which begin at current instruction. Current instruction is left on
+        children region of the geom, 'children' of result is empty
+        """
         if geom_type < 0:
             # Here we need to convert this value properly
             # TODO: Fix this bug on GeomHeader parser level!
             geom_type = c_ulong(geom_type).value
 
-        print("Visit {} 0x{:X} (IP: {}, GI: {})".format(geom_name, geom_type, self._instruction_index, self._geom_index))
-        from PRP import PRPInstruction, PRPOpCode
+        tracer: SceneTracer = self._tracer
+        if tracer.record is not None:
+            tracer.record(("Visit {} 0x{:X} (IP: {}, GI: {})", geom_name, geom_type, self._instruction_index,
+                           self._geom_index))
+
+        if tracer.debug_enabled:
+            tracer.debug(f"Visit {geom_name} 0x{geom_type:X} (IP: {self._instruction_index}, GI: {self._geom_index})")
 
         result: dict = dict()
 
@@ -42,7 +102,7 @@ class GeomPropertiesVisitor:
             raise RuntimeError("Failed to visit type 0x{:X} of name {}. No type in database".format(geom_type, geom_name))
 
         # We need to map next N instructions to our "properties"
-        instructions: [PRPInstruction] = self._prp.instructions
+        instructions: Sequence[PRPInstruction] = self._instructions
 
         assert instructions[self._instruction_index].op_code == PRPOpCode.BeginObject or \
                instructions[self._instruction_index].op_code == PRPOpCode.BeginNamedObject
@@ -113,29 +173,30 @@ class GeomPropertiesVisitor:
         else:
             self._instruction_index += 1
 
-        # And here we ready to go deeper inside entity children
-        # ---- READ CHILDREN GEOMS ----
+        # Properties and controllers of this geom will not be visited again
+        if self._is_stream:
+            instructions.release(self._instruction_index)
+
         assert instructions[self._instruction_index].op_code == PRPOpCode.Container, "Expected children region"
+        return result
+
+    def _enter_children(self) -> int:
+        """Move from children region of geom to its first child. Returns count of children"""
+        # ---- READ CHILDREN GEOMS ----
+        instructions: Sequence[PRPInstruction] = self._instructions
         child_num: int = instructions[self._instruction_index].op_data['length']
-        if child_num > 0:
-            self._instruction_index += 1  # Jump to first object declaration
+        self._instruction_index += 1  # Jump to first object declaration (or next entry when there are no children)
 
+        if child_num > 0:
             assert instructions[self._instruction_index].op_code == PRPOpCode.BeginObject or \
                    instructions[self._instruction_index].op_code == PRPOpCode.BeginNamedObject, \
                    f"Expected begin object or begin named object, but got {instructions[self._instruction_index].op_code} (instruction index {self._instruction_index}, geom index {self._geom_index})"
 
-            for geom_idx in range(0, child_num):
-                instruction_index_before_visit_next_child: int = self._instruction_index
-                current_geom: GeomHeader = self._geoms[self._geom_index]
-                visited_geom = self.visit(tdb, current_geom.name, current_geom.geom_base.type_id)
-                result['children'].append(visited_geom)
-        else:
-            self._instruction_index += 1
+        return child_num
 
-        # Here we working with next entry in the same layer (?)
-        return result
-    
     def _next_geom(self):
-        cl_line_no, cl_callee = inspect.stack()[1][2:4]
-        print(f" [from {cl_callee} at {cl_line_no}] Switch geom {self._geom_index} -> {self._geom_index + 1}")
+        if self._tracer.trace_enabled:
+            self._tracer.trace(f" Switch geom {self._geom_index} -> {self._geom_index + 1} "
+                               f"(IP: {self._instruction_index})")
+
         self._geom_index += 1
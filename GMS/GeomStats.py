@@ -4,22 +4,20 @@ from GMS import GeomStat
 
 
 class GeomStats:
-    def __init__(self, gms_buffer: bytes):
-        stats_begin_at: int = struct.unpack('<i', gms_buffer[0x10:0x14])[0]
-        stats_data: bytes = gms_buffer[stats_begin_at:]
-
-        self._stats = []
+    RECORD = struct.Struct('<ili')  # type id, count, unk8
 
-        stats_count: int = struct.unpack('<i', stats_data[0:4])[0]
-        stat_idx: int
+    def __init__(self, gms_buffer: bytes):
+        stats_begin_at: int = struct.unpack_from('<i', gms_buffer, 0x10)[0]
+        stats_count: int = struct.unpack_from('<i', gms_buffer, stats_begin_at)[0]
 
-        for stat_idx in range(0, stats_count):
-            type_id: int
-            count: int
-            unk8: int
-            type_id, count, unk8 = struct.unpack('<ili', stats_data[4 + (stat_idx * 0xC): 4 + ((stat_idx + 1) * 0xC)])
-            self._stats.append(GeomStat(type_id, count, unk8))
+        records_begin_at: int = stats_begin_at + 4
+        records = memoryview(gms_buffer)[records_begin_at:records_begin_at + stats_count * GeomStats.RECORD.size]
+        self._stats = [GeomStat(type_id, count, unk8) for type_id, count, unk8 in GeomStats.RECORD.iter_unpack(records)]
 
     @property
     def stats(self) -> [GeomStat]:
         return self._stats
+
+    def counts_by_type(self) -> dict:
+        """Count of geoms of each type id (as it's stored in GMS)"""
+        return {stat.type_id: stat.count for stat in self._stats}
@@ -0,0 +1,123 @@
+from GMS import GeomBase
+
+from typing import Optional
+from collections import Counter
+from dataclasses import fields
+from array import array
+
+import struct
+import sys
+
+
+class GeomStore:
+    """
+    Columnar store of geoms table of GMS body: words of table entries and all ZGeomBase records (0x60 bytes each) are
+    kept as flat arrays of int32, so table is read at once and per-geom objects (see GeomBase) are created on demand
+    only. Columns (type_id, control, depth_level, ...) are built once and cached.
+    """
+
+    GEOM_BASE_SIZE: int = 0x60
+    GEOM_BASE_WORDS: int = GEOM_BASE_SIZE // 4
+    FIELDS: [str] = [field.name for field in fields(GeomBase)]
+
+    def __init__(self, gms_buffer, columns: Optional[tuple] = None):
+        """columns are (offsets, unk4, bases) of already read store (see columns property)"""
+        self._gms_buffer = gms_buffer
+        self._columns: dict = dict()
+
+        if columns is not None:
+            self._offsets, self._unk4, self._bases = columns
+            return
+
+        table_offset: int = struct.unpack_from('<i', gms_buffer, 0)[0]
+        entries_count: int = struct.unpack_from('<i', gms_buffer, table_offset)[0]
+
+        # Table entry: offset of geom base (in words) with depth level in upper bits, unknown int32
+        table: array = GeomStore._read_words(gms_buffer, table_offset + 4, entries_count * 2)
+        self._offsets: array = table[0::2]
+        self._unk4: array = table[1::2]
+        self._bases: array = self._read_bases()
+
+    def _read_bases(self) -> array:
+        addresses: [int] = [4 * (offset & 0xFFFFFF) for offset in self._offsets]
+        if not addresses:
+            return array('i')
+
+        # Usually geom bases follow each other in order of table, then they are read by single copy
+        first: int = addresses[0]
+        if addresses == list(range(first, first + len(addresses) * GeomStore.GEOM_BASE_SIZE, GeomStore.GEOM_BASE_SIZE)):
+            return GeomStore._read_words(self._gms_buffer, first, len(addresses) * GeomStore.GEOM_BASE_WORDS)
+
+        view: memoryview = memoryview(self._gms_buffer)
+        gathered: bytes = b"".join(view[address:address + GeomStore.GEOM_BASE_SIZE] for address in addresses)
+        return GeomStore._read_words(gathered, 0, len(addresses) * GeomStore.GEOM_BASE_WORDS)
+
+    @staticmethod
+    def _read_words(buffer, offset: int, count: int) -> array:
+        words: array = array('i')
+        words.frombytes(memoryview(buffer)[offset:offset + count * 4])
+        if len(words) != count:
+            raise RuntimeError(f"GMS body is truncated: expected {count} words at offset 0x{offset:X}")
+
+        if sys.byteorder != 'little':
+            words.byteswap()
+
+        return words
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def column(self, field: str) -> array:
+        """All values of GeomBase field (in order of table)"""
+        values: Optional[array] = self._columns.get(field)
+        if values is None:
+            values = self._bases[GeomStore.FIELDS.index(field)::GeomStore.GEOM_BASE_WORDS]
+            self._columns[field] = values
+
+        return values
+
+    @property
+    def columns(self) -> (array, array, array):
+        return self._offsets, self._unk4, self._bases
+
+    @property
+    def offsets(self) -> array:
+        return self._offsets
+
+    @property
+    def type_ids(self) -> array:
+        return self.column('type_id')
+
+    @property
+    def controls(self) -> array:
+        return self.column('control')
+
+    @property
+    def name_offsets(self) -> array:
+        return self.column('name_offset_in_buf')
+
+    @property
+    def depth_levels(self) -> array:
+        values: Optional[array] = self._columns.get('depth_level')
+        if values is None:
+            values = array('i', [offset >> 25 for offset in self._offsets])
+            self._columns['depth_level'] = values
+
+        return values
+
+    def offset(self, geom: int) -> int:
+        return self._offsets[geom]
+
+    def unk4(self, geom: int) -> int:
+        return self._unk4[geom]
+
+    def geom_base(self, geom: int) -> GeomBase:
+        begin: int = geom * GeomStore.GEOM_BASE_WORDS
+        return GeomBase(*self._bases[begin:begin + GeomStore.GEOM_BASE_WORDS])
+
+    def type_id_histogram(self) -> Counter:
+        """Count of geoms of each type id"""
+        return Counter(self.type_ids)
+
+    def geoms_of_type(self, type_id: int) -> [int]:
+        return [geom for geom, geom_type_id in enumerate(self.type_ids) if geom_type_id == type_id]
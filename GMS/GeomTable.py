@@ -1,28 +1,72 @@
-from GMS import GeomHeader
+from GMS import GeomHeader, GeomStore, BufNamePool, GeomHierarchy
 
-import struct
+from collections.abc import Sequence
+from typing import Optional
 
 
-class GeomTable:
-    def __init__(self, gms_buffer: bytes, buf_buffer: bytes):
-        self._ent_list: [GeomHeader] = []
+class GeomTable(Sequence):
+    """
+    Geoms table of GMS body. Table is read at once into columnar store (see GeomStore), GeomHeader of entry is created
+    when entry is accessed first time
+    """
 
-        # 1. Read offset of table
-        self._table_offset: int = struct.unpack('<i', gms_buffer[0: 4])[0]
+    def __init__(self, gms_buffer: bytes, buf_buffer: bytes, store: Optional[GeomStore] = None):
+        self._store: GeomStore = store if store is not None else GeomStore(gms_buffer)
+        self._names: BufNamePool = BufNamePool(buf_buffer)
+        self._ent_list: [Optional[GeomHeader]] = [None] * len(self._store)
+        self._hierarchy: Optional[GeomHierarchy] = None
+        self._materialized: bool = False
 
-        # 2. Jump to table by offset and read count of entries
-        self._ent_count: int = struct.unpack('<i', gms_buffer[self._table_offset: self._table_offset + 4])[0]
+    def __getitem__(self, ent_id):
+        if isinstance(ent_id, slice):
+            return [self[idx] for idx in range(*ent_id.indices(len(self)))]
 
-        # 3. Iterate over entries
-        for ent_id in range(0, self._ent_count):
-            entry_size: int = 8
-            ent_addr: int = self._table_offset + 4 + (ent_id * entry_size)
-            ent_decl_offset, ent_decl_unk4 = struct.unpack('<ii', gms_buffer[ent_addr: ent_addr + entry_size])
+        ent_header: Optional[GeomHeader] = self._ent_list[ent_id]
+        if ent_header is None:
+            ent_header = GeomHeader.from_store(self._store, ent_id if ent_id >= 0 else len(self) + ent_id,
+                                               self._names)
+            self._ent_list[ent_id] = ent_header
 
-            ent_header: GeomHeader = GeomHeader(ent_decl_offset, ent_decl_unk4)
-            ent_header.from_buffer(gms_buffer, buf_buffer)
-            self._ent_list.append(ent_header)
+        return ent_header
+
+    def __len__(self) -> int:
+        return len(self._ent_list)
 
     @property
-    def entries(self) -> [GeomHeader]:
+    def store(self) -> GeomStore:
+        return self._store
+
+    @property
+    def names(self) -> BufNamePool:
+        return self._names
+
+    @property
+    def hierarchy(self) -> GeomHierarchy:
+        """Parent/children relations of entries (built on first access)"""
+        if self._hierarchy is None:
+            self._hierarchy = GeomHierarchy(self._store, self._names)
+
+        return self._hierarchy
+
+    def find_by_name(self, name: str) -> [int]:
+        """Indices of entries with name"""
+        return self.hierarchy.geoms_named(name)
+
+    def materialize(self) -> [GeomHeader]:
+        """
+        Create headers of all entries which were not accessed yet (costly for large tables, but done once). Returns
+        list of headers of all entries (list is owned by table)
+        """
+        if not self._materialized:
+            for ent_id, ent_header in enumerate(self._ent_list):
+                if ent_header is None:
+                    self._ent_list[ent_id] = GeomHeader.from_store(self._store, ent_id, self._names)
+
+            self._materialized = True
+
         return self._ent_list
+
+    @property
+    def entries(self) -> [GeomHeader]:
+        """Headers of all entries (first access creates all of them, see materialize)"""
+        return self.materialize()
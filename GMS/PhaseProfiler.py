@@ -0,0 +1,78 @@
+from typing import Optional
+from contextlib import contextmanager
+
+import cProfile
+import time
+import os
+
+
+class PhaseProfiler:
+    """
+    Collects wall time, CPU time and processed amount of data for named phases of tools.
+    Disabled profiler only runs the phases. When pstats_dir is given each phase is also run under cProfile
+    and its stats are saved to <pstats_dir>/<phase>.pstats
+    """
+
+    def __init__(self, enabled: bool = False, pstats_dir: Optional[str] = None):
+        self._enabled: bool = enabled
+        self._pstats_dir: Optional[str] = pstats_dir
+        self._phases: [dict] = []
+
+        if self._enabled and self._pstats_dir is not None:
+            os.makedirs(self._pstats_dir, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+
+    @property
+    def phases(self) -> [dict]:
+        return self._phases
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Measure block as phase. Yields dict of phase where 'bytes' (processed bytes) and 'items' (processed entities)
+        could be set by block
+        """
+        record: dict = {'name': name, 'bytes': None, 'items': None}
+        if not self._enabled:
+            yield record
+            return
+
+        profile: Optional[cProfile.Profile] = cProfile.Profile() if self._pstats_dir is not None else None
+        wall_started_at: float = time.perf_counter()
+        cpu_started_at: float = time.process_time()
+
+        if profile is not None:
+            profile.enable()
+
+        try:
+            yield record
+        finally:
+            if profile is not None:
+                profile.disable()
+
+            record['wall'] = time.perf_counter() - wall_started_at
+            record['cpu'] = time.process_time() - cpu_started_at
+            self._phases.append(record)
+
+            if profile is not None:
+                profile.dump_stats(os.path.join(self._pstats_dir, f"{name}.pstats"))
+
+    def report(self) -> str:
+        lines: [str] = [" --- PROFILE --- ",
+                        f" {'Phase':<24} {'Wall, s':>10} {'CPU, s':>10} {'Bytes':>14} {'MB/s':>10} {'Items':>10}"]
+
+        for record in self._phases:
+            processed_bytes: str = f"{record['bytes']}" if record['bytes'] is not None else "-"
+            bandwidth: str = f"{record['bytes'] / record['wall'] / (1 << 20):.2f}" \
+                if record['bytes'] is not None and record['wall'] > 0 else "-"
+            items: str = f"{record['items']}" if record['items'] is not None else "-"
+
+            lines.append(f" {record['name']:<24} {record['wall']:>10.3f} {record['cpu']:>10.3f} {processed_bytes:>14} "
+                         f"{bandwidth:>10} {items:>10}")
+
+        lines.append(f" {'Total':<24} {sum(record['wall'] for record in self._phases):>10.3f} "
+                     f"{sum(record['cpu'] for record in self._phases):>10.3f}")
+        return "\n".join(lines)
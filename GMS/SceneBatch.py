@@ -0,0 +1,231 @@
+from .SceneBatchJob import SceneBatchJob
+from .GameScene import GameScene
+from .SceneTracer import SceneTracer
+from .SceneCompiler import SceneCompiler
+
+from GMS.TDB.TypeDataBase import TypeDataBase
+
+from typing import Optional
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import multiprocessing
+import json
+import glob
+import time
+import io
+import os
+
+
+class SceneBatch:
+    """
+    Compiles or decompiles many levels in pool of worker processes.
+
+    Each worker loads types database once and uses it for all its levels. Output of level is written aside and renamed
+    when it's complete, so level whose output is newer than its inputs is skipped: interrupted batch is resumed by
+    running it again.
+    """
+
+    # Count of last visitor steps which are reported in log of level when its decompile fails
+    FLIGHT_RECORDER_SIZE: int = 256
+
+    # Types database of worker process (loaded by worker initializer)
+    _worker_tdb: Optional[TypeDataBase] = None
+
+    def __init__(self, tdb_path: str, jobs: int = 1, force: bool = False):
+        self._tdb_path: str = tdb_path
+        self._jobs: int = max(1, jobs)
+        self._force: bool = force
+
+    @staticmethod
+    def jobs_from_manifest(manifest_path: str) -> [SceneBatchJob]:
+        """
+        Manifest is JSON list of levels: {"mode": "compile", "json": ..., "prp": ...} or
+        {"mode": "decompile", "gms": ..., "buf": ..., "prp": ..., "json": ...}. Relative paths are relative to manifest
+        """
+        with open(manifest_path, "r") as manifest_file:
+            manifest: list = json.load(manifest_file)
+
+        base_dir: str = os.path.dirname(os.path.abspath(manifest_path))
+
+        def resolve(entry: dict, key: str) -> Optional[str]:
+            return os.path.join(base_dir, entry[key]) if entry.get(key) is not None else None
+
+        batch_jobs: [SceneBatchJob] = []
+        for entry in manifest:
+            mode: str = entry.get("mode", SceneBatchJob.DECOMPILE)
+            if mode not in [SceneBatchJob.COMPILE, SceneBatchJob.DECOMPILE]:
+                raise RuntimeError(f"Unknown mode '{mode}' of level in manifest {manifest_path}")
+
+            required_keys: [str] = ["json", "prp"] if mode == SceneBatchJob.COMPILE else ["gms", "buf", "prp", "json"]
+            for key in required_keys:
+                if entry.get(key) is None:
+                    raise RuntimeError(f"For '{mode}' level of manifest {manifest_path} entry '{key}' is required")
+
+            batch_jobs.append(SceneBatchJob(mode, resolve(entry, "json"), resolve(entry, "prp"),
+                                            resolve(entry, "gms"), resolve(entry, "buf")))
+
+        return batch_jobs
+
+    @staticmethod
+    def jobs_from_directory(levels_dir: str, mode: str, out_dir: Optional[str] = None) -> [SceneBatchJob]:
+        """
+        Decompile: every GMS file with BUF and PRP files of same name -> <out_dir>/<name>.json (next to levels by
+        default)
+        Compile: every JSON file -> <out_dir>/<name>.PRP. Output directory is required, and level whose output would
+        overwrite file of levels directory (PRP of decompiled level) is skipped
+        """
+        if mode == SceneBatchJob.COMPILE and out_dir is None:
+            raise RuntimeError(f"Output directory is required to compile levels of directory {levels_dir}")
+
+        out_dir = out_dir if out_dir is not None else levels_dir
+        files: dict = {os.path.basename(path).lower(): path for path in glob.glob(os.path.join(levels_dir, '*'))}
+        level_files: set = {os.path.normcase(os.path.abspath(path)) for path in files.values()}
+
+        batch_jobs: [SceneBatchJob] = []
+        for file_name in sorted(files.keys()):
+            stem, extension = os.path.splitext(file_name)
+            name: str = os.path.splitext(os.path.basename(files[file_name]))[0]
+
+            if mode == SceneBatchJob.COMPILE and extension == '.json':
+                prp_path: str = os.path.join(out_dir, f"{name}.PRP")
+                if os.path.normcase(os.path.abspath(prp_path)) in level_files or \
+                        f"{stem}.prp" in files and os.path.abspath(out_dir) == os.path.abspath(levels_dir):
+                    print(f"Level {files[file_name]} skipped: its output would overwrite level file {prp_path}")
+                    continue
+
+                batch_jobs.append(SceneBatchJob(mode, files[file_name], prp_path))
+            elif mode == SceneBatchJob.DECOMPILE and extension == '.gms':
+                if f"{stem}.buf" not in files or f"{stem}.prp" not in files:
+                    print(f"Level {files[file_name]} skipped: BUF or PRP file not found")
+                    continue
+
+                batch_jobs.append(SceneBatchJob(mode, os.path.join(out_dir, f"{name}.json"), files[f"{stem}.prp"],
+                                                files[file_name], files[f"{stem}.buf"]))
+
+        return batch_jobs
+
+    def run(self, batch_jobs: [SceneBatchJob]) -> dict:
+        """Run jobs and return summary of batch"""
+        started_at: float = time.perf_counter()
+        summary: dict = {'levels': len(batch_jobs), 'done': 0, 'skipped': 0, 'failed': 0, 'bytes': 0, 'failures': []}
+
+        # Outputs depend on types database too, so outputs made with another version of it are not up to date
+        tdb: TypeDataBase = SceneBatch._load_tdb(self._tdb_path)
+
+        pending_jobs: [SceneBatchJob] = []
+        for batch_job in batch_jobs:
+            if not self._force and batch_job.is_up_to_date(tdb.version):
+                summary['skipped'] += 1
+            else:
+                pending_jobs.append(batch_job)
+
+        print(f"Batch: {len(pending_jobs)} levels to process, {summary['skipped']} are up to date")
+
+        if self._jobs == 1 or len(pending_jobs) <= 1:
+            SceneBatch._worker_tdb = tdb
+            try:
+                for batch_job in pending_jobs:
+                    self._account(summary, SceneBatch._run_job(batch_job), len(pending_jobs))
+            finally:
+                SceneBatch._worker_tdb = None
+        else:
+            context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+            with ProcessPoolExecutor(max_workers=self._jobs, mp_context=context, initializer=SceneBatch._init_worker,
+                                     initargs=(self._tdb_path,)) as pool:
+                futures: list = [pool.submit(SceneBatch._run_job, batch_job) for batch_job in pending_jobs]
+                for future in as_completed(futures):
+                    self._account(summary, future.result(), len(pending_jobs))
+
+        summary['seconds'] = time.perf_counter() - started_at
+        return summary
+
+    @staticmethod
+    def report(summary: dict) -> str:
+        seconds: float = summary['seconds']
+        processed: int = summary['done'] + summary['failed']
+        lines: [str] = [" --- BATCH FINISHED --- ",
+                        f" Levels: {summary['levels']} (done {summary['done']}, skipped {summary['skipped']}, "
+                        f"failed {summary['failed']})",
+                        f" Time: {seconds:.3f} s; {processed / seconds if seconds > 0 else 0:.2f} levels/s; "
+                        f"{summary['bytes'] / seconds / (1 << 20) if seconds > 0 else 0:.2f} MB/s of input"]
+
+        for failure in summary['failures']:
+            lines.append(f" FAILED {failure['name']}: {failure['error']}")
+
+        return "\n".join(lines)
+
+    @staticmethod
+    def _account(summary: dict, result: dict, pending_count: int):
+        summary['bytes'] += result['bytes']
+        if result['error'] is None:
+            summary['done'] += 1
+        else:
+            summary['failed'] += 1
+            summary['failures'].append(result)
+
+        status: str = "done" if result['error'] is None else "FAILED"
+        print(f"[{summary['done'] + summary['failed']}/{pending_count}] {result['name']} {status} "
+              f"({result['seconds']:.3f} s)")
+
+    @staticmethod
+    def _load_tdb(tdb_path: str) -> TypeDataBase:
+        tdb: TypeDataBase = TypeDataBase(tdb_path)
+        if not tdb.load():
+            raise RuntimeError(f"Failed to load types database from file {tdb_path}")
+
+        return tdb
+
+    @staticmethod
+    def _init_worker(tdb_path: str):
+        SceneBatch._worker_tdb = SceneBatch._load_tdb(tdb_path)
+
+    @staticmethod
+    def _run_job(batch_job: SceneBatchJob) -> dict:
+        started_at: float = time.perf_counter()
+        result: dict = {'name': batch_job.name, 'bytes': 0, 'error': None}
+        temp_path: str = f"{batch_job.output}.partial"
+
+        # Messages of tools are kept and reported only when level is failed
+        log: io.StringIO = io.StringIO()
+        try:
+            result['bytes'] = sum(os.path.getsize(input_path) for input_path in batch_job.inputs)
+            os.makedirs(os.path.dirname(os.path.abspath(batch_job.output)), exist_ok=True)
+
+            with redirect_stdout(log):
+                if batch_job.mode == SceneBatchJob.COMPILE:
+                    SceneBatch._compile(batch_job, temp_path)
+                else:
+                    SceneBatch._decompile(batch_job, temp_path)
+
+            os.replace(temp_path, batch_job.output)
+            batch_job.write_tdb_stamp(SceneBatch._worker_tdb.version)
+        except Exception as ex:
+            last_message: str = log.getvalue().strip().split("\n")[-1]
+            result['error'] = f"{ex}" + (f" (last message: {last_message})" if last_message else "")
+
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        result['seconds'] = time.perf_counter() - started_at
+        return result
+
+    @staticmethod
+    def _compile(batch_job: SceneBatchJob, out_path: str):
+        with open(batch_job.json_path, "r") as scene_file:
+            scene_tree = json.load(scene_file)
+
+        if not SceneCompiler(scene_tree, SceneBatch._worker_tdb.path, tdb=SceneBatch._worker_tdb).compile(out_path):
+            raise RuntimeError(f"Failed to compile scene {batch_job.json_path}")
+
+    @staticmethod
+    def _decompile(batch_job: SceneBatchJob, out_path: str):
+        # Worker processes many levels, so mapping of BUF file is released right after level is saved
+        with GameScene(batch_job.gms_path, batch_job.buf_path, batch_job.prp_path, SceneBatch._worker_tdb.path,
+                       tdb=SceneBatch._worker_tdb,
+                       tracer=SceneTracer(flight_recorder_size=SceneBatch.FLIGHT_RECORDER_SIZE)) as scene:
+            if not scene.prepare():
+                raise RuntimeError(f"Failed to decompile scene {batch_job.gms_path}")
+
+            if not scene.dump(out_path):
+                raise RuntimeError(f"Failed to save scene {batch_job.gms_path} to {batch_job.json_path}")
@@ -0,0 +1,62 @@
+from dataclasses import dataclass
+from typing import Optional
+
+import os
+
+
+@dataclass
+class SceneBatchJob:
+    """Compile (json -> prp) or decompile (gms, buf, prp -> json) of one level in batch (see SceneBatch)"""
+    mode: str
+    json_path: str
+    prp_path: str
+    gms_path: Optional[str] = None
+    buf_path: Optional[str] = None
+
+    COMPILE = 'compile'
+    DECOMPILE = 'decompile'
+
+    # Version of types database which output was made with is saved next to output with this extension
+    TDB_STAMP_EXTENSION = '.tdb'
+
+    @property
+    def inputs(self) -> [str]:
+        if self.mode == SceneBatchJob.COMPILE:
+            return [self.json_path]
+
+        return [self.gms_path, self.buf_path, self.prp_path]
+
+    @property
+    def output(self) -> str:
+        return self.prp_path if self.mode == SceneBatchJob.COMPILE else self.json_path
+
+    @property
+    def tdb_stamp_path(self) -> str:
+        return self.output + SceneBatchJob.TDB_STAMP_EXTENSION
+
+    @property
+    def name(self) -> str:
+        return os.path.basename(self.inputs[0])
+
+    def is_up_to_date(self, tdb_version: str) -> bool:
+        """
+        Is output newer than all inputs and made with same types database (see TypeDataBase.version). Outputs are
+        written aside and renamed, so existing output is complete
+        """
+        if not os.path.exists(self.output):
+            return False
+
+        output_mtime: float = os.path.getmtime(self.output)
+        if any(os.path.getmtime(input_path) > output_mtime for input_path in self.inputs):
+            return False
+
+        try:
+            with open(self.tdb_stamp_path, "r") as stamp_file:
+                return stamp_file.read().strip() == tdb_version
+        except OSError:
+            return False
+
+    def write_tdb_stamp(self, tdb_version: str):
+        """Remember version of types database which output was made with (call when output is written)"""
+        with open(self.tdb_stamp_path, "w") as stamp_file:
+            stamp_file.write(tdb_version)
@@ -0,0 +1,85 @@
+from PRP import PRPBytecodeFragment
+from typing import Any, Optional
+
+import hashlib
+import pickle
+import json
+import os
+
+
+class SceneCompileCache:
+    """
+    On disk cache of compiled entities for incremental compile (see SceneCompiler).
+
+    Each entity is cached as PRPBytecodeFragment of its own instructions: properties, controllers and count of
+    children, but not children themselves. Key is digest of entity JSON (without children), version of types database
+    and PRP flags, so only edited entities are validated and serialized again while the rest is spliced from cache.
+    Only entries used by last compile are saved, so cache never grows beyond size of scene.
+    """
+
+    FILE_EXTENSION: str = '.cache'
+    MAGIC: str = 'GMSCACHE\x00\x01'
+
+    def __init__(self, cache_path: str, tdb_version: str, flags: int):
+        self._cache_path: str = cache_path
+        self._key_prefix = hashlib.sha1(f"{tdb_version}:{flags}:".encode("ascii"))
+        self._entries: dict = dict()
+        self._used_entries: dict = dict()
+        self._hits: int = 0
+        self._misses: int = 0
+
+    def load(self) -> bool:
+        """Load entries of previous compile. Missing or broken cache file is treated as empty cache"""
+        if not os.path.exists(self._cache_path):
+            return False
+
+        try:
+            with open(self._cache_path, "rb") as cache_file:
+                magic, entries = pickle.load(cache_file)
+        except (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError) as ex:
+            print(f"Compile cache {self._cache_path} is broken and will be rebuilt. Reason: {ex}")
+            return False
+
+        if magic != SceneCompileCache.MAGIC:
+            print(f"Compile cache {self._cache_path} has unsupported format and will be rebuilt")
+            return False
+
+        self._entries = entries
+        return True
+
+    def save(self):
+        # Write whole file aside first, so interrupted save never breaks cache
+        temp_path: str = f"{self._cache_path}.tmp"
+        with open(temp_path, "wb") as cache_file:
+            pickle.dump((SceneCompileCache.MAGIC, self._used_entries), cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+
+        os.replace(temp_path, self._cache_path)
+
+    def key_of(self, ent: Any) -> bytes:
+        digest = self._key_prefix.copy()
+        digest.update(f"{len(ent['children'])}:".encode("ascii"))
+        digest.update(json.dumps({name: value for name, value in ent.items() if name != "children"}, sort_keys=True,
+                                 separators=(',', ':')).encode("utf-8"))
+        return digest.digest()
+
+    def get(self, key: bytes) -> Optional[PRPBytecodeFragment]:
+        entry: Optional[tuple] = self._entries.get(key)
+        if entry is None:
+            self._misses += 1
+            return None
+
+        self._hits += 1
+        self._used_entries[key] = entry
+        return PRPBytecodeFragment(*entry)
+
+    def put(self, key: bytes, fragment: PRPBytecodeFragment):
+        self._used_entries[key] = (fragment.bytecode, fragment.symbols, fragment.token_fixups, fragment.objects_count,
+                                   fragment.instructions_count)
+
+    @property
+    def hits(self) -> int:
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        return self._misses
@@ -1,23 +1,57 @@
-from PRP import PRPDefinition, PRPInstruction, PRPWriter, PRPOpCode
+from PRP import PRPDefinition, PRPInstruction, PRPWriter, PRPOpCode, PRPBytecodeFragment
 from GMS.TDB.TypeDataBase import TypeDataBase
 from GMS.TDB.Type import Type
-from typing import Any, Optional
+from GMS.PhaseProfiler import PhaseProfiler
+from GMS.SceneCompileCache import SceneCompileCache
+from typing import Any, Iterator, Optional, Union
+import os
 
 
 class JsonSceneTreeVisitor:
-    def __init__(self, scene: Any, tdb: TypeDataBase):
+    def __init__(self, scene: Any, tdb: TypeDataBase, cache: Optional[SceneCompileCache] = None, flags: int = 0):
         self._scene = scene
         self._tdb: TypeDataBase = tdb
+        self._cache: Optional[SceneCompileCache] = cache
+        self._flags: int = flags  # PRP flags, required to encode cached entities
 
     def visit(self) -> [PRPInstruction]:
-        entry = self._scene
+        return list(self.iterate())
+
+    def iterate(self) -> Iterator[Union[PRPInstruction, PRPBytecodeFragment]]:
+        """
+        Produce instructions of scene one by one. Hierarchy is walked with explicit stack of children iterators
+        (children are serialized after everything else of entity), so depth of scene is not limited by recursion.
+        With cache each entity is produced as encoded fragment instead of instructions
+        """
+        pending: [Iterator[Any]] = [iter([self._scene])]
+        while pending:
+            ent: Any = next(pending[-1], None)
+            if ent is None:
+                pending.pop()
+                continue
+
+            if self._cache is None:
+                yield from self._visit_ent(ent)
+            else:
+                yield self._visit_cached_ent(ent)
+
+            pending.append(iter(ent["children"]))
+
+        yield PRPInstruction(PRPOpCode.Bool, False)
+        yield PRPInstruction.trusted(PRPOpCode.EndOfStream)
 
-        result: [PRPInstruction] = self._visit_ent(entry)
-        result += [PRPInstruction(PRPOpCode.Bool, False), PRPInstruction(PRPOpCode.EndOfStream)]
-        return result
+    def _visit_cached_ent(self, ent: Any) -> PRPBytecodeFragment:
+        key: bytes = self._cache.key_of(ent)
+        fragment: Optional[PRPBytecodeFragment] = self._cache.get(key)
+        if fragment is None:
+            fragment = PRPWriter.encode_fragment(self._flags, list(self._visit_ent(ent)))
+            self._cache.put(key, fragment)
 
-    def _visit_ent(self, ent: Any) -> [PRPInstruction]:
-        collected_instructions: [PRPInstruction] = [PRPInstruction(PRPOpCode.BeginObject)]
+        return fragment
+
+    def _visit_ent(self, ent: Any) -> Iterator[PRPInstruction]:
+        """Instructions of entity itself (without instructions of its children)"""
+        yield PRPInstruction.trusted(PRPOpCode.BeginObject)
 
         for prop in ent["properties"]:
             property_type: str = prop["type"]
@@ -27,7 +61,7 @@ class JsonSceneTreeVisitor:
 
             if property_type.startswith("PRPOpCode."):
                 prp_op_code: PRPOpCode = PRPOpCode[property_type.split('.')[1]]
-                collected_instructions.append(PRPInstruction(prp_op_code, prop['value']))
+                yield PRPInstruction(prp_op_code, prop['value'])
             else:
                 r_type: Optional[Type] = self._tdb.find_type(property_type)
                 if r_type is None:
@@ -37,18 +71,14 @@ class JsonSceneTreeVisitor:
                     raise RuntimeError(f"For property {property_name} (of {property_owner}) value {property_value} "
                                        f"not valid!")
 
-                collected_instructions += r_type.serialize_to_prp(property_value)
+                yield from r_type.serialize_to_prp(property_value)
 
-        collected_instructions += [PRPInstruction(PRPOpCode.EndObject),
-                                   PRPInstruction(PRPOpCode.Container, {'length': len(ent["controllers"])})]
+        yield PRPInstruction.trusted(PRPOpCode.EndObject)
+        yield PRPInstruction(PRPOpCode.Container, {'length': len(ent["controllers"])})
         for controller in ent["controllers"]:
-            collected_instructions += self._visit_controller(controller)
-
-        collected_instructions += [PRPInstruction(PRPOpCode.Container, {'length': len(ent["children"])})]
-        for child in ent["children"]:
-            collected_instructions += self._visit_ent(child)
+            yield from self._visit_controller(controller)
 
-        return collected_instructions
+        yield PRPInstruction(PRPOpCode.Container, {'length': len(ent["children"])})
 
     def _visit_controller(self, controller) -> [PRPInstruction]:
         # Push controller name
@@ -56,7 +86,7 @@ class JsonSceneTreeVisitor:
 
         collected_instructions: [PRPInstruction] = [PRPInstruction(PRPOpCode.String, {'length': len(controller["name"]),
                                                                                       'data': controller["name"]}),
-                                                    PRPInstruction(PRPOpCode.BeginObject)]
+                                                    PRPInstruction.trusted(PRPOpCode.BeginObject)]
 
         for prop in controller["properties"]:
             prop_type: str = prop["type"]
@@ -79,19 +109,28 @@ class JsonSceneTreeVisitor:
 
                 collected_instructions += r_type.serialize_to_prp(prop_value)
 
-        collected_instructions.append(PRPInstruction(PRPOpCode.EndObject))
+        collected_instructions.append(PRPInstruction.trusted(PRPOpCode.EndObject))
         return collected_instructions
 
 
 class SceneCompiler:
-    def __init__(self, j, tdb_path: str):
+    def __init__(self, j, tdb_path: str, profiler: Optional[PhaseProfiler] = None, cache_path: Optional[str] = None,
+                 tdb: Optional[TypeDataBase] = None):
+        """
+        When cache_path is given compile is incremental: only entities changed since last compile are compiled.
+        tdb is already loaded types database which could be shared between compilers (it's loaded from tdb_path
+        otherwise)
+        """
         self._json = j
-        self._tdb: TypeDataBase = TypeDataBase(tdb_path)
+        self._tdb: TypeDataBase = tdb if tdb is not None else TypeDataBase(tdb_path)
+        self._profiler: PhaseProfiler = profiler if profiler is not None else PhaseProfiler()
+        self._cache_path: Optional[str] = cache_path
 
     def compile(self, out_prp_file: str) -> bool:
-        if not self._tdb.load():
-            print("Failed to load types database file! See log for details")
-            return False
+        with self._profiler.phase('tdb.load'):
+            if not self._tdb.is_loaded and not self._tdb.load():
+                print("Failed to load types database file! See log for details")
+                return False
 
         if "flags" not in self._json:
             print("Failed to compile PRP: JSON entry 'flags' is required!")
@@ -118,9 +157,23 @@ class SceneCompiler:
             entry: PRPDefinition = PRPDefinition.from_json(json_zdef)
             z_defines.append(entry)
 
-        json_scene_visitor: JsonSceneTreeVisitor = JsonSceneTreeVisitor(self._json["scene"], self._tdb)
-        instructions: [PRPInstruction] = json_scene_visitor.visit()
+        cache: Optional[SceneCompileCache] = None
+        if self._cache_path is not None:
+            with self._profiler.phase('cache.load'):
+                cache = SceneCompileCache(self._cache_path, self._tdb.version, flags)
+                cache.load()
+
+        # Instructions are encoded as soon as they are produced, whole list of them is never built
+        with self._profiler.phase('scene.compile') as phase:
+            json_scene_visitor: JsonSceneTreeVisitor = JsonSceneTreeVisitor(self._json["scene"], self._tdb, cache, flags)
+            writer: PRPWriter = PRPWriter(out_prp_file)
+            phase['items'] = writer.write_stream(flags, z_defines, json_scene_visitor.iterate(), is_raw)
+            phase['bytes'] = os.path.getsize(out_prp_file)
+
+        if cache is not None:
+            with self._profiler.phase('cache.save'):
+                cache.save()
+
+            print(f"Incremental compile: {cache.misses} entities compiled, {cache.hits} taken from cache")
 
-        writer: PRPWriter = PRPWriter(out_prp_file)
-        writer.write(flags, z_defines, instructions, is_raw)
         return True
@@ -0,0 +1,81 @@
+from typing import Callable, Optional
+from collections import deque
+
+
+class SceneTracer:
+    """
+    Leveled messages of tools with optional flight recorder.
+
+    Message of disabled level costs single attribute check at call site, arguments are never formatted:
+
+        if tracer.debug_enabled:
+            tracer.debug(f"...")
+
+    Flight recorder keeps last N steps as tuples (format string and its arguments) and formats them only when
+    recorder is dumped (usually on failure), so detailed trace of failed run is available without output of every step:
+
+        if tracer.record is not None:
+            tracer.record(("Visit {} at {}", name, index))
+    """
+
+    OFF: int = 0
+    ERROR: int = 1
+    INFO: int = 2
+    DEBUG: int = 3
+    TRACE: int = 4
+
+    LEVELS: dict = {'off': OFF, 'error': ERROR, 'info': INFO, 'debug': DEBUG, 'trace': TRACE}
+
+    def __init__(self, level: int = INFO, flight_recorder_size: int = 0):
+        self._level: int = level
+        self.error_enabled: bool = level >= SceneTracer.ERROR
+        self.info_enabled: bool = level >= SceneTracer.INFO
+        self.debug_enabled: bool = level >= SceneTracer.DEBUG
+        self.trace_enabled: bool = level >= SceneTracer.TRACE
+
+        self._flight_recorder: Optional[deque] = deque(maxlen=flight_recorder_size) if flight_recorder_size > 0 \
+            else None
+        self.record: Optional[Callable[[tuple], None]] = self._flight_recorder.append \
+            if self._flight_recorder is not None else None
+
+    @property
+    def level(self) -> int:
+        return self._level
+
+    @property
+    def flight_recorder_size(self) -> int:
+        return self._flight_recorder.maxlen if self._flight_recorder is not None else 0
+
+    def error(self, message: str):
+        if self.error_enabled:
+            print(message)
+
+    def info(self, message: str):
+        if self.info_enabled:
+            print(message)
+
+    def debug(self, message: str):
+        if self.debug_enabled:
+            print(message)
+
+    def trace(self, message: str):
+        if self.trace_enabled:
+            print(message)
+
+    def recorded_steps(self) -> [str]:
+        if self._flight_recorder is None:
+            return []
+
+        return [step[0].format(*step[1:]) for step in self._flight_recorder]
+
+    def dump_flight_recorder(self, reason: str):
+        """Report recorded steps as errors and clear recorder"""
+        steps: [str] = self.recorded_steps()
+        if not steps:
+            return
+
+        self.error(f" --- LAST {len(steps)} STEPS BEFORE FAILURE ({reason}) --- ")
+        for step in steps:
+            self.error(f"  {step}")
+
+        self._flight_recorder.clear()
@@ -1,5 +1,5 @@
 from typing import Optional, Any
-from PRP import PRPInstruction, PRPOpCode
+from PRP import PRPInstruction, PRPInstructionStore, PRPOpCode
 from GMS.TDB.VisitableType import VisitableType
 
 
@@ -36,20 +36,21 @@ class TypeArray(VisitableType):
 
         current_instruction_index += 1
 
-        result: [] = []
+        result: Optional[list] = None
+        if isinstance(instructions, PRPInstructionStore):
+            # Take values of all elements at once when array is homogeneous
+            length: int = current_instruction.op_data['length']
+            if current_instruction_index + length < len(instructions) and \
+                    instructions.op_code_at(current_instruction_index + length) == PRPOpCode.EndArray and \
+                    instructions.op_code_at(current_instruction_index) == self._entry_type:
+                result = instructions.op_data_run(current_instruction_index, length)
 
-        prepared_instructions: int = 0
-        while instructions[current_instruction_index].op_code != PRPOpCode.EndArray or \
-                (prepared_instructions < self._expected_length if self._expected_length is not None else False):
-            # ----- Begin loop -----
-            c_val: PRPInstruction = instructions[current_instruction_index]
+            if result is not None:
+                current_instruction_index += length
 
-            if c_val.op_code != self._entry_type:
-                raise RuntimeError(f"Expected type {str(self._entry_type)}, got {str(c_val.op_code)}")
-
-            result.append(c_val.op_data)
-            current_instruction_index += 1
-            prepared_instructions += 1
+        if result is None:
+            result = self._visit_elements(current_instruction_index, instructions)
+            current_instruction_index += len(result)
 
         # TODO: Add assertion here
 
@@ -70,6 +71,24 @@ class TypeArray(VisitableType):
 
         return current_instruction_index, ret_array_obj
 
+    def _visit_elements(self, current_instruction_index: int, instructions: [PRPInstruction]) -> []:
+        result: [] = []
+
+        prepared_instructions: int = 0
+        while instructions[current_instruction_index].op_code != PRPOpCode.EndArray or \
+                (prepared_instructions < self._expected_length if self._expected_length is not None else False):
+            # ----- Begin loop -----
+            c_val: PRPInstruction = instructions[current_instruction_index]
+
+            if c_val.op_code != self._entry_type:
+                raise RuntimeError(f"Expected type {str(self._entry_type)}, got {str(c_val.op_code)}")
+
+            result.append(c_val.op_data)
+            current_instruction_index += 1
+            prepared_instructions += 1
+
+        return result
+
     def to_prp(self, value: Any) -> [PRPInstruction]:
         entries = value['array']['data']
         result: [PRPInstruction] = [PRPInstruction(PRPOpCode.Array, {'length': len(entries)})]
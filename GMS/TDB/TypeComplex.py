@@ -1,4 +1,4 @@
-from PRP import PRPInstruction, PRPOpCode
+from PRP import PRPInstruction, PRPInstructionStore, PRPOpCode
 
 import GMS.TDB as TDB
 
@@ -46,6 +46,7 @@ class TypeComplex(TDB.TypeLink.TypeLink, TDB.VisitableType.VisitableType):
         self.properties = props
         self.parent: Union[str, TDB.Type.Type, None] = parent
         self.skip_unexposed_properties: bool = skip_unexposed_properties
+        self._ancestors: Optional[tuple] = None
 
     def resolve_external_links(self, tdb: TDB.TypeDataBase.TypeDataBase):
         if type(self.parent) is str:
@@ -65,12 +66,35 @@ class TypeComplex(TDB.TypeLink.TypeLink, TDB.VisitableType.VisitableType):
             else:
                 prop.set_opcode(PRPOpCode[prop.typename.split('.')[1]])
 
+    def _collect_ancestors(self) -> (Optional[TDB.Type.Type], [tuple]):
+        """
+        Complex ancestors of this type as (complex type, its name) from parent to the most distant one and the first
+        ancestor which is not complex type (or None). Chain is collected once, after external links are resolved
+        """
+        if self._ancestors is None:
+            complex_ancestors: [tuple] = []
+            base: Optional[TDB.Type.Type] = None
+            complex_type: TypeComplex = self
+            while complex_type.parent is not None:
+                parent: TDB.Type.Type = complex_type.parent
+                if not isinstance(parent.data, TypeComplex):
+                    base = parent
+                    break
+
+                complex_ancestors.append((parent.data, parent.name))
+                complex_type = parent.data
+
+            self._ancestors = (base, complex_ancestors)
+
+        return self._ancestors
+
     def visit(self, current_instruction_index: int, instructions: [PRPInstruction], owner_typename: Optional[str]) -> (int, []):
+        # Properties of ancestors go first. Parents chain is walked by loop (from the most distant ancestor to this
+        # type), so depth of inheritance is not limited by recursion
         extracted_properties: [] = []
-        if self.parent is not None:
-            next_instru, parent_extracted_props = self.parent.visit(current_instruction_index,
-                                                                    instructions,
-                                                                    self.parent.name)
+        base, complex_ancestors = self._collect_ancestors()
+        if base is not None:
+            next_instru, parent_extracted_props = base.visit(current_instruction_index, instructions, base.name)
 
             if next_instru != -1:
                 extracted_properties += parent_extracted_props
@@ -78,6 +102,18 @@ class TypeComplex(TDB.TypeLink.TypeLink, TDB.VisitableType.VisitableType):
             else:
                 raise RuntimeError("Failed to prepare parent type")
 
+        for complex_type, complex_typename in reversed(complex_ancestors):
+            current_instruction_index = complex_type._visit_own_properties(current_instruction_index, instructions,
+                                                                           complex_typename, extracted_properties)
+
+        current_instruction_index = self._visit_own_properties(current_instruction_index, instructions, owner_typename,
+                                                               extracted_properties)
+
+        return current_instruction_index, extracted_properties
+
+    def _visit_own_properties(self, current_instruction_index: int, instructions: [PRPInstruction],
+                              owner_typename: Optional[str], extracted_properties: []) -> int:
+        """Visit properties declared by this type (without parent ones), returns index of next instruction"""
         prop: ComplexProperty
         for prop in self.properties:
             start_instruction: int = current_instruction_index
@@ -113,35 +149,48 @@ class TypeComplex(TDB.TypeLink.TypeLink, TDB.VisitableType.VisitableType):
 
         unexposed_instructions: [] = []
         if instructions[current_instruction_index].op_code != PRPOpCode.EndObject and self.skip_unexposed_properties:
-            # Run skipping unexposed things until object ends
-            object_depth: int = 1
-            object_end_markers_found: int = 0
+            if isinstance(instructions, PRPInstructionStore):
+                # Jump to the end of object by structure index
+                object_end: int = instructions.structure.enclosing_object_end(current_instruction_index)
+                for instruction in instructions[current_instruction_index:object_end]:
+                    unexposed_instructions.append(TypeComplex._make_unexposed_instruction(instruction, owner_typename))
 
-            while object_end_markers_found != object_depth:
-                unexposed_instruction: dict = dict()
-                if owner_typename is not None:
-                    unexposed_instruction['owner'] = owner_typename
-
-                unexposed_instruction['type'] = 'unexposed_instruction'
-                unexposed_instruction['data'] = dict()
-                unexposed_instruction['data']['op_code'] = str(instructions[current_instruction_index].op_code)
-                unexposed_instruction['data']['op_data'] = instructions[current_instruction_index].op_data
+                current_instruction_index = object_end + 1
+            else:
+                # Run skipping unexposed things until object ends
+                object_depth: int = 1
+                object_end_markers_found: int = 0
 
-                unexposed_instructions.append(unexposed_instruction)
+                while object_end_markers_found != object_depth:
+                    unexposed_instructions.append(
+                        TypeComplex._make_unexposed_instruction(instructions[current_instruction_index], owner_typename))
 
-                if instructions[current_instruction_index].op_code == PRPOpCode.BeginObject or \
-                        instructions[current_instruction_index].op_code == PRPOpCode.BeginNamedObject:
-                    object_depth += 1
+                    if instructions[current_instruction_index].op_code == PRPOpCode.BeginObject or \
+                            instructions[current_instruction_index].op_code == PRPOpCode.BeginNamedObject:
+                        object_depth += 1
 
-                if instructions[current_instruction_index].op_code == PRPOpCode.EndObject:
-                    object_end_markers_found += 1
+                    if instructions[current_instruction_index].op_code == PRPOpCode.EndObject:
+                        object_end_markers_found += 1
 
-                current_instruction_index += 1
+                    current_instruction_index += 1
 
-            # Remove 'end object' marker from unexposed instructions
-            if unexposed_instructions[-1]['data']['op_code'] == str(PRPOpCode.EndObject):
-                unexposed_instructions.pop(-1)
+                # Remove 'end object' marker from unexposed instructions
+                if unexposed_instructions[-1]['data']['op_code'] == str(PRPOpCode.EndObject):
+                    unexposed_instructions.pop(-1)
 
             extracted_properties += unexposed_instructions
 
-        return current_instruction_index, extracted_properties
+        return current_instruction_index
+
+    @staticmethod
+    def _make_unexposed_instruction(instruction: PRPInstruction, owner_typename: Optional[str]) -> dict:
+        unexposed_instruction: dict = dict()
+        if owner_typename is not None:
+            unexposed_instruction['owner'] = owner_typename
+
+        unexposed_instruction['type'] = 'unexposed_instruction'
+        unexposed_instruction['data'] = dict()
+        unexposed_instruction['data']['op_code'] = str(instruction.op_code)
+        unexposed_instruction['data']['op_data'] = instruction.op_data
+
+        return unexposed_instruction
@@ -1,6 +1,7 @@
 from typing import Optional
 from pathlib import Path
 
+import hashlib
 import json
 import glob
 import os
@@ -13,14 +14,22 @@ class TypeDataBase:
         self._types: [Type] = []
         self._tdb_path: str = os.path.realpath(tdb_path)
         self._type_exports: dict = dict()
+        self._types_by_short_name: dict = dict()
+        self._version: Optional[str] = None
 
     def load(self):
         from GMS.TDB.Type import Type
         from GMS.TDB.TypeLink import TypeLink
 
         try:
+            # Version is digest of registry and every type definition (in order of names, so it doesn't depend
+            # on order of files in directory)
+            files_digests: dict = dict()
+
             with open(self._tdb_path, "r") as tdb_file:
-                jtdb = json.load(tdb_file)
+                tdb_contents: str = tdb_file.read()
+                files_digests[''] = hashlib.sha1(tdb_contents.encode("utf-8")).hexdigest()
+                jtdb = json.loads(tdb_contents)
                 inc_path: str = os.path.realpath(jtdb['inc'])
                 db_refs: dict = jtdb['db']
 
@@ -30,13 +39,15 @@ class TypeDataBase:
                 filename: str
                 for filename in glob.glob(inc_traverse_path + os.path.sep + '*.json', recursive=True):
                     with open(filename, "r") as type_definition_file:
-                        j_type = json.load(type_definition_file)
+                        type_definition: str = type_definition_file.read()
+                        j_type = json.loads(type_definition)
                         type_def: Type = Type(j_type)
                         fn: str = Path(filename).stem
                         assert fn == type_def.name, \
                                f"Typename ({type_def.name}) and file name ({fn}) must be same, but they doesn't!"
 
                         self._types.append(type_def)
+                        files_digests[fn] = hashlib.sha1(type_definition.encode("utf-8")).hexdigest()
 
                 # Resolve x-linking
                 type_id: str
@@ -55,6 +66,11 @@ class TypeDataBase:
                         type_link_r: TypeLink = current_type.data
                         type_link_r.resolve_external_links(self)
 
+                self._version = hashlib.sha1(
+                    "\n".join(f"{name}:{digest}" for name, digest in sorted(files_digests.items())).encode("ascii")
+                ).hexdigest()
+
+                self._types_by_short_name.clear()
                 return True
         except Exception as ex:
             raise RuntimeError(f"Failed to tload {self._tdb_path}. Reason: {ex}")
@@ -71,6 +87,15 @@ class TypeDataBase:
         return None
 
     def find_type_by_short_name(self, typename: str):
+        # Same short names are looked up for every controller of scene, so result of lookup is memoized
+        if typename in self._types_by_short_name:
+            return self._types_by_short_name[typename]
+
+        type_decl = self._find_type_by_short_name(typename)
+        self._types_by_short_name[typename] = type_decl
+        return type_decl
+
+    def _find_type_by_short_name(self, typename: str):
         from GMS.TDB.Type import Type
 
         type_decl: Type
@@ -110,6 +135,19 @@ class TypeDataBase:
     def exported_types(self) -> dict:
         return self._type_exports
 
+    @property
+    def path(self) -> str:
+        return self._tdb_path
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._version is not None
+
+    @property
+    def version(self) -> Optional[str]:
+        """Digest of all loaded definitions (None until database is loaded)"""
+        return self._version
+
     @property
     def types(self):
         return self._types
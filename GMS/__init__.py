@@ -2,7 +2,16 @@ from .GeomBase import GeomBase
 from .GeomStat import GeomStat
 from .GeomStats import GeomStats
 from .GeomHeader import GeomHeader
+from .GeomStore import GeomStore
+from .BufNamePool import BufNamePool
+from .GeomHierarchy import GeomHierarchy
 from .GeomTable import GeomTable
+from .PhaseProfiler import PhaseProfiler
+from .SceneTracer import SceneTracer
+from .ArtifactCache import ArtifactCache
 from .GameScene import GameScene
 from .GeomPropertiesVisitor import GeomPropertiesVisitor
+from .SceneCompileCache import SceneCompileCache
 from .SceneCompiler import SceneCompiler
+from .SceneBatchJob import SceneBatchJob
+from .SceneBatch import SceneBatch
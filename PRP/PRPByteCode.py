@@ -1,6 +1,8 @@
-from PRP import PRPInstruction, PRPOpCode, PRPByteCodeContext, PRPBadInstructionError
-from typing import Optional
+from PRP import PRPInstruction, PRPInstructionStore, PRPOpCode, PRPBadInstructionError, PRPValueRun
+from typing import Optional, Union, Iterator
+from array import array
 import struct
+import sys
 
 
 class PRPByteCode:
@@ -9,215 +11,231 @@ class PRPByteCode:
     CF_READ_OBJECT:    int = 1 << 2
     CF_END_OF_STREAM:  int = 1 << 31
 
-    def __init__(self, byte_code: bytes):
-        self._vm_instructions: [PRPInstruction] = []
-        self._vm_bytecode: bytes = byte_code
+    _decoder_tables: dict = dict()
+
+    def __init__(self, byte_code: Union[bytes, memoryview]):
+        self._vm_instructions: PRPInstructionStore = PRPInstructionStore(PRPByteCode.decoder_table(0), [])
+        self._vm_bytecode: Union[bytes, memoryview] = byte_code
+
+    @staticmethod
+    def from_instructions(store: PRPInstructionStore) -> 'PRPByteCode':
+        """Bytecode which instructions are already decoded (there is no source buffer)"""
+        byte_code: PRPByteCode = PRPByteCode(bytes())
+        byte_code._vm_instructions = store
+        return byte_code
 
     @property
-    def instructions(self) -> [PRPInstruction]:
+    def instructions(self) -> PRPInstructionStore:
         return self._vm_instructions
 
-    def prepare(self, vm_flags: int, vm_token_table: [str]) -> bool:
-        self._vm_instructions = []
-        vm_ctx: PRPByteCodeContext = PRPByteCodeContext(0)
-
-        while vm_ctx.index < len(self._vm_bytecode):
-            self.prepare_op_code(vm_ctx, vm_flags, vm_token_table)
-
-        return vm_ctx.is_eof
-
-    def prepare_op_code(self, vm_ctx: PRPByteCodeContext, vm_flags: int, vm_token_table: [str]):
-        current_opcode_vm_instruction: Optional[PRPInstruction] = None
-        current_opcode_vm_instruction_index: int = vm_ctx.index
-        current_opcode_val = self._vm_bytecode[current_opcode_vm_instruction_index]
-        vm_ctx += 1
-
-        current_opcode: PRPOpCode = PRPOpCode.from_byte(current_opcode_val)
-        # --- SWITCH OP-CODE ---
-
-        if current_opcode == PRPOpCode.ERR_UNKNOWN or current_opcode == PRPOpCode.ERR_NO_TAG:
-            raise PRPBadInstructionError(f"Got bad instruction at {current_opcode_vm_instruction_index} (op-code byte is {current_opcode_val})")
-        elif current_opcode == PRPOpCode.Array or current_opcode == PRPOpCode.NamedArray:
-            current_opcode_vm_instruction = self.prepare_op_code_array_or_named_array(current_opcode, vm_ctx, vm_flags, vm_token_table)
-        elif current_opcode == PRPOpCode.BeginObject or current_opcode == PRPOpCode.BeginNamedObject:
-            current_opcode_vm_instruction = self.prepare_op_code_begin_object_or_named_object(current_opcode)
-        elif current_opcode == PRPOpCode.Container or current_opcode == PRPOpCode.NamedContainer:
-            current_opcode_vm_instruction = self.prepare_op_code_container_or_named_container(current_opcode, vm_ctx)
-        elif current_opcode == PRPOpCode.EndArray:
-            current_opcode_vm_instruction = self.prepare_op_code_end_array(current_opcode, vm_ctx)
-        elif current_opcode == PRPOpCode.EndObject:
-            current_opcode_vm_instruction = self.prepare_op_code_end_object(current_opcode, vm_ctx)
-        elif current_opcode == PRPOpCode.EndOfStream:
-            current_opcode_vm_instruction = self.prepare_op_code_end_stream(current_opcode, vm_ctx)
-        elif current_opcode == PRPOpCode.Reference or current_opcode == PRPOpCode.NamedReference:
-            current_opcode_vm_instruction = self.prepare_op_code_reference_or_named_reference(current_opcode)
-        elif current_opcode == PRPOpCode.Char or current_opcode == PRPOpCode.NamedChar:
-            current_opcode_vm_instruction = self.prepare_op_code_char_or_named_char(current_opcode, vm_ctx)
-        elif current_opcode == PRPOpCode.Int8 or current_opcode == PRPOpCode.NamedInt8:
-            current_opcode_vm_instruction = self.prepare_op_code_int8_or_named_int8(current_opcode, vm_ctx)
-        elif current_opcode == PRPOpCode.Bool or current_opcode == PRPOpCode.NamedBool:
-            current_opcode_vm_instruction = self.prepare_op_code_bool_or_named_bool(current_opcode, vm_ctx)
-        elif current_opcode == PRPOpCode.Int16 or current_opcode == PRPOpCode.NamedInt16:
-            current_opcode_vm_instruction = self.prepare_op_code_int16_or_named_int16(current_opcode, vm_ctx)
-        elif current_opcode == PRPOpCode.Int32 or current_opcode == PRPOpCode.NamedInt32:
-            current_opcode_vm_instruction = self.prepare_op_code_int32_or_named_int32(current_opcode, vm_ctx)
-        elif current_opcode == PRPOpCode.Float32 or current_opcode == PRPOpCode.NamedFloat32:
-            current_opcode_vm_instruction = self.prepare_op_code_float32_or_named_float32(current_opcode, vm_ctx)
-        elif current_opcode == PRPOpCode.Float64 or current_opcode == PRPOpCode.NamedFloat64:
-            current_opcode_vm_instruction = self.prepare_op_code_float64_or_named_float64(current_opcode, vm_ctx)
-        elif current_opcode == PRPOpCode.String or current_opcode == PRPOpCode.NamedString:
-            current_opcode_vm_instruction = self.prepare_op_code_string_or_named_string(current_opcode, vm_ctx, vm_flags, vm_token_table)
-        elif current_opcode == PRPOpCode.RawData or current_opcode == PRPOpCode.NamedRawData:
-            current_opcode_vm_instruction = self.prepare_op_code_raw_data_or_named_raw_data(current_opcode, vm_ctx)
-        elif current_opcode == PRPOpCode.Bitfield or current_opcode == PRPOpCode.NameBitfield:
-            current_opcode_vm_instruction = self.prepare_op_code_bitfield_or_named_bitfield(current_opcode, vm_ctx)
-        elif current_opcode == PRPOpCode.SkipMark:
-            current_opcode_vm_instruction = self.prepare_op_code_skip_mark(current_opcode)
-        elif current_opcode == PRPOpCode.StringOrArray_E or current_opcode == PRPOpCode.StringOrArray_8E:
-            current_opcode_vm_instruction = self.prepare_op_code_string_array_e_or_8e(current_opcode, vm_ctx, vm_flags, vm_token_table)
-        elif current_opcode == PRPOpCode.StringArray:
-            current_opcode_vm_instruction = self.prepare_op_code_string_array(current_opcode, vm_ctx, vm_flags, vm_token_table)
-
-        # --- SAVE INSTRUCTION ---
-        if current_opcode_vm_instruction is not None:
-            self._vm_instructions.append(current_opcode_vm_instruction)
-
-    def prepare_op_code_array_or_named_array(self,
-                                             vm_opcode: PRPOpCode,
-                                             vm_ctx: PRPByteCodeContext,
-                                             vm_flags: int,
-                                             vm_token_table: [str]) -> Optional[PRPInstruction]:
-        vm_ctx.set_flag(PRPByteCodeContext.CF_READ_ARRAY)
-        capacity: int = int.from_bytes(self._vm_bytecode[vm_ctx.index: vm_ctx.index + 4], "little")
-        vm_ctx += 4
-        return PRPInstruction(vm_opcode, {'length': capacity})
-
-    def prepare_op_code_begin_object_or_named_object(self, vm_opcode: PRPOpCode) -> Optional[PRPInstruction]:
-        return PRPInstruction(vm_opcode)
-
-    def prepare_op_code_container_or_named_container(self, vm_opcode: PRPOpCode, vm_ctx: PRPByteCodeContext) -> Optional[PRPInstruction]:
-        vm_ctx.set_flag(PRPByteCodeContext.CF_READ_CONTAINER)
-        capacity: int = int.from_bytes(self._vm_bytecode[vm_ctx.index: vm_ctx.index + 4], "little")
-        vm_ctx += 4
-        return PRPInstruction(vm_opcode, {'length': capacity})
-
-    def prepare_op_code_end_array(self, vm_opcode: PRPOpCode, vm_ctx: PRPByteCodeContext) -> Optional[PRPInstruction]:
-        vm_ctx.unset_flag(PRPByteCodeContext.CF_READ_ARRAY)
-        return PRPInstruction(vm_opcode)
-
-    def prepare_op_code_end_object(self, vm_opcode: PRPOpCode, vm_ctx: PRPByteCodeContext) -> Optional[PRPInstruction]:
-        vm_ctx.unset_flag(PRPByteCodeContext.CF_READ_OBJECT)
-        return PRPInstruction(vm_opcode)
-
-    def prepare_op_code_end_stream(self, vm_opcode: PRPOpCode, vm_ctx: PRPByteCodeContext) -> Optional[PRPInstruction]:
-        vm_ctx.set_flag(PRPByteCodeContext.CF_END_OF_STREAM)
-        return PRPInstruction(vm_opcode)
-
-    def prepare_op_code_reference_or_named_reference(self, vm_opcode: PRPOpCode) -> Optional[PRPInstruction]:
-        raise NotImplementedError(f"This op-code ({vm_opcode}) is not implemented yet")
-
-    def prepare_op_code_char_or_named_char(self, vm_opcode: PRPOpCode, vm_ctx: PRPByteCodeContext) -> Optional[PRPInstruction]:
-        value: str = self._vm_bytecode[vm_ctx.index: vm_ctx.index + 1].decode("ascii")
-        vm_ctx += 1
-        return PRPInstruction(vm_opcode, value)
-
-    def prepare_op_code_bool_or_named_bool(self, vm_opcode: PRPOpCode, vm_ctx: PRPByteCodeContext) -> Optional[PRPInstruction]:
-        value: bool = bool.from_bytes(self._vm_bytecode[vm_ctx.index: vm_ctx.index + 1], "little")
-        vm_ctx += 1
-        return PRPInstruction(vm_opcode, value)
-
-    def prepare_op_code_int8_or_named_int8(self, vm_opcode: PRPOpCode, vm_ctx: PRPByteCodeContext) -> Optional[PRPInstruction]:
-        value: int = int.from_bytes(self._vm_bytecode[vm_ctx.index: vm_ctx.index + 1], "little")
-        vm_ctx += 1
-        return PRPInstruction(vm_opcode, value)
-
-    def prepare_op_code_int16_or_named_int16(self, vm_opcode: PRPOpCode, vm_ctx: PRPByteCodeContext) -> Optional[PRPInstruction]:
-        value: int = int.from_bytes(self._vm_bytecode[vm_ctx.index: vm_ctx.index + 2], "little")
-        vm_ctx += 2
-        return PRPInstruction(vm_opcode, value)
-
-    def prepare_op_code_int32_or_named_int32(self, vm_opcode: PRPOpCode, vm_ctx: PRPByteCodeContext) -> Optional[PRPInstruction]:
-        value: int = int.from_bytes(self._vm_bytecode[vm_ctx.index: vm_ctx.index + 4], "little")
-        vm_ctx += 4
-        return PRPInstruction(vm_opcode, value)
-
-    def prepare_op_code_float32_or_named_float32(self, vm_opcode: PRPOpCode, vm_ctx: PRPByteCodeContext) -> Optional[PRPInstruction]:
-        value: float
-        raw = self._vm_bytecode[vm_ctx.index: vm_ctx.index + 4]
-        (value) = struct.unpack('<f', raw)
-        vm_ctx += 4
-        return PRPInstruction(vm_opcode, value)
-
-    def prepare_op_code_float64_or_named_float64(self, vm_opcode: PRPOpCode, vm_ctx: PRPByteCodeContext) -> Optional[PRPInstruction]:
-        value: float
-        raw = self._vm_bytecode[vm_ctx.index: vm_ctx.index + 8]
-        (value) = struct.unpack('<d', raw)
-        vm_ctx += 8
-        return PRPInstruction(vm_opcode, value)
-
-    def prepare_op_code_string_or_named_string(self, vm_opcode: PRPOpCode, vm_ctx: PRPByteCodeContext, vm_flags: int, vm_token_table: [str]) -> Optional[PRPInstruction]:
-        result: str = self.exchange_string(vm_ctx, vm_flags, vm_token_table)
-        return PRPInstruction(vm_opcode, {'length': len(result), 'data': result})
-
-    def prepare_op_code_raw_data_or_named_raw_data(self, vm_opcode: PRPOpCode, vm_ctx: PRPByteCodeContext) -> Optional[PRPInstruction]:
-        capacity: int = int.from_bytes(self._vm_bytecode[vm_ctx.index: vm_ctx.index + 4], "little")
-        buffer: [] = []
-        vm_ctx += 4
-        if capacity > 0:
-            buffer = self._vm_bytecode[vm_ctx.index: vm_ctx.index + capacity]
-            vm_ctx += capacity
-
-        return PRPInstruction(vm_opcode, {'length': capacity, 'data': buffer})
-
-    def prepare_op_code_bitfield_or_named_bitfield(self, vm_opcode: PRPOpCode, vm_ctx: PRPByteCodeContext) -> Optional[PRPInstruction]:
-        value: int = int.from_bytes(self._vm_bytecode[vm_ctx.index: vm_ctx.index + 4], "little")
-        vm_ctx += 4
-        return PRPInstruction(vm_opcode, value)
-
-    def prepare_op_code_skip_mark(self, vm_opcode: PRPOpCode) -> Optional[PRPInstruction]:
-        return PRPInstruction(vm_opcode)
-
-    def prepare_op_code_string_array_e_or_8e(self, vm_opcode: PRPOpCode, vm_ctx: PRPByteCodeContext, vm_flags: int, vm_token_table: [str]) -> Optional[PRPInstruction]:
-        if (vm_flags >> 2) & 1:
-            result: str = self.exchange_string(vm_ctx, vm_flags, vm_token_table)
-            return PRPInstruction(vm_opcode, {'length': len(result), 'data': result})
-        else:
-            value: int = int.from_bytes(self._vm_bytecode[vm_ctx.index: vm_ctx.index + 4], "little")
-            vm_ctx += 4
-            return PRPInstruction(vm_opcode, value)
-
-    def prepare_op_code_string_array(self, vm_opcode: PRPOpCode, vm_ctx: PRPByteCodeContext, vm_flags: int, vm_token_table: [str]) -> Optional[PRPInstruction]:
-        if (vm_flags >> 2) & 1:
-            if (vm_flags >> 3) & 1:
-                capacity: int = int.from_bytes(self._vm_bytecode[vm_ctx.index: vm_ctx.index + 4], "little")
-                vm_ctx += 4
-                result: [str] = []
-
-                for si in range(0, capacity):
-                    result.append(self.exchange_string(vm_ctx, vm_flags, vm_token_table))
-
-                return PRPInstruction(vm_opcode, result)
+    def release(self):
+        """Drop reference to the source buffer. Must be called before closing memory-mapped PRP file"""
+        if isinstance(self._vm_bytecode, memoryview):
+            self._vm_bytecode.release()
+
+        self._vm_bytecode = bytes()
+
+    @staticmethod
+    def decoder_table(vm_flags: int) -> [Optional[tuple]]:
+        """
+        Returns 256-entry dispatch table for given PRP flags. Each entry is None for bad op-code or tuple of
+        (op-code, value kind, unpack_from of precompiled struct for value (or None), size of instruction).
+        For variable sized instructions size covers only op-code and fixed part of value.
+        """
+        table: Optional[list] = PRPByteCode._decoder_tables.get(vm_flags)
+        if table is not None:
+            return table
+
+        is_strings_exposed: bool = bool((vm_flags >> 2) & 1)
+        is_token_strings: bool = bool((vm_flags >> 3) & 1)
+        string_kind: int = PRPInstructionStore.VK_TOKEN_STRING if is_token_strings else PRPInstructionStore.VK_RAW_STRING
+
+        layouts: dict = {
+            PRPOpCode.Array:            (PRPInstructionStore.VK_LENGTH, '<I'),
+            PRPOpCode.NamedArray:       (PRPInstructionStore.VK_LENGTH, '<I'),
+            PRPOpCode.BeginObject:      (PRPInstructionStore.VK_NONE, None),
+            PRPOpCode.BeginNamedObject: (PRPInstructionStore.VK_NONE, None),
+            PRPOpCode.Reference:        (PRPInstructionStore.VK_REFERENCE, None),
+            PRPOpCode.NamedReference:   (PRPInstructionStore.VK_REFERENCE, None),
+            PRPOpCode.Container:        (PRPInstructionStore.VK_LENGTH, '<I'),
+            PRPOpCode.NamedContainer:   (PRPInstructionStore.VK_LENGTH, '<I'),
+            PRPOpCode.Char:             (PRPInstructionStore.VK_CHAR, '<c'),
+            PRPOpCode.NamedChar:        (PRPInstructionStore.VK_CHAR, '<c'),
+            PRPOpCode.Bool:             (PRPInstructionStore.VK_BOOL, '<?'),
+            PRPOpCode.NamedBool:        (PRPInstructionStore.VK_BOOL, '<?'),
+            PRPOpCode.Int8:             (PRPInstructionStore.VK_VALUE, '<B'),
+            PRPOpCode.NamedInt8:        (PRPInstructionStore.VK_VALUE, '<B'),
+            PRPOpCode.Int16:            (PRPInstructionStore.VK_VALUE, '<H'),
+            PRPOpCode.NamedInt16:       (PRPInstructionStore.VK_VALUE, '<H'),
+            PRPOpCode.Int32:            (PRPInstructionStore.VK_VALUE, '<I'),
+            PRPOpCode.NamedInt32:       (PRPInstructionStore.VK_VALUE, '<I'),
+            PRPOpCode.Float32:          (PRPInstructionStore.VK_TUPLE, '<f'),
+            PRPOpCode.NamedFloat32:     (PRPInstructionStore.VK_TUPLE, '<f'),
+            PRPOpCode.Float64:          (PRPInstructionStore.VK_TUPLE, '<d'),
+            PRPOpCode.NamedFloat64:     (PRPInstructionStore.VK_TUPLE, '<d'),
+            PRPOpCode.String:           (string_kind, '<I'),
+            PRPOpCode.NamedString:      (string_kind, '<I'),
+            PRPOpCode.RawData:          (PRPInstructionStore.VK_RAW_DATA, '<I'),
+            PRPOpCode.NamedRawData:     (PRPInstructionStore.VK_RAW_DATA, '<I'),
+            PRPOpCode.Bitfield:         (PRPInstructionStore.VK_VALUE, '<I'),
+            PRPOpCode.NameBitfield:     (PRPInstructionStore.VK_VALUE, '<I'),
+            PRPOpCode.EndArray:         (PRPInstructionStore.VK_NONE, None),
+            PRPOpCode.SkipMark:         (PRPInstructionStore.VK_NONE, None),
+            PRPOpCode.EndObject:        (PRPInstructionStore.VK_NONE, None),
+            PRPOpCode.EndOfStream:      (PRPInstructionStore.VK_NONE, None),
+            PRPOpCode.StringOrArray_E:  (string_kind, '<I') if is_strings_exposed else (PRPInstructionStore.VK_VALUE, '<I'),
+            PRPOpCode.StringOrArray_8E: (string_kind, '<I') if is_strings_exposed else (PRPInstructionStore.VK_VALUE, '<I'),
+            PRPOpCode.StringArray:      (PRPInstructionStore.VK_VALUE, '<I') if not is_strings_exposed else
+                                        (PRPInstructionStore.VK_TOKEN_STR_ARRAY, '<I') if is_token_strings else
+                                        (PRPInstructionStore.VK_REFERENCE, None)
+        }
+
+        table = [None] * 256
+        for op_code_byte in range(0, 256):
+            op_code: PRPOpCode = PRPOpCode.from_byte(op_code_byte)
+            if op_code == PRPOpCode.ERR_UNKNOWN or op_code == PRPOpCode.ERR_NO_TAG:
+                continue
+
+            kind, layout_format = layouts[op_code]
+            if layout_format is None:
+                table[op_code_byte] = (op_code, kind, None, 1)
             else:
+                layout: struct.Struct = struct.Struct(layout_format)
+                table[op_code_byte] = (op_code, kind, layout.unpack_from, 1 + layout.size)
+
+        PRPByteCode._decoder_tables[vm_flags] = table
+        return table
+
+    def prepare(self, vm_flags: int, vm_token_table: [str]) -> bool:
+        store: PRPInstructionStore = PRPInstructionStore(PRPByteCode.decoder_table(vm_flags), vm_token_table)
+        self._vm_instructions = store
+
+        is_eof: bool
+        _, is_eof = self._decode(store, 0, len(self._vm_bytecode))
+        return is_eof
+
+    def iter_instructions(self, vm_flags: int, vm_token_table: [str], lookahead: int = 64) -> Iterator[PRPInstruction]:
+        """
+        Decode instructions on demand. At most 'lookahead' instructions are decoded ahead of consumer,
+        so memory usage doesn't depend on total count of instructions in bytecode.
+        """
+        table: [Optional[tuple]] = PRPByteCode.decoder_table(vm_flags)
+        index: int = 0
+
+        while index < len(self._vm_bytecode):
+            chunk: PRPInstructionStore = PRPInstructionStore(table, vm_token_table)
+            index, _ = self._decode(chunk, index, lookahead)
+            yield from chunk
+
+    def _decode(self, store: PRPInstructionStore, index: int, max_instructions: int) -> (int, bool):
+        """Decode up to max_instructions instructions starting at byte index. Returns next byte index and EOF flag"""
+        op_codes, value_offsets, byte_offsets, integers, floats, tokens, objects = store.columns()
+        table: [Optional[tuple]] = store.decoder_table
+        vm_token_table: [str] = store.token_table
+        bytecode: Union[bytes, memoryview] = self._vm_bytecode
+        tokens_count: int = len(vm_token_table)
+        end: int = len(bytecode)
+        is_eof: bool = False
+
+        while index < end and max_instructions > 0:
+            max_instructions -= 1
+            op_code_byte: int = bytecode[index]
+            entry: Optional[tuple] = table[op_code_byte]
+            if entry is None:
+                raise PRPBadInstructionError(f"Got bad instruction at {index} (op-code byte is {op_code_byte})")
+
+            op_code, kind, unpack, size = entry
+            byte_offsets.append(index)
+
+            if kind == PRPInstructionStore.VK_VALUE or kind == PRPInstructionStore.VK_BOOL:
+                value_offsets.append(len(integers))
+                integers.append(unpack(bytecode, index + 1)[0])
+                index += size
+            elif kind == PRPInstructionStore.VK_TUPLE:
+                value_offsets.append(len(floats))
+                floats.append(unpack(bytecode, index + 1)[0])
+                index += size
+            elif kind == PRPInstructionStore.VK_NONE:
+                value_offsets.append(0)
+                index += 1
+                is_eof = is_eof or op_code == PRPOpCode.EndOfStream
+            elif kind == PRPInstructionStore.VK_TOKEN_STRING:
+                token_index: int = unpack(bytecode, index + 1)[0]
+                if token_index >= tokens_count:
+                    raise IndexError(f"Token index '{token_index}' is out of bounds (op-instruction: {index + 1})")
+
+                value_offsets.append(len(tokens))
+                tokens.append(token_index)
+                index += size
+            elif kind == PRPInstructionStore.VK_LENGTH:
+                length: int = unpack(bytecode, index + 1)[0]
+                value_offsets.append(len(integers))
+                integers.append(length)
+                op_codes.append(op_code_byte)
+                index += size
+
+                # Elements of array are mostly values of same fixed size, decode them at once
+                if (op_code == PRPOpCode.Array or op_code == PRPOpCode.NamedArray) and \
+                        1 < length <= max_instructions and index < end:
+                    index, max_instructions = self._decode_value_run(store, index, length, max_instructions)
+
+                continue
+            elif kind == PRPInstructionStore.VK_RAW_DATA:
+                capacity: int = unpack(bytecode, index + 1)[0]
+                index += size
+                value_offsets.append(len(objects))
+                objects.append(bytes(bytecode[index: index + capacity]) if capacity > 0 else [])
+                index += capacity
+            elif kind == PRPInstructionStore.VK_TOKEN_STR_ARRAY:
+                capacity: int = unpack(bytecode, index + 1)[0]
+                index += size
+                token_indices: tuple = struct.unpack_from(f'<{capacity}I', bytecode, index)
+                if capacity > 0 and max(token_indices) >= tokens_count:
+                    raise IndexError(f"Token index '{max(token_indices)}' is out of bounds (op-instruction: {index})")
+
+                value_offsets.append(len(tokens))
+                tokens.append(capacity)
+                tokens.extend(token_indices)
+                index += 4 * capacity
+            elif kind == PRPInstructionStore.VK_RAW_STRING:
+                length: int = unpack(bytecode, index + 1)[0]
+                if length <= 0:
+                    raise PRPBadInstructionError(f"Got bad instruction at {index + 1}")
+
+                index += size
+                value_offsets.append(len(objects))
+                objects.append(sys.intern(bytes(bytecode[index: index + length]).decode("ascii")))
+                index += length
+            elif kind == PRPInstructionStore.VK_CHAR:
+                value_offsets.append(len(integers))
+                integers.append(unpack(bytecode, index + 1)[0][0])
+                index += size
+            elif op_code == PRPOpCode.StringArray:
                 raise NotImplementedError("This combination of options not implemented yet!")
-        else:
-            value: int = int.from_bytes(self._vm_bytecode[vm_ctx.index: vm_ctx.index + 4], "little")
-            vm_ctx += 4
-            return PRPInstruction(vm_opcode, value)
-
-    def exchange_string(self, vm_ctx: PRPByteCodeContext, vm_flags: int, vm_token_table: [str]) -> str:
-        if (vm_flags >> 3) & 1:
-            token_index: int = int.from_bytes(self._vm_bytecode[vm_ctx.index: vm_ctx.index + 4], "little")
-            vm_ctx += 4
-            if token_index < 0 or token_index >= len(vm_token_table):
-                raise IndexError(f"Token index '{token_index}' is out of bounds (op-instruction: {vm_ctx.index - 4})")
-
-            return vm_token_table[token_index]
-        else:
-            length: int = int.from_bytes(self._vm_bytecode[vm_ctx.index: vm_ctx.index + 4], "little")
-            vm_ctx += 4
-            if length <= 0:
-                raise PRPBadInstructionError(f"Got bad instruction at {vm_ctx.index - 4}")
-
-            raw_bytes: [] = self._vm_bytecode[vm_ctx.index: vm_ctx.index + length]
-            vm_ctx += length
-            return ''.join(raw_bytes)
+            else:
+                raise NotImplementedError(f"This op-code ({op_code}) is not implemented yet")
+
+            op_codes.append(op_code_byte)
+
+        return index, is_eof
+
+    def _decode_value_run(self, store: PRPInstructionStore, index: int, count: int, max_instructions: int) -> (int, int):
+        """Try to decode count values of same op-code at once. Returns next byte index and budget of instructions"""
+        entry: Optional[tuple] = store.decoder_table[self._vm_bytecode[index]]
+        if entry is None or not PRPValueRun.is_supported(entry[0]):
+            return index, max_instructions
+
+        op_code, kind, _, size = entry
+        values: Optional[tuple] = PRPValueRun.unpack(self._vm_bytecode, index, op_code, count)
+        if values is None:
+            return index, max_instructions
+
+        op_codes, value_offsets, byte_offsets, integers, floats, _, _ = store.columns()
+        column: array = floats if kind == PRPInstructionStore.VK_TUPLE else integers
+
+        value_offsets.extend(range(len(column), len(column) + count))
+        byte_offsets.extend(range(index, index + size * count, size))
+        column.extend(values)
+        op_codes.frombytes(bytes([op_code.value]) * count)
+
+        return index + size * count, max_instructions - count
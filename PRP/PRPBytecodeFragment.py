@@ -0,0 +1,39 @@
+from typing import Callable
+import struct
+
+
+class PRPBytecodeFragment:
+    """
+    Already encoded sequence of instructions which could be spliced into bytecode of any PRP file (see
+    PRPWriter.encode_fragment and PRPWriter.write_stream).
+
+    Token indices inside of fragment refer to its own symbols list. Offsets of those indices are kept as fixups,
+    so they are remapped to symbols table of destination file when fragment is spliced.
+    """
+
+    # Fragment could be passed instead of instruction, op-code is never matched by encoders of writer
+    op_code = None
+
+    TOKEN_INDEX = struct.Struct('<i')
+
+    def __init__(self, bytecode: bytes, symbols: [str], token_fixups: [int], objects_count: int,
+                 instructions_count: int):
+        self.bytecode: bytes = bytecode
+        self.symbols: [str] = symbols
+        self.token_fixups: [int] = token_fixups
+        self.objects_count: int = objects_count
+        self.instructions_count: int = instructions_count
+
+    def relocate(self, symbol_index: Callable[[str], int]) -> bytes:
+        """Bytecode where token indices are replaced by indices which symbol_index returns for fragment symbols"""
+        if not self.token_fixups:
+            return self.bytecode
+
+        indices: [int] = [symbol_index(symbol) for symbol in self.symbols]
+        bytecode: bytearray = bytearray(self.bytecode)
+        token_index: struct.Struct = PRPBytecodeFragment.TOKEN_INDEX
+
+        for fixup in self.token_fixups:
+            token_index.pack_into(bytecode, fixup, indices[token_index.unpack_from(bytecode, fixup)[0]])
+
+        return bytes(bytecode)
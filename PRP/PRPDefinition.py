@@ -1,6 +1,5 @@
-from PRP import PRPDefinitionType, PRPOpCode
-from typing import Any
-import struct
+from PRP import PRPDefinitionType, PRPSymbolTable
+from typing import Any, Union
 
 
 class PRPDefinition:
@@ -32,34 +31,11 @@ class PRPDefinition:
     def def_data(self) -> Any:
         return self._def_data
 
-    def to_bytes(self, prp_flags: int, prp_symbols_table: [str]) -> bytes:
-        #TODO: Support packing of string by special flag in prp_flags
-        res: bytes = bytes()
+    def to_bytes(self, prp_flags: int, prp_symbols_table: Union[PRPSymbolTable, list]) -> bytes:
+        """Pack definition (see PRPDefinitionCodec.encode)"""
+        from PRP import PRPDefinitionCodec
 
-        res += struct.pack('<ci', PRPOpCode.String.value.to_bytes(1, "little"), prp_symbols_table.index(self.def_name))
-        res += struct.pack('<ci', PRPOpCode.Int32.value.to_bytes(1, "little"), self.def_type.value)
+        if not isinstance(prp_symbols_table, PRPSymbolTable):
+            prp_symbols_table = PRPSymbolTable(prp_symbols_table)
 
-        if self.def_type == PRPDefinitionType.Array_Int32 or self.def_type == PRPDefinitionType.Array_Float32:
-            capacity: int = len(self.def_data)
-            # 1. Write capacity as Int32 value
-            res += struct.pack('<ci', PRPOpCode.Int32.value.to_bytes(1, "little"), capacity)
-            # 2. Write Array declaration with same capacity
-            res += struct.pack('<ci', PRPOpCode.Array.value.to_bytes(1, "little"), capacity)
-            # 3. Write values
-            for entry in self.def_data:
-                if self.def_type == PRPDefinitionType.Array_Int32:
-                    res += struct.pack('<ci', PRPOpCode.Int32.value.to_bytes(1, "little"), entry)
-                else:
-                    res += struct.pack('<cf', PRPOpCode.Float32.value.to_bytes(1, "little"), entry[0])
-            res += struct.pack('<c', PRPOpCode.EndArray.value.to_bytes(1, "little"))
-        elif self.def_type in [PRPDefinitionType.StringRef_1, PRPDefinitionType.StringRef_2, PRPDefinitionType.StringRef_3]:
-            # Write string tag and string index
-            res += struct.pack('<ci', PRPOpCode.String.value.to_bytes(1, "little"), prp_symbols_table.index(self.def_data))
-        elif self.def_type == PRPDefinitionType.StringRefTab:
-            # 1. Write Op-Code Container
-            res += struct.pack('<ci', PRPOpCode.Container.value.to_bytes(1, "little"), len(self.def_data))
-            # 2. Write each entry
-            for entry in self.def_data:
-                res += struct.pack('<ci', PRPOpCode.String.value.to_bytes(1, "little"), prp_symbols_table.index(entry))
-
-        return res
+        return PRPDefinitionCodec.encode(self, prp_flags, prp_symbols_table)
@@ -0,0 +1,154 @@
+from PRP import PRPDefinition, PRPDefinitionType, PRPOpCode, PRPValueRun, PRPSymbolTable, PRPStructureError, \
+    PRPBadDefinitionError
+from typing import Optional
+import struct
+
+
+class PRPDefinitionCodec:
+    """
+    Codec of ZDefinitions block over a buffer. Fixed parts of each definition kind are (un)packed by precompiled
+    layouts, arrays of values and string tables are (un)packed at once (see PRPValueRun).
+    """
+
+    # Op-code + 32 bit value (unsigned when decoded, signed when encoded)
+    TAGGED_U32 = struct.Struct('<BI')
+    TAGGED_I32 = struct.Struct('<Bi')
+    # Two tagged values: entry head (String name, Int32 type kind) and array head (Int32 capacity, Array capacity)
+    TWO_TAGGED_U32 = struct.Struct('<BIBI')
+    TWO_TAGGED_I32 = struct.Struct('<BiBi')
+
+    STRING_REF_TYPES = frozenset([PRPDefinitionType.StringRef_1, PRPDefinitionType.StringRef_2,
+                                  PRPDefinitionType.StringRef_3])
+
+    @staticmethod
+    def decode(buffer, offset: int, flags: int, symbols: [str]) -> (int, [PRPDefinition]):
+        """Read ZDefinitions container at offset. Returns offset after it and definitions"""
+        # 1. Exchange root container
+        offset, entries_count = PRPDefinitionCodec._read_tagged_u32(buffer, offset, PRPOpCode.Container)
+        if entries_count <= 0:
+            raise PRPStructureError(f"Bad ZDef entries count in PRP file!", offset)
+
+        # 2. Read entry by entry
+        definitions: [PRPDefinition] = []
+        for entry_idx in range(0, entries_count):
+            name_op, name_index, kind_op, kind_value = PRPDefinitionCodec.TWO_TAGGED_U32.unpack_from(buffer, offset)
+            PRPDefinitionCodec._expect_op_code(name_op, offset, PRPOpCode.String)
+            PRPDefinitionCodec._expect_op_code(kind_op, offset + 5, PRPOpCode.Int32)
+            offset += PRPDefinitionCodec.TWO_TAGGED_U32.size
+
+            name: str = PRPDefinitionCodec._get_symbol(symbols, name_index)
+            kind: PRPDefinitionType = PRPDefinitionType.from_byte(kind_value)
+
+            if kind == PRPDefinitionType.Array_Int32 or kind == PRPDefinitionType.Array_Float32:
+                offset, data = PRPDefinitionCodec._decode_array(buffer, offset, kind)
+            elif kind in PRPDefinitionCodec.STRING_REF_TYPES:
+                offset, value_index = PRPDefinitionCodec._read_tagged_u32(buffer, offset, PRPOpCode.String)
+                data = PRPDefinitionCodec._get_symbol(symbols, value_index)
+            elif kind == PRPDefinitionType.StringRefTab:
+                offset, data = PRPDefinitionCodec._decode_string_table(buffer, offset, flags, symbols)
+            elif kind == PRPDefinitionType.ERR_UNKNOWN:
+                raise PRPStructureError(f"Got bad ZDEFINTION type kind {kind_value}", offset)
+            else:
+                raise NotImplementedError(f"Type kind {kind_value} not implemented yet")
+
+            definitions.append(PRPDefinition(name, kind, data))
+
+        return offset, definitions
+
+    @staticmethod
+    def encode(definition: PRPDefinition, flags: int, symbols: PRPSymbolTable) -> bytes:
+        """Pack single definition"""
+        # TODO: Support packing of string by special flag in prp_flags
+        result: bytes = PRPDefinitionCodec.TWO_TAGGED_I32.pack(PRPOpCode.String.value, symbols.index(definition.def_name),
+                                                               PRPOpCode.Int32.value, definition.def_type.value)
+
+        if definition.def_type == PRPDefinitionType.Array_Int32 or definition.def_type == PRPDefinitionType.Array_Float32:
+            capacity: int = len(definition.def_data)
+            result += PRPDefinitionCodec.TWO_TAGGED_I32.pack(PRPOpCode.Int32.value, capacity,
+                                                             PRPOpCode.Array.value, capacity)
+
+            if definition.def_type == PRPDefinitionType.Array_Int32:
+                result += PRPValueRun.pack(PRPOpCode.Int32, definition.def_data, 'i')
+            else:
+                result += PRPValueRun.pack(PRPOpCode.Float32, definition.def_data)
+
+            result += bytes([PRPOpCode.EndArray.value])
+        elif definition.def_type in PRPDefinitionCodec.STRING_REF_TYPES:
+            result += PRPDefinitionCodec.TAGGED_I32.pack(PRPOpCode.String.value, symbols.index(definition.def_data))
+        elif definition.def_type == PRPDefinitionType.StringRefTab:
+            result += PRPDefinitionCodec.TAGGED_I32.pack(PRPOpCode.Container.value, len(definition.def_data))
+            result += PRPValueRun.pack(PRPOpCode.String, [symbols.index(entry) for entry in definition.def_data], 'i')
+
+        return result
+
+    @staticmethod
+    def _decode_array(buffer, offset: int, kind: PRPDefinitionType) -> (int, list):
+        capacity_op, capacity, array_op, array_capacity = PRPDefinitionCodec.TWO_TAGGED_U32.unpack_from(buffer, offset)
+        PRPDefinitionCodec._expect_op_code(capacity_op, offset, PRPOpCode.Int32)
+        PRPDefinitionCodec._expect_op_code(array_op, offset + 5, PRPOpCode.Array)
+        offset += PRPDefinitionCodec.TWO_TAGGED_U32.size
+
+        if not array_capacity == capacity:
+            raise PRPBadDefinitionError("ArrayInt32 capacity and BeginArray op-code length are not same")
+
+        entry_op_code: PRPOpCode = PRPOpCode.Int32 if kind == PRPDefinitionType.Array_Int32 else PRPOpCode.Float32
+        values: Optional[tuple] = PRPValueRun.unpack(buffer, offset, entry_op_code, array_capacity) \
+            if array_capacity > 0 else ()
+        if values is None:
+            # Find first bad element to report it
+            for entry_idx in range(0, array_capacity):
+                PRPDefinitionCodec._expect_op_code(buffer[offset + 5 * entry_idx], offset + 5 * entry_idx, entry_op_code)
+
+            raise PRPStructureError(f"Array of {array_capacity} elements is truncated", offset)
+
+        offset += 5 * array_capacity
+        PRPDefinitionCodec._expect_op_code(buffer[offset], offset, PRPOpCode.EndArray)
+        offset += 1
+
+        if kind == PRPDefinitionType.Array_Int32:
+            return offset, list(values)
+
+        return offset, [(value,) for value in values]
+
+    @staticmethod
+    def _decode_string_table(buffer, offset: int, flags: int, symbols: [str]) -> (int, [str]):
+        offset, capacity = PRPDefinitionCodec._read_tagged_u32(buffer, offset, PRPOpCode.Container)
+
+        if (flags >> 3) & 1:
+            # By index (all entries at once)
+            indices: Optional[tuple] = PRPValueRun.unpack(buffer, offset, PRPOpCode.String, capacity, 'I') \
+                if capacity > 0 else ()
+            if indices is not None:
+                return offset + 5 * capacity, [PRPDefinitionCodec._get_symbol(symbols, index) for index in indices]
+
+        entries: [str] = []
+        for entry_idx in range(0, capacity):
+            offset, value = PRPDefinitionCodec._read_tagged_u32(buffer, offset, PRPOpCode.String)
+            if (flags >> 3) & 1:
+                # By index
+                entries.append(PRPDefinitionCodec._get_symbol(symbols, value))
+            else:
+                # By raw contents
+                entries.append(bytes(buffer[offset:offset + value]).decode("ascii"))
+                offset += value
+
+        return offset, entries
+
+    @staticmethod
+    def _get_symbol(symbols: [str], token_index: int) -> str:
+        if token_index < 0 or token_index >= len(symbols):
+            raise IndexError(f"Bad string token index (out of bounds): {token_index}")
+
+        return symbols[token_index]
+
+    @staticmethod
+    def _expect_op_code(op_code_value: int, offset: int, expected_op_code: PRPOpCode):
+        if not PRPOpCode.from_byte(op_code_value) == expected_op_code:
+            raise PRPStructureError(f"Expected {expected_op_code!r} but got {op_code_value}", offset + 1)
+
+    @staticmethod
+    def _read_tagged_u32(buffer, offset: int, expected_op_code: PRPOpCode) -> (int, int):
+        """Read op-code byte followed by 32 bit value. Returns offset after the value and the value itself"""
+        op_code_value, value = PRPDefinitionCodec.TAGGED_U32.unpack_from(buffer, offset)
+        PRPDefinitionCodec._expect_op_code(op_code_value, offset, expected_op_code)
+        return offset + 5, value
@@ -10,6 +10,10 @@ class PRPDefinitionType(IntEnum):
     StringRefTab = 0x11,
     ERR_UNKNOWN = 0xFFFF
 
+    def __str__(self):
+        # Scene JSON stores names as 'Class.Member' (IntEnum prints plain value since Python 3.11)
+        return f"{self.__class__.__name__}.{self.name}"
+
     @staticmethod
     def from_byte(value: int):
         if value == 2:
@@ -1,18 +1,31 @@
-from PRP import PRPOpCode
-from typing import Any
+from PRP import PRPOpCode, PRPSymbolTable
+from typing import Any, Union
 import struct
 
 
 class PRPInstruction:
+    __slots__ = ('_op_code', '_op_data')
+
+    INTEGRAL_OP_CODES = frozenset([PRPOpCode.Int8, PRPOpCode.NamedInt8,
+                                   PRPOpCode.Int16, PRPOpCode.NamedInt16,
+                                   PRPOpCode.Int32, PRPOpCode.NamedInt32])
+    FLOAT_OP_CODES = frozenset([PRPOpCode.Float32, PRPOpCode.NamedFloat32,
+                                PRPOpCode.Float64, PRPOpCode.NamedFloat64])
+    BOOL_OP_CODES = frozenset([PRPOpCode.Bool, PRPOpCode.NamedBool])
+    CHAR_OP_CODES = frozenset([PRPOpCode.Char, PRPOpCode.NamedChar])
+    STRING_OP_CODES = frozenset([PRPOpCode.String, PRPOpCode.NamedString])
+    # Op-codes without data. Instructions of these op-codes are shared (see trusted())
+    NO_DATA_OP_CODES = frozenset([PRPOpCode.BeginObject, PRPOpCode.EndObject, PRPOpCode.EndArray,
+                                  PRPOpCode.SkipMark, PRPOpCode.EndOfStream])
+
+    _shared_instructions: dict = dict()
+
     def __init__(self, op_code: PRPOpCode, data: object = None):
-        if op_code in [PRPOpCode.Int8, PRPOpCode.NamedInt8,
-                       PRPOpCode.Int16, PRPOpCode.NamedInt16,
-                       PRPOpCode.Int32, PRPOpCode.NamedInt32]:
+        if op_code in PRPInstruction.INTEGRAL_OP_CODES:
             if not isinstance(data, int):
                 raise ValueError(f"Expected integral value, got {type(data).__name__}")
 
-        if op_code in [PRPOpCode.Float32, PRPOpCode.NamedFloat32,
-                       PRPOpCode.Float64, PRPOpCode.NamedFloat64]:
+        elif op_code in PRPInstruction.FLOAT_OP_CODES:
             if isinstance(data, list) or isinstance(data, tuple):
                 if not isinstance(data[0], float):
                     raise ValueError(f"Expected float tuple value, got {type(data).__name__}")
@@ -20,16 +33,16 @@ class PRPInstruction:
                 if not isinstance(data, float):
                     raise ValueError(f"Expected float value, got {type(data).__name__}")
 
-        if op_code in [PRPOpCode.Bool, PRPOpCode.NamedBool]:
+        elif op_code in PRPInstruction.BOOL_OP_CODES:
             if not isinstance(data, bool):
                 if data not in [0, 1]:
                     raise ValueError(f"Expected 0/1 value, got {type(data).__name__}")
 
-        if op_code in [PRPOpCode.Char, PRPOpCode.NamedChar]:
+        elif op_code in PRPInstruction.CHAR_OP_CODES:
             if not isinstance(data, str):
                 raise ValueError(f"Expected string value, got {type(data).__name__}")
 
-        if op_code in [PRPOpCode.String, PRPOpCode.NamedString]:
+        elif op_code in PRPInstruction.STRING_OP_CODES:
             if "data" not in data:
                 raise ValueError(f"Expected 'data' property for string declaration")
 
@@ -45,6 +58,21 @@ class PRPInstruction:
         self._op_code = op_code
         self._op_data = data
 
+    @staticmethod
+    def trusted(op_code: PRPOpCode, data: object = None):
+        """
+        Create instruction without validation of data. Use it only for data decoded from bytecode
+        (JSON sourced instructions must be created by constructor or from_json()).
+        For op-codes without data shared instance is returned, so it must not be modified.
+        """
+        if data is None and op_code in PRPInstruction._shared_instructions:
+            return PRPInstruction._shared_instructions[op_code]
+
+        instruction: PRPInstruction = object.__new__(PRPInstruction)
+        instruction._op_code = op_code
+        instruction._op_data = data
+        return instruction
+
     def _get_op_data(self) -> Any:
         return self._op_data
 
@@ -88,7 +116,7 @@ class PRPInstruction:
             'op_data': res_data
         }
 
-    def to_bytes(self, flags: int, token_table: [str]) -> bytes:
+    def to_bytes(self, flags: int, token_table: Union[PRPSymbolTable, list]) -> bytes:
         res: bytes = bytes()
         res += struct.pack('<c', self.op_code.value.to_bytes(1, "little"))
 
@@ -150,4 +178,7 @@ class PRPInstruction:
             else:
                 res += struct.pack('<i', data)
 
-        return res
\ No newline at end of file
+        return res
+
+
+PRPInstruction._shared_instructions = {op_code: PRPInstruction(op_code) for op_code in PRPInstruction.NO_DATA_OP_CODES}
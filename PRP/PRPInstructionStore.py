@@ -0,0 +1,158 @@
+from PRP import PRPInstruction, PRPOpCode
+from typing import Any, Optional, Union
+from array import array
+
+
+class PRPInstructionStore:
+    """
+    Struct-of-arrays storage of decoded PRP instructions.
+
+    Each instruction takes one op-code byte, one value offset and offset of instruction in bytecode. The value itself lives in the typed column
+    selected by the value kind of op-code (see VK_* constants). Strings are kept as indices in token table and
+    resolved only when instruction is requested.
+
+    The store is read-only sequence of PRPInstruction: instructions are created on demand by indexing/iteration.
+    """
+
+    # Value kinds (how value after op-code byte is stored)
+    VK_NONE:            int = 0  # No value (BeginObject, EndObject, ...)
+    VK_VALUE:           int = 1  # Integral value (Int8/16/32, Bitfield, ...) stored in integers column
+    VK_TUPLE:           int = 2  # Floating point value (Float32, Float64) stored in floats column
+    VK_LENGTH:          int = 3  # Length of Array/Container, stored in integers column
+    VK_CHAR:            int = 4  # Single ASCII character, stored in integers column
+    VK_TOKEN_STRING:    int = 5  # String stored as index in token table (tokens column)
+    VK_RAW_STRING:      int = 6  # String stored as length + raw ASCII bytes (objects column)
+    VK_RAW_DATA:        int = 7  # Length + raw bytes (objects column)
+    VK_TOKEN_STR_ARRAY: int = 8  # Count + N indices in token table (tokens column)
+    VK_REFERENCE:       int = 9  # Not implemented yet
+    VK_BOOL:            int = 10  # Boolean value stored in integers column
+
+    def __init__(self, vm_decoder_table: [Optional[tuple]], vm_token_table: [str]):
+        self._decoder_table: [Optional[tuple]] = vm_decoder_table
+        self._token_table: [str] = vm_token_table
+
+        self._op_codes: array = array('B')
+        self._value_offsets: array = array('I')
+        self._byte_offsets: array = array('I')
+        self._integers: array = array('I')
+        self._floats: array = array('d')
+        self._tokens: array = array('I')
+        self._objects: list = []
+
+        self._structure_index = None
+
+    @staticmethod
+    def from_columns(vm_decoder_table: [Optional[tuple]], vm_token_table: [str], columns: tuple) -> 'PRPInstructionStore':
+        """Store of already decoded instructions (columns are same as returned by columns())"""
+        store: PRPInstructionStore = PRPInstructionStore(vm_decoder_table, vm_token_table)
+        store._op_codes, store._value_offsets, store._byte_offsets, store._integers, store._floats, store._tokens, \
+            store._objects = columns
+        return store
+
+    def columns(self) -> (array, array, array, array, array, array, list):
+        """Returns (op-codes, value offsets, byte offsets, integers, floats, tokens, objects) columns to fill by decoder"""
+        return self._op_codes, self._value_offsets, self._byte_offsets, self._integers, self._floats, self._tokens, \
+            self._objects
+
+    @property
+    def op_codes(self) -> memoryview:
+        """Read-only view of op-code bytes of all instructions"""
+        return memoryview(self._op_codes).toreadonly()
+
+    @property
+    def decoder_table(self) -> [Optional[tuple]]:
+        return self._decoder_table
+
+    @property
+    def token_table(self) -> [str]:
+        return self._token_table
+
+    @property
+    def structure(self):
+        """PRPStructureIndex over this store. It's built on first access, store must be completely filled by then"""
+        if self._structure_index is None:
+            from PRP.PRPStructureIndex import PRPStructureIndex
+            self._structure_index = PRPStructureIndex(self)
+
+        return self._structure_index
+
+    @property
+    def nbytes(self) -> int:
+        """Approximated memory usage of columns (without objects column payload)"""
+        return sum(column.itemsize * len(column) for column in (self._op_codes, self._value_offsets, self._byte_offsets,
+                                                                self._integers, self._floats, self._tokens))
+
+    def op_code_at(self, index: int) -> PRPOpCode:
+        return self._decoder_table[self._op_codes[index]][0]
+
+    def byte_offset_at(self, index: int) -> int:
+        """Offset of instruction from the beginning of bytecode"""
+        return self._byte_offsets[index]
+
+    def op_data_at(self, index: int) -> Any:
+        op_code, kind = self._decoder_table[self._op_codes[index]][0:2]
+        offset: int = self._value_offsets[index]
+
+        if kind == PRPInstructionStore.VK_VALUE:
+            return self._integers[offset]
+        elif kind == PRPInstructionStore.VK_TUPLE:
+            return (self._floats[offset],)
+        elif kind == PRPInstructionStore.VK_NONE:
+            return None
+        elif kind == PRPInstructionStore.VK_TOKEN_STRING:
+            data: str = self._token_table[self._tokens[offset]]
+            return {'length': len(data), 'data': data}
+        elif kind == PRPInstructionStore.VK_LENGTH:
+            return {'length': self._integers[offset]}
+        elif kind == PRPInstructionStore.VK_BOOL:
+            return bool(self._integers[offset])
+        elif kind == PRPInstructionStore.VK_TOKEN_STR_ARRAY:
+            count: int = self._tokens[offset]
+            return [self._token_table[token_index] for token_index in self._tokens[offset + 1: offset + 1 + count]]
+        elif kind == PRPInstructionStore.VK_RAW_STRING:
+            data: str = self._objects[offset]
+            return {'length': len(data), 'data': data}
+        elif kind == PRPInstructionStore.VK_RAW_DATA:
+            data: Union[bytes, list] = self._objects[offset]
+            return {'length': len(data), 'data': data}
+        elif kind == PRPInstructionStore.VK_CHAR:
+            return chr(self._integers[offset])
+
+        raise NotImplementedError(f"This op-code ({op_code}) is not implemented yet")
+
+    def op_data_run(self, index: int, count: int) -> Optional[list]:
+        """
+        Op-data of count instructions starting at index, when all of them have the same op-code (None otherwise).
+        Values of such instructions are contiguous in their column, so they are sliced at once
+        """
+        if count <= 0 or index + count > len(self._op_codes) or \
+                self._op_codes[index:index + count] != array('B', [self._op_codes[index]]) * count:
+            return None
+
+        kind: int = self._decoder_table[self._op_codes[index]][1]
+        offset: int = self._value_offsets[index]
+
+        if kind == PRPInstructionStore.VK_VALUE:
+            return self._integers[offset:offset + count].tolist()
+        elif kind == PRPInstructionStore.VK_TUPLE:
+            return [(value,) for value in self._floats[offset:offset + count]]
+        elif kind == PRPInstructionStore.VK_BOOL:
+            return [bool(value) for value in self._integers[offset:offset + count]]
+
+        return [self.op_data_at(i) for i in range(index, index + count)]
+
+    def __len__(self) -> int:
+        return len(self._op_codes)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[PRPInstruction, list]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self._op_codes)))]
+
+        if index < 0:
+            index += len(self._op_codes)
+
+        return PRPInstruction.trusted(self.op_code_at(index), self.op_data_at(index))
+
+    def __iter__(self):
+        for index in range(0, len(self._op_codes)):
+            yield self[index]
@@ -0,0 +1,61 @@
+from PRP import PRPInstruction
+from typing import Iterator
+
+
+class PRPInstructionStream:
+    """
+    Forward-only window over lazily decoded instructions.
+
+    Instructions are addressed by absolute index (same as in PRPInstructionStore), so visitors could consume it
+    directly. Instructions are pulled from the source on first access and kept until consumer calls release().
+    """
+
+    def __init__(self, source: Iterator[PRPInstruction]):
+        self._source: Iterator[PRPInstruction] = source
+        self._window: [PRPInstruction] = []
+        self._window_begin: int = 0
+
+    def __len__(self) -> int:
+        """Count of instructions pulled from source so far (total count after drain())"""
+        return self._window_begin + len(self._window)
+
+    def __getitem__(self, index: int) -> PRPInstruction:
+        if index < self._window_begin:
+            raise IndexError(f"Instruction {index} already released (window begins at {self._window_begin})")
+
+        while index >= self._window_begin + len(self._window):
+            try:
+                self._window.append(next(self._source))
+            except StopIteration:
+                raise IndexError(f"Instruction index {index} is out of bounds (total {len(self)})")
+
+        return self._window[index - self._window_begin]
+
+    def prefetch(self, count: int = 1) -> int:
+        """
+        Pull instructions from source until window holds first count of them (lazy source reads PRP header with first
+        instruction, so errors of header are raised here). Returns count of instructions pulled so far
+        """
+        if count > 0:
+            self[count - 1]
+
+        return len(self)
+
+    def release(self, index: int):
+        """Forget all pulled instructions before index"""
+        index = min(index, len(self))
+        if index <= self._window_begin:
+            return
+
+        del self._window[:index - self._window_begin]
+        self._window_begin = index
+
+    def drain(self) -> int:
+        """Pull all remaining instructions from source without keeping them. Returns total count of instructions"""
+        self._window_begin += len(self._window)
+        self._window = []
+
+        for _ in self._source:
+            self._window_begin += 1
+
+        return self._window_begin
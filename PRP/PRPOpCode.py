@@ -41,6 +41,10 @@ class PRPOpCode(IntEnum):
     ERR_UNKNOWN = 0xFFFD,
     ERR_NO_TAG = 0xFFFE
 
+    def __str__(self):
+        # Scene JSON stores names as 'Class.Member' (IntEnum prints plain value since Python 3.11)
+        return f"{self.__class__.__name__}.{self.name}"
+
     @staticmethod
     def from_byte(byte):
         if byte == 0x0E: return PRPOpCode.StringOrArray_E
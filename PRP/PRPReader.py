@@ -1,11 +1,21 @@
-from PRP import PRPDefinition, PRPDefinitionType, PRPInstruction, PRPByteCode, PRPOpCode, PRPStructureError, PRPBadDefinitionError
-from typing import Optional
+from PRP import PRPDefinition, PRPDefinitionCodec, PRPInstruction, PRPInstructionStore, PRPByteCode, \
+    PRPStructureError, PRPSidecarIndex, PRPStructureIndex
+from typing import Optional, Iterator
+from array import array
+from contextlib import contextmanager
 import struct
+import mmap
+import sys
+import os
 
 
 class PRPReader:
-    def __init__(self, prp_file_path: str):
+    HEADER = struct.Struct('<14s?I4xII')
+    U32 = struct.Struct('<I')
+
+    def __init__(self, prp_file_path: str, use_mmap: bool = True):
         self._prp_path = prp_file_path
+        self._prp_use_mmap: bool = use_mmap
         self._prp_magic_bytes: bytes = bytes()
         self._prp_is_raw: bool = False
         self._prp_flags: int = 0x0
@@ -15,6 +25,7 @@ class PRPReader:
         self._prp_objects_presented: int = 0
         self._prp_definitions: [PRPDefinition] = []
         self._prp_properties: Optional[PRPByteCode] = None
+        self._prp_bytecode_offset: int = 0
 
     @property
     def is_raw(self) -> bool:
@@ -35,198 +46,160 @@ class PRPReader:
 
         raise RuntimeError("You should call parse() method before use this property!")
 
+    @property
+    def index_path(self) -> str:
+        """Default location of sidecar index of this PRP file"""
+        return self._prp_path + PRPSidecarIndex.FILE_EXTENSION
+
     def parse(self):
+        with self._open_buffer() as prp_buffer:
+            bytecode_offset: int = self._parse_header(prp_buffer)
+
+            # Read ByteCode (in place, the buffer view is released once all instructions are decoded)
+            with memoryview(prp_buffer) as prp_view:
+                self._prp_properties = PRPByteCode(prp_view[bytecode_offset:])
+                try:
+                    self._prp_properties.prepare(self._prp_flags, self._prp_string_table)
+                finally:
+                    self._prp_properties.release()
+
+    def parsed_state(self) -> dict:
+        """Everything what parse() read as plain values, to be saved and restored later (see restore_parsed_state)"""
+        store: PRPInstructionStore = self.instructions
+        return {
+            'header': (self._prp_magic_bytes, self._prp_is_raw, self._prp_flags, self._prp_total_keys_count,
+                       self._prp_data_offset, self._prp_objects_presented, self._prp_bytecode_offset),
+            'symbols': self._prp_string_table,
+            'definitions': [definition.__dict__() for definition in self._prp_definitions],
+            'columns': store.columns()
+        }
+
+    def restore_parsed_state(self, state: dict):
+        """Restore state of parse() without reading PRP file"""
+        self._prp_magic_bytes, self._prp_is_raw, self._prp_flags, self._prp_total_keys_count, self._prp_data_offset, \
+            self._prp_objects_presented, self._prp_bytecode_offset = state['header']
+        self._prp_string_table = state['symbols']
+        self._prp_definitions = [PRPDefinition.from_json(definition) for definition in state['definitions']]
+
+        store: PRPInstructionStore = PRPInstructionStore.from_columns(PRPByteCode.decoder_table(self._prp_flags),
+                                                                      self._prp_string_table, state['columns'])
+        self._prp_properties = PRPByteCode.from_instructions(store)
+
+    def iter_instructions(self, lookahead: int = 64) -> Iterator[PRPInstruction]:
+        """
+        Lazy alternative of parse(): header, symbols and definitions are read when first instruction requested,
+        then instructions are decoded on demand (see PRPByteCode.iter_instructions). File stays open until generator
+        is exhausted or closed.
+        """
+        with self._open_buffer() as prp_buffer:
+            bytecode_offset: int = self._parse_header(prp_buffer)
+
+            with memoryview(prp_buffer) as prp_view:
+                byte_code: PRPByteCode = PRPByteCode(prp_view[bytecode_offset:])
+                try:
+                    yield from byte_code.iter_instructions(self._prp_flags, self._prp_string_table, lookahead)
+                finally:
+                    byte_code.release()
+
+    def write_index(self, index_path: Optional[str] = None) -> PRPSidecarIndex:
+        """Save sidecar index of geoms (see PRPSidecarIndex) built from parsed instructions. Requires parse()"""
+        structure: PRPStructureIndex = self.instructions.structure
+        store: PRPInstructionStore = self.instructions
+        entries: array = array('I')
+
+        for geom in range(0, structure.geoms_count):
+            for instruction_index in (structure.geom_begin(geom), structure.geom_controllers(geom),
+                                      structure.geom_children(geom)):
+                entries.append(self._prp_bytecode_offset + store.byte_offset_at(instruction_index))
+                entries.append(instruction_index)
+
+        prp_stat: os.stat_result = os.stat(self._prp_path)
+        index: PRPSidecarIndex = PRPSidecarIndex(PRPSidecarIndex.checksum_of(self._prp_path), prp_stat.st_size,
+                                                 prp_stat.st_mtime_ns, self._prp_bytecode_offset, entries)
+        index.save(index_path if index_path is not None else self.index_path)
+        return index
+
+    def load_index(self, index_path: Optional[str] = None) -> Optional[PRPSidecarIndex]:
+        """Load sidecar index. Returns None when there is no index or it was built for another contents of PRP file"""
+        try:
+            index: PRPSidecarIndex = PRPSidecarIndex.load(index_path if index_path is not None else self.index_path)
+        except (OSError, PRPStructureError):
+            return None
+
+        return index if index.is_valid_for(self._prp_path) else None
+
+    def read_geom_subtree(self, index: PRPSidecarIndex, geom: int, end_geom: int) -> PRPInstructionStore:
+        """
+        Decode only instructions of geom subtree (properties, controllers and children of geoms from geom to end_geom
+        exclusive, in traversal order) using sidecar index. Subtree of last top level geom is decoded until the end of
+        bytecode. Instructions in returned store are numbered from 0 (first one is BeginObject of geom properties)
+        """
+        properties_offset, _ = index.geom_properties(geom)
+        end_offset: Optional[int] = index.geom_properties(end_geom)[0] if end_geom < index.geoms_count else None
+        return self._read_range(properties_offset, end_offset)
+
+    def _read_range(self, begin_offset: int, end_offset: Optional[int]) -> PRPInstructionStore:
+        """Decode instructions between byte offsets of PRP file (end_offset None - until the end of file)"""
+        with self._open_buffer() as prp_buffer:
+            if self._prp_bytecode_offset == 0:
+                self._parse_header(prp_buffer)
+
+            with memoryview(prp_buffer) as prp_view:
+                byte_code: PRPByteCode = PRPByteCode(prp_view[begin_offset:end_offset])
+                try:
+                    byte_code.prepare(self._prp_flags, self._prp_string_table)
+                finally:
+                    byte_code.release()
+
+        return byte_code.instructions
+
+    @contextmanager
+    def _open_buffer(self):
         with open(self._prp_path, "rb") as prp_file:
-            # Read header
-            self._prp_magic_bytes = prp_file.read(0xE)
-            self._prp_is_raw = bool.from_bytes(prp_file.read(0x1), "little")
-            self._prp_flags = int.from_bytes(prp_file.read(0x4), "little")
-            prp_file.seek(0x4, 1)
-            self._prp_total_keys_count = int.from_bytes(prp_file.read(0x4), "little")
-            self._prp_data_offset = int.from_bytes(prp_file.read(0x4), "little")
-            # Validate header
-            if not self._prp_magic_bytes == b"IOPacked v0.1\x00":
-                raise PRPStructureError("Invalid magic bytes signature", 0)
-
-            # Read symbols table
-            prp_file.seek(0x1F, 0)  # Seek to symbols region
-            tmp_symbol_buffer: [] = []
-
-            while len(self._prp_string_table) != self._prp_total_keys_count + 1:
-                c = prp_file.read(0x1)
-                if c == b'\x00':
-                    self._prp_string_table.append(''.join(tmp_symbol_buffer))
-                    tmp_symbol_buffer = []
-                else:
-                    tmp_symbol_buffer.append(c.decode("ascii"))
-
-            # Read objects counter
-            self._prp_objects_presented = int.from_bytes(prp_file.read(0x4), "little")
-
-            # Read ZDefinitions
-            # 1. Exchange root container
-            prp_zdef_container_root_op_code_byte = int.from_bytes(prp_file.read(0x1), "little")
-            prp_zdef_container_root_op_code: PRPOpCode = PRPOpCode.from_byte(prp_zdef_container_root_op_code_byte)
-            if not prp_zdef_container_root_op_code == PRPOpCode.Container:
-                raise PRPStructureError(f"Expected PRPOpCode.Container but got {prp_zdef_container_root_op_code_byte}", prp_file.tell())
-
-            # 2. Read entry by entry
-            self._prp_definitions = []
-            prp_zdef_entries_count: int = int.from_bytes(prp_file.read(0x4), "little")
-            if prp_zdef_entries_count <= 0:
-                raise PRPStructureError(f"Bad ZDef entries count in PRP file!", prp_file.tell())
-
-            for entry_idx in range(0, prp_zdef_entries_count):
-                # 1. Read op-code
-                prp_zdef_name_decl_op_code_byte = int.from_bytes(prp_file.read(0x1), "little")
-                prp_zdef_name_decl_op_code: PRPOpCode = PRPOpCode.from_byte(prp_zdef_name_decl_op_code_byte)
-                if not prp_zdef_name_decl_op_code == PRPOpCode.String:
-                    raise PRPStructureError(f"Expected PRPOpCode.String but got {prp_zdef_container_root_op_code_byte}", prp_file.tell())
-
-                prp_zdef_name_token_index: int = int.from_bytes(prp_file.read(0x4), "little")
-                if prp_zdef_name_token_index < 0 or prp_zdef_name_token_index >= len(self._prp_string_table):
-                    raise IndexError(f"Bad string token index (out of bounds): {prp_zdef_name_token_index}")
-
-                prp_zdef_name: str = self._prp_string_table[prp_zdef_name_token_index]
-
-                prp_zdef_type_kind_op_code_byte = int.from_bytes(prp_file.read(0x1), "little")
-                prp_zdef_type_kind_op_code: PRPOpCode = PRPOpCode.from_byte(prp_zdef_type_kind_op_code_byte)
-                if not prp_zdef_type_kind_op_code == PRPOpCode.Int32:
-                    raise PRPStructureError(f"Expected PRPOpCode.Int32 but got {prp_zdef_type_kind_op_code_byte}", prp_file.tell())
-
-                prp_zdef_type_kind_value: int = int.from_bytes(prp_file.read(0x4), "little")
-                prp_zdef_type_kind: PRPDefinitionType = PRPDefinitionType.from_byte(prp_zdef_type_kind_value)
-                if prp_zdef_type_kind == PRPDefinitionType.ERR_UNKNOWN:
-                    raise PRPStructureError(f"Got bad ZDEFINTION type kind {prp_zdef_type_kind_value}", prp_file.tell())
-
-                if prp_zdef_type_kind == PRPDefinitionType.Array_Int32:
-                    prp_zdef_value_arr_i32_op_code_value = int.from_bytes(prp_file.read(0x1), "little")
-                    prp_zdef_value_arr_i32_op_code: PRPOpCode = PRPOpCode.from_byte(prp_zdef_value_arr_i32_op_code_value)
-                    if not prp_zdef_value_arr_i32_op_code == PRPOpCode.Int32:
-                        raise PRPStructureError(f"Got bad ZDef<ArrI32> decl", prp_file.tell())
-
-                    prp_zdef_value_arr_i32_capacity: int = int.from_bytes(prp_file.read(0x4), "little")
-                    prp_zdef_value_arr_i32_begin_array_op_code_value = int.from_bytes(prp_file.read(0x1), "little")
-                    prp_zdef_value_arr_i32_begin_array_op_code: PRPOpCode = PRPOpCode.from_byte(prp_zdef_value_arr_i32_begin_array_op_code_value)
-                    if not prp_zdef_value_arr_i32_begin_array_op_code == PRPOpCode.Array:
-                        raise PRPStructureError(f"Expected Array op-code but got {prp_zdef_value_arr_i32_begin_array_op_code_value}", prp_file.tell())
-                    prp_zdef_value_arr_i32_capacity_arr: int = int.from_bytes(prp_file.read(0x4), "little")
-
-                    if not prp_zdef_value_arr_i32_capacity_arr == prp_zdef_value_arr_i32_capacity:
-                        raise PRPBadDefinitionError("ArrayInt32 capacity and BeginArray op-code length are not same")
-
-                    prp_zdef_value_arr_i32_entries: [int] = []
-                    for i32_entry_idx in range(0, prp_zdef_value_arr_i32_capacity_arr):
-                        prp_zdef_arr_i32_entry_op_code_value = int.from_bytes(prp_file.read(0x1), "little")
-                        prp_zdef_arr_i32_entry_op_code: PRPOpCode = PRPOpCode.from_byte(prp_zdef_arr_i32_entry_op_code_value)
-                        if not prp_zdef_arr_i32_entry_op_code == PRPOpCode.Int32:
-                            raise PRPStructureError(f"Expected Int32 decl but got {prp_zdef_arr_i32_entry_op_code_value}", prp_file.tell())
-
-                        prp_zdef_value_arr_i32_entries.append(int.from_bytes(prp_file.read(0x4), "little"))
-
-                    prp_zdef_arr_i32_end_array_op_code_value = int.from_bytes(prp_file.read(0x1), "little")
-                    prp_zdef_arr_i32_end_array_op_code: PRPOpCode = PRPOpCode.from_byte(prp_zdef_arr_i32_end_array_op_code_value)
-                    if not prp_zdef_arr_i32_end_array_op_code == PRPOpCode.EndArray:
-                        raise PRPStructureError(f"Expected EndArray op code but got {prp_zdef_arr_i32_end_array_op_code_value}", prp_file.tell())
-
-                    self._prp_definitions.append(PRPDefinition(prp_zdef_name, prp_zdef_type_kind, prp_zdef_value_arr_i32_entries))
-                elif prp_zdef_type_kind == PRPDefinitionType.Array_Float32:
-                    # Read base length
-                    prp_zdef_value_arr_i32_op_code_value = int.from_bytes(prp_file.read(0x1), "little")
-                    prp_zdef_value_arr_i32_op_code: PRPOpCode = PRPOpCode.from_byte(
-                        prp_zdef_value_arr_i32_op_code_value)
-                    if not prp_zdef_value_arr_i32_op_code == PRPOpCode.Int32:
-                        raise PRPStructureError(f"Got bad ZDef<ArrF32> decl", prp_file.tell())
-
-                    # Read array decl length
-                    prp_zdef_value_arr_i32_capacity: int = int.from_bytes(prp_file.read(0x4), "little")
-                    prp_zdef_value_arr_i32_begin_array_op_code_value = int.from_bytes(prp_file.read(0x1), "little")
-                    prp_zdef_value_arr_i32_begin_array_op_code: PRPOpCode = PRPOpCode.from_byte(
-                        prp_zdef_value_arr_i32_begin_array_op_code_value)
-                    if not prp_zdef_value_arr_i32_begin_array_op_code == PRPOpCode.Array:
-                        raise PRPStructureError(
-                            f"Expected Array op-code but got {prp_zdef_value_arr_i32_begin_array_op_code_value}",
-                            prp_file.tell())
-                    prp_zdef_value_arr_i32_capacity_arr: int = int.from_bytes(prp_file.read(0x4), "little")
-
-                    if not prp_zdef_value_arr_i32_capacity_arr == prp_zdef_value_arr_i32_capacity:
-                        raise PRPBadDefinitionError("ArrayInt32 capacity and BeginArray op-code length are not same")
-
-                    prp_zdef_value_arr_f32_entries: [float] = []
-                    for i32_entry_idx in range(0, prp_zdef_value_arr_i32_capacity_arr):
-                        prp_zdef_arr_i32_entry_op_code_value = int.from_bytes(prp_file.read(0x1), "little")
-                        prp_zdef_arr_i32_entry_op_code: PRPOpCode = PRPOpCode.from_byte(
-                            prp_zdef_arr_i32_entry_op_code_value)
-                        if not prp_zdef_arr_i32_entry_op_code == PRPOpCode.Float32:
-                            raise PRPStructureError(
-                                f"Expected Int32 decl but got {prp_zdef_arr_i32_entry_op_code_value}", prp_file.tell())
-
-                        prp_f32_val: float
-                        (prp_f32_val) = struct.unpack('<f', prp_file.read(0x4))
-                        prp_zdef_value_arr_f32_entries.append(prp_f32_val)
-
-                    prp_zdef_arr_i32_end_array_op_code_value = int.from_bytes(prp_file.read(0x1), "little")
-                    prp_zdef_arr_i32_end_array_op_code: PRPOpCode = PRPOpCode.from_byte(
-                        prp_zdef_arr_i32_end_array_op_code_value)
-                    if not prp_zdef_arr_i32_end_array_op_code == PRPOpCode.EndArray:
-                        raise PRPStructureError(
-                            f"Expected EndArray op code but got {prp_zdef_arr_i32_end_array_op_code_value}",
-                            prp_file.tell())
-
-                    self._prp_definitions.append(PRPDefinition(prp_zdef_name, prp_zdef_type_kind, prp_zdef_value_arr_f32_entries))
-                elif prp_zdef_type_kind in [PRPDefinitionType.StringRef_1, PRPDefinitionType.StringRef_2, PRPDefinitionType.StringRef_3]:
-                    prp_zdef_value_str_op_code_value = int.from_bytes(prp_file.read(0x1), "little")
-                    prp_zdef_value_str_op_code: PRPOpCode = PRPOpCode.from_byte(prp_zdef_value_str_op_code_value)
-                    if not prp_zdef_value_str_op_code == PRPOpCode.String:
-                        raise PRPStructureError(f"Expected StringRef but got {prp_zdef_value_str_op_code_value}", prp_file.tell())
-
-                    prp_zdef_value_str_ref_index: int = int.from_bytes(prp_file.read(0x4), "little")
-                    if prp_zdef_value_str_ref_index < 0 or prp_zdef_value_str_ref_index >= len(self._prp_string_table):
-                        raise IndexError(f"String ref is out of bounds ({prp_zdef_value_str_ref_index})")
-
-                    self._prp_definitions.append(PRPDefinition(prp_zdef_name, prp_zdef_type_kind,
-                                                               self._prp_string_table[prp_zdef_value_str_ref_index]))
-                elif prp_zdef_type_kind == PRPDefinitionType.StringRefTab:
-                    prp_zdef_value_str_ref_tab_op_code_value = int.from_bytes(prp_file.read(0x1), "little")
-                    prp_zdef_value_str_ref_tab_op_code: PRPOpCode = PRPOpCode.from_byte(prp_zdef_value_str_ref_tab_op_code_value)
-                    if not prp_zdef_value_str_ref_tab_op_code == PRPOpCode.Container:
-                        raise PRPStructureError(f"Expected Container but got {prp_zdef_value_str_ref_tab_op_code_value}", prp_file.tell())
-
-                    prp_zdef_value_str_ref_tab_capacity: int = int.from_bytes(prp_file.read(0x4), "little")
-                    prp_zdef_value_str_ref_value: [str] = []
-
-                    for str_ref_entry_idx in range(0, prp_zdef_value_str_ref_tab_capacity):
-                        # 1. Read string btopc
-                        prp_zdef_value_str_ref_tab_entry_op_code_value = int.from_bytes(prp_file.read(0x1), "little")
-                        prp_zdef_value_str_ref_tab_entry_op_code: PRPOpCode = PRPOpCode.from_byte(prp_zdef_value_str_ref_tab_entry_op_code_value)
-                        if not prp_zdef_value_str_ref_tab_entry_op_code == PRPOpCode.String:
-                            raise PRPStructureError(f"Expected String but got {prp_zdef_value_str_ref_tab_entry_op_code_value}", prp_file.tell())
-
-                        # 2. Exchange string
-                        if (self._prp_flags >> 3) & 1:
-                            # By index
-                            prp_zdef_value_str_ref_tab_entry_index: int = int.from_bytes(prp_file.read(0x4), "little")
-                            if prp_zdef_value_str_ref_tab_entry_index < 0 or prp_zdef_value_str_ref_tab_entry_index >= len(
-                                    self._prp_string_table):
-                                raise IndexError(
-                                    f"String ref is out of bounds ({prp_zdef_value_str_ref_tab_entry_index})")
-
-                            prp_zdef_value_str_ref_value.append(
-                                self._prp_string_table[prp_zdef_value_str_ref_tab_entry_index])
-                        else:
-                            # By raw contents
-                            prp_zdef_value_str_ref_tab_entry_length: int = int.from_bytes(prp_file.read(0x4), "little")
-                            prp_zdef_value_str_ref_value.append(prp_file.read(prp_zdef_value_str_ref_tab_entry_length).decode("ascii"))
-
-                    self._prp_definitions.append(PRPDefinition(prp_zdef_name, prp_zdef_type_kind, prp_zdef_value_str_ref_value))
-                else:
-                    raise NotImplementedError(f"Type kind {prp_zdef_type_kind_value} not implemented yet")
-
-            # Read ByteCode
-            self._prp_properties = PRPByteCode(prp_file.read())
-            self._prp_properties.prepare(self._prp_flags, self._prp_string_table)
-
-            # Uncomment to debug
-            # with open("dump.json", "a+") as json_out:
-            #     import json
-            #     json_out.write(json.dumps([x.__dict__() for x in self._prp_properties.instructions], indent=4, sort_keys=False))
+            if self._prp_use_mmap and os.fstat(prp_file.fileno()).st_size > 0:
+                # Map whole file and decode everything in place (no intermediate copies)
+                with mmap.mmap(prp_file.fileno(), 0, access=mmap.ACCESS_READ) as prp_buffer:
+                    yield prp_buffer
+            else:
+                yield prp_file.read()
+
+    def _parse_header(self, prp_buffer) -> int:
+        """Read header, symbols table and ZDefinitions. Returns offset of bytecode"""
+        # Read header
+        self._prp_magic_bytes, self._prp_is_raw, self._prp_flags, self._prp_total_keys_count, self._prp_data_offset = \
+            PRPReader.HEADER.unpack_from(prp_buffer, 0)
+
+        # Validate header
+        if not self._prp_magic_bytes == b"IOPacked v0.1\x00":
+            raise PRPStructureError("Invalid magic bytes signature", 0)
+
+        # Read symbols table
+        offset: int = PRPReader.HEADER.size  # Symbols region starts right after header
+        self._prp_string_table = []
+
+        # Data offset is size of symbols region, so whole region could be split at once
+        symbols_end: int = offset + self._prp_data_offset
+        symbols: [bytes] = prp_buffer[offset:symbols_end].split(b'\x00') if symbols_end <= len(prp_buffer) else []
+
+        if len(symbols) == self._prp_total_keys_count + 2 and len(symbols[-1]) == 0:
+            self._prp_string_table = [sys.intern(symbol.decode("ascii")) for symbol in symbols[:-1]]
+            offset = symbols_end
+
+        while len(self._prp_string_table) != self._prp_total_keys_count + 1:
+            symbol_end: int = prp_buffer.find(b'\x00', offset)
+            if symbol_end == -1:
+                raise PRPStructureError("Unterminated string in symbols table", offset)
+
+            self._prp_string_table.append(sys.intern(prp_buffer[offset:symbol_end].decode("ascii")))
+            offset = symbol_end + 1
+
+        # Read objects counter
+        self._prp_objects_presented = PRPReader.U32.unpack_from(prp_buffer, offset)[0]
+        offset += 4
+
+        # Read ZDefinitions
+        offset, self._prp_definitions = PRPDefinitionCodec.decode(prp_buffer, offset, self._prp_flags,
+                                                                  self._prp_string_table)
+
+        self._prp_bytecode_offset = offset
+        return offset
@@ -0,0 +1,128 @@
+from PRP import PRPStructureError
+from array import array
+import hashlib
+import struct
+import sys
+import os
+
+
+class PRPSidecarIndex:
+    """
+    Persisted geoms index of PRP file (written next to PRP file, see PRPReader.write_index).
+
+    For each geom in traversal order it holds byte offset (from the beginning of PRP file) and instruction index
+    where properties, controllers and children of the geom begin. Index is bound to PRP file by its size and
+    modification time (cheap check) and by SHA-1 of its contents, which is computed only when modification time
+    differs (file was touched or copied), so stale index is detected on load.
+    """
+
+    FILE_EXTENSION: str = '.idx'
+    MAGIC: bytes = b'PRPIDX\x00\x02'
+    HEADER = struct.Struct('<8s20sQqII')  # magic, SHA-1, size and mtime (ns) of PRP file, bytecode offset, geoms count
+    ENTRY_SIZE: int = 6  # u32 values per geom: properties, controllers and children (byte offset, instruction index)
+
+    def __init__(self, checksum: bytes, prp_size: int, prp_mtime: int, bytecode_offset: int, entries: array):
+        if len(entries) % PRPSidecarIndex.ENTRY_SIZE != 0:
+            raise PRPStructureError(f"Bad size of sidecar index entries ({len(entries)})", 0)
+
+        self._checksum: bytes = checksum
+        self._prp_size: int = prp_size
+        self._prp_mtime: int = prp_mtime
+        self._bytecode_offset: int = bytecode_offset
+        self._entries: array = entries
+
+    @staticmethod
+    def checksum_of(prp_path: str) -> bytes:
+        digest = hashlib.sha1()
+        with open(prp_path, "rb") as prp_file:
+            for chunk in iter(lambda: prp_file.read(1 << 20), b''):
+                digest.update(chunk)
+
+        return digest.digest()
+
+    @staticmethod
+    def load(index_path: str) -> 'PRPSidecarIndex':
+        with open(index_path, "rb") as index_file:
+            header: bytes = index_file.read(PRPSidecarIndex.HEADER.size)
+            if len(header) != PRPSidecarIndex.HEADER.size:
+                raise PRPStructureError("Sidecar index header is truncated", 0)
+
+            magic, checksum, prp_size, prp_mtime, bytecode_offset, geoms_count = PRPSidecarIndex.HEADER.unpack(header)
+            if magic != PRPSidecarIndex.MAGIC:
+                raise PRPStructureError("Invalid magic bytes signature of sidecar index", 0)
+
+            entries: array = array('I')
+            try:
+                entries.fromfile(index_file, geoms_count * PRPSidecarIndex.ENTRY_SIZE)
+            except EOFError:
+                raise PRPStructureError("Sidecar index entries are truncated", PRPSidecarIndex.HEADER.size)
+
+            if sys.byteorder != 'little':
+                entries.byteswap()
+
+            return PRPSidecarIndex(checksum, prp_size, prp_mtime, bytecode_offset, entries)
+
+    def save(self, index_path: str):
+        entries: array = array('I', self._entries)
+        if sys.byteorder != 'little':
+            entries.byteswap()
+
+        # Write whole file aside first, so readers never see partially written index
+        temp_path: str = f"{index_path}.tmp"
+        with open(temp_path, "wb") as index_file:
+            index_file.write(PRPSidecarIndex.HEADER.pack(PRPSidecarIndex.MAGIC, self._checksum, self._prp_size,
+                                                         self._prp_mtime, self._bytecode_offset, self.geoms_count))
+            entries.tofile(index_file)
+
+        os.replace(temp_path, index_path)
+
+    def is_valid_for(self, prp_path: str) -> bool:
+        """Is index built for current contents of PRP file"""
+        try:
+            prp_stat: os.stat_result = os.stat(prp_path)
+        except OSError:
+            return False
+
+        if prp_stat.st_size != self._prp_size:
+            return False
+
+        if prp_stat.st_mtime_ns == self._prp_mtime:
+            return True
+
+        # Same size, but file was modified (or just touched): only contents could tell
+        return self._checksum == PRPSidecarIndex.checksum_of(prp_path)
+
+    @property
+    def checksum(self) -> bytes:
+        return self._checksum
+
+    @property
+    def prp_size(self) -> int:
+        return self._prp_size
+
+    @property
+    def prp_mtime(self) -> int:
+        return self._prp_mtime
+
+    @property
+    def bytecode_offset(self) -> int:
+        return self._bytecode_offset
+
+    @property
+    def geoms_count(self) -> int:
+        return len(self._entries) // PRPSidecarIndex.ENTRY_SIZE
+
+    def geom_properties(self, geom: int) -> (int, int):
+        """(Byte offset, instruction index) of BeginObject of geom properties"""
+        base: int = geom * PRPSidecarIndex.ENTRY_SIZE
+        return self._entries[base], self._entries[base + 1]
+
+    def geom_controllers(self, geom: int) -> (int, int):
+        """(Byte offset, instruction index) of controllers Container of geom"""
+        base: int = geom * PRPSidecarIndex.ENTRY_SIZE + 2
+        return self._entries[base], self._entries[base + 1]
+
+    def geom_children(self, geom: int) -> (int, int):
+        """(Byte offset, instruction index) of children Container of geom"""
+        base: int = geom * PRPSidecarIndex.ENTRY_SIZE + 4
+        return self._entries[base], self._entries[base + 1]
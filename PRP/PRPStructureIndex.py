@@ -0,0 +1,243 @@
+from PRP import PRPInstruction, PRPInstructionStore, PRPOpCode, PRPStructureError
+from typing import Sequence, Union
+from array import array
+
+import re
+
+
+class PRPStructureIndex:
+    """
+    Structural jump index over decoded instructions, built in one linear pass.
+
+    For each BeginObject/BeginNamedObject and Array/NamedArray it holds index of matching EndObject/EndArray
+    (and back) and for each instruction the object which encloses it.
+
+    Geoms are indexed on first request (geom_* methods, or end of Container), when instructions are treated as scene:
+    geoms are walked in traversal order (same order as GeomPropertiesVisitor visits them) and for each geom the index
+    holds where its properties, controllers and children start and where the whole geom subtree ends. Instructions
+    which are not scene (subtree) raise PRPStructureError then.
+
+    Only controllers and children Containers of geoms are mapped to index of last instruction of their contents (or
+    to itself when container is empty). Meaning of length of other Containers depends on type of their elements
+    (count of values for TypeContainer, count of bytes in single RawData for ZRawData), so they are not mapped.
+
+    Ends are inclusive: subtree of instruction i is instructions[i:end_of(i) + 1].
+    """
+
+    STRUCTURAL_OP_CODES = re.compile(b'[' + re.escape(bytes([PRPOpCode.Array, PRPOpCode.NamedArray, PRPOpCode.EndArray,
+                                                              PRPOpCode.BeginObject, PRPOpCode.BeginNamedObject,
+                                                              PRPOpCode.EndObject])) + b']')
+
+    def __init__(self, instructions: Union[PRPInstructionStore, Sequence[PRPInstruction]]):
+        self._instructions = instructions
+
+        if isinstance(instructions, PRPInstructionStore):
+            self._op_codes: bytes = bytes(instructions.op_codes)
+        else:
+            self._op_codes: bytes = bytes(instruction.op_code.value for instruction in instructions)
+
+        self._match: array = array('i', [-1]) * len(self._op_codes)
+        self._enclosing_objects: array = array('i', [-1]) * len(self._op_codes)
+
+        # Geoms in traversal order (filled by _index_geoms on first request)
+        self._geoms_indexed: bool = False
+        self._geom_begins: array = array('i')
+        self._geom_controllers: array = array('i')
+        self._geom_children: array = array('i')
+        self._geom_ends: array = array('i')
+        self._geom_parents: array = array('i')
+        self._geom_sizes: array = array('i')
+
+        self._index_blocks()
+
+    def _index_blocks(self):
+        match: array = self._match
+        enclosing_objects: array = self._enclosing_objects
+        stack: [int] = []
+        object_stack: [int] = []
+        enclosing_object: int = -1
+        next_index: int = 0
+        op_code: int
+
+        for found in PRPStructureIndex.STRUCTURAL_OP_CODES.finditer(self._op_codes):
+            index: int = found.start()
+            op_code = self._op_codes[index]
+
+            # Instructions between structural ones are enclosed by the same object
+            if enclosing_object != -1 and index > next_index:
+                enclosing_objects[next_index:index] = array('i', [enclosing_object]) * (index - next_index)
+
+            next_index = index + 1
+            enclosing_objects[index] = enclosing_object
+
+            if op_code == PRPOpCode.EndObject or op_code == PRPOpCode.EndArray:
+                expected_begins: tuple = (PRPOpCode.BeginObject, PRPOpCode.BeginNamedObject) \
+                    if op_code == PRPOpCode.EndObject else (PRPOpCode.Array, PRPOpCode.NamedArray)
+
+                if not stack or self._op_codes[stack[-1]] not in expected_begins:
+                    raise PRPStructureError(f"Unexpected {PRPOpCode(op_code)!r} at instruction {index}", index)
+
+                begin: int = stack.pop()
+                match[begin] = index
+                match[index] = begin
+
+                if op_code == PRPOpCode.EndObject:
+                    # EndObject belongs to object which it closes
+                    enclosing_objects[index] = object_stack.pop()
+                    enclosing_object = object_stack[-1] if object_stack else -1
+            else:
+                stack.append(index)
+
+                if op_code == PRPOpCode.BeginObject or op_code == PRPOpCode.BeginNamedObject:
+                    object_stack.append(index)
+                    enclosing_object = index
+
+        if stack:
+            raise PRPStructureError(f"Block at instruction {stack[-1]} is not closed", stack[-1])
+
+    def _expect(self, index: int, op_codes: tuple, what: str):
+        if index >= len(self._op_codes) or self._op_codes[index] not in op_codes:
+            raise PRPStructureError(f"Expected {what} at instruction {index}", index)
+
+    def _container_length(self, index: int) -> int:
+        if index >= len(self._op_codes) or self._op_codes[index] != PRPOpCode.Container:
+            raise PRPStructureError(f"Expected container at instruction {index}", index)
+
+        if isinstance(self._instructions, PRPInstructionStore):
+            return self._instructions.op_data_at(index)['length']
+
+        return self._instructions[index].op_data['length']
+
+    def _index_geoms(self):
+        """Walk geoms of scene. Results are kept only when whole walk succeeds, so failed walk is repeated (and
+        raises) on every request"""
+        if self._geoms_indexed:
+            return
+
+        match: array = self._match
+        op_codes: bytes = self._op_codes
+        objects: tuple = (PRPOpCode.BeginObject, PRPOpCode.BeginNamedObject)
+        geom_begins, geom_controllers, geom_children, geom_ends, geom_parents, geom_sizes = \
+            array('i'), array('i'), array('i'), array('i'), array('i'), array('i')
+        container_ends: [tuple] = []
+
+        # Stack of [geom traversal index, children container index, children left to visit]
+        stack: [list] = []
+        index: int = 0
+
+        while op_codes:
+            # Visit geom at index: properties, then controllers
+            self._expect(index, objects, "begin of geom")
+            geom: int = len(geom_begins)
+            controllers: int = match[index] + 1
+            geom_begins.append(index)
+            geom_controllers.append(controllers)
+            geom_parents.append(stack[-1][0] if stack else -1)
+
+            index = controllers + 1
+            for controller_idx in range(0, self._container_length(controllers)):
+                self._expect(index, (PRPOpCode.String,), "name of controller")
+                self._expect(index + 1, objects, "object of controller")
+
+                index = match[index + 1] + 1
+
+            container_ends.append((controllers, index - 1))
+            geom_children.append(index)
+            geom_ends.append(-1)
+            geom_sizes.append(0)
+
+            stack.append([geom, index, self._container_length(index)])
+            index += 1
+
+            # Close all finished geoms, then continue with next child
+            while stack and stack[-1][2] == 0:
+                finished_geom, children, _ = stack.pop()
+                container_ends.append((children, index - 1))
+                geom_ends[finished_geom] = index - 1
+                geom_sizes[finished_geom] = len(geom_begins) - finished_geom
+
+                if stack:
+                    stack[-1][2] -= 1
+
+            if not stack:
+                break
+
+        for container, end in container_ends:
+            match[container] = end
+
+        self._geom_begins, self._geom_controllers, self._geom_children, self._geom_ends, self._geom_parents, \
+            self._geom_sizes = geom_begins, geom_controllers, geom_children, geom_ends, geom_parents, geom_sizes
+        self._geoms_indexed = True
+
+    def end_of(self, index: int) -> int:
+        """
+        Index of last instruction of block started at index or -1 when instruction doesn't start a block (or it's
+        Container which is not controllers or children of geom)
+        """
+        op_code: int = self._op_codes[index]
+        if op_code == PRPOpCode.EndObject or op_code == PRPOpCode.EndArray:
+            return -1
+
+        if op_code == PRPOpCode.Container:
+            self._index_geoms()
+
+        return self._match[index]
+
+    def begin_of(self, index: int) -> int:
+        """Index of BeginObject/Array matched with EndObject/EndArray at index or -1 for other instructions"""
+        op_code: int = self._op_codes[index]
+        if op_code == PRPOpCode.EndObject or op_code == PRPOpCode.EndArray:
+            return self._match[index]
+
+        return -1
+
+    def subtree_size(self, index: int) -> int:
+        """Count of instructions in block started at index (1 for instructions which don't start a block)"""
+        end: int = self.end_of(index)
+        return 1 if end == -1 else end - index + 1
+
+    def enclosing_object_end(self, index: int) -> int:
+        """
+        Index of EndObject which closes object containing instruction at index (nested objects are jumped over;
+        BeginObject is contained by its parent object, EndObject by object which it closes)
+        """
+        begin: int = self._enclosing_objects[index]
+        if begin == -1:
+            raise PRPStructureError(f"Instruction {index} is not inside object", index)
+
+        return self._match[begin]
+
+    @property
+    def geoms_count(self) -> int:
+        self._index_geoms()
+        return len(self._geom_begins)
+
+    def geom_begin(self, geom: int) -> int:
+        """Index of BeginObject of geom properties"""
+        self._index_geoms()
+        return self._geom_begins[geom]
+
+    def geom_controllers(self, geom: int) -> int:
+        """Index of controllers Container of geom"""
+        self._index_geoms()
+        return self._geom_controllers[geom]
+
+    def geom_children(self, geom: int) -> int:
+        """Index of children Container of geom"""
+        self._index_geoms()
+        return self._geom_children[geom]
+
+    def geom_end(self, geom: int) -> int:
+        """Index of last instruction of geom subtree"""
+        self._index_geoms()
+        return self._geom_ends[geom]
+
+    def geom_parent(self, geom: int) -> int:
+        """Traversal index of parent geom or -1 for root"""
+        self._index_geoms()
+        return self._geom_parents[geom]
+
+    def geom_subtree_count(self, geom: int) -> int:
+        """Count of geoms in subtree of geom (including itself)"""
+        self._index_geoms()
+        return self._geom_sizes[geom]
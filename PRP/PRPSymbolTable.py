@@ -0,0 +1,51 @@
+from typing import Iterable, Iterator, Optional
+
+
+class PRPSymbolTable:
+    """
+    Symbols (token strings) table of PRP file with O(1) interning and lookup.
+
+    Symbol keeps index of its first interning. index() has same contract as list.index(), so table could be
+    passed everywhere where list of tokens was expected.
+    """
+
+    def __init__(self, symbols: Optional[Iterable[str]] = None):
+        self._symbols: [str] = []
+        self._indices: dict = dict()
+
+        if symbols is not None:
+            for symbol in symbols:
+                self.intern(symbol)
+
+    def intern(self, symbol: str) -> int:
+        """Add symbol (when it's not presented yet). Returns index of symbol"""
+        index: Optional[int] = self._indices.get(symbol)
+        if index is None:
+            index = len(self._symbols)
+            self._indices[symbol] = index
+            self._symbols.append(symbol)
+
+        return index
+
+    def index(self, symbol: str) -> int:
+        index: Optional[int] = self._indices.get(symbol)
+        if index is None:
+            raise ValueError(f"Symbol '{symbol}' is not in symbols table")
+
+        return index
+
+    @property
+    def symbols(self) -> [str]:
+        return self._symbols
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._indices
+
+    def __getitem__(self, index: int) -> str:
+        return self._symbols[index]
+
+    def __len__(self) -> int:
+        return len(self._symbols)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._symbols)
@@ -0,0 +1,84 @@
+from PRP import PRPOpCode
+from typing import Optional, Sequence
+import struct
+
+
+class PRPValueRun:
+    """
+    Bulk codec of homogeneous runs: N instructions of the same op-code, each followed by fixed-width value
+    (elements of arrays mostly). Whole run is (un)packed by one call of precompiled strided struct.
+    """
+
+    # Layouts of values as they are decoded (same as PRPByteCode.decoder_table)
+    DECODE_FORMATS: dict = {
+        PRPOpCode.Bool: '?',     PRPOpCode.NamedBool: '?',
+        PRPOpCode.Int8: 'B',     PRPOpCode.NamedInt8: 'B',
+        PRPOpCode.Int16: 'H',    PRPOpCode.NamedInt16: 'H',
+        PRPOpCode.Int32: 'I',    PRPOpCode.NamedInt32: 'I',
+        PRPOpCode.Bitfield: 'I', PRPOpCode.NameBitfield: 'I',
+        PRPOpCode.Float32: 'f',  PRPOpCode.NamedFloat32: 'f',
+        PRPOpCode.Float64: 'd',  PRPOpCode.NamedFloat64: 'd'
+    }
+
+    # Layouts of values as they are encoded (same as PRPInstruction.to_bytes)
+    ENCODE_FORMATS: dict = {
+        PRPOpCode.Bool: 'B',     PRPOpCode.NamedBool: 'B',
+        PRPOpCode.Int8: 'B',     PRPOpCode.NamedInt8: 'B',
+        PRPOpCode.Int16: 'h',    PRPOpCode.NamedInt16: 'h',
+        PRPOpCode.Int32: 'I',    PRPOpCode.NamedInt32: 'I',
+        PRPOpCode.Bitfield: 'I', PRPOpCode.NameBitfield: 'I',
+        PRPOpCode.Float32: 'f',  PRPOpCode.NamedFloat32: 'f',
+        PRPOpCode.Float64: 'd',  PRPOpCode.NamedFloat64: 'd'
+    }
+
+    FLOAT_FORMATS: str = 'fd'
+
+    MAX_CACHED_STRUCTS: int = 256
+    _structs: dict = dict()
+
+    @staticmethod
+    def _struct(element_format: str, count: int) -> struct.Struct:
+        layout: Optional[struct.Struct] = PRPValueRun._structs.get((element_format, count))
+        if layout is None:
+            layout = struct.Struct('<' + element_format * count)
+            if len(PRPValueRun._structs) >= PRPValueRun.MAX_CACHED_STRUCTS:
+                PRPValueRun._structs.clear()
+
+            PRPValueRun._structs[(element_format, count)] = layout
+
+        return layout
+
+    @staticmethod
+    def is_supported(op_code: PRPOpCode) -> bool:
+        return op_code in PRPValueRun.DECODE_FORMATS
+
+    @staticmethod
+    def unpack(buffer, offset: int, op_code: PRPOpCode, count: int, value_format: Optional[str] = None) -> Optional[tuple]:
+        """
+        Unpack values of run of count instructions of op_code which starts at offset (value_format overrides layout
+        of value). Returns None when there is no such run at offset (caller should decode instruction by instruction then)
+        """
+        value_format = value_format if value_format is not None else PRPValueRun.DECODE_FORMATS[op_code]
+        size: int = 1 + struct.calcsize('<' + value_format)
+        end: int = offset + size * count
+
+        if count <= 0 or end > len(buffer) or buffer[offset:end:size] != bytes([op_code.value]) * count:
+            return None
+
+        return PRPValueRun._struct('x' + value_format, count).unpack_from(buffer, offset)
+
+    @staticmethod
+    def pack(op_code: PRPOpCode, values: Sequence, value_format: Optional[str] = None) -> bytes:
+        """
+        Pack values as run of instructions of op_code. Float values could be given as 1-tuples (as they are decoded).
+        By default value is packed as PRPInstruction.to_bytes does, value_format overrides it
+        """
+        value_format = value_format if value_format is not None else PRPValueRun.ENCODE_FORMATS[op_code]
+
+        arguments: list = [op_code.value] * (2 * len(values))
+        if value_format in PRPValueRun.FLOAT_FORMATS and len(values) > 0 and not isinstance(values[0], float):
+            arguments[1::2] = [value[0] for value in values]
+        else:
+            arguments[1::2] = values
+
+        return PRPValueRun._struct('B' + value_format, len(values)).pack(*arguments)
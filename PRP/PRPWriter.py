@@ -1,68 +1,296 @@
-from PRP import PRPDefinition, PRPDefinitionType, PRPInstruction, PRPOpCode
+from PRP import PRPDefinition, PRPDefinitionCodec, PRPDefinitionType, PRPInstruction, PRPOpCode, PRPValueRun, \
+    PRPSymbolTable, PRPBytecodeFragment
+from typing import Iterable, Iterator, Optional, Union
+import itertools
 import struct
+import io
 
 
 class PRPWriter:
+    STRING_OP_CODES = frozenset([PRPOpCode.String, PRPOpCode.NamedString, PRPOpCode.StringOrArray_E,
+                                 PRPOpCode.StringOrArray_8E])
+
+    # Instructions are encoded into chunk of this size before it's written to file. Reserve keeps space for largest
+    # fixed size instruction which is packed in place when chunk is almost filled
+    CHUNK_SIZE: int = 1 << 20
+    CHUNK_RESERVE: int = 16
+
+    # Shorter arrays are cheaper to encode element by element than to collect and pack as run
+    VALUE_RUN_MIN_LENGTH: int = 8
+
+    OBJECTS_COUNT = struct.Struct('<i')
+    OP_U8 = struct.Struct('<BB')
+    OP_I16 = struct.Struct('<Bh')
+    OP_I32 = struct.Struct('<Bi')
+    OP_U32 = struct.Struct('<BI')
+    OP_F32 = struct.Struct('<Bf')
+    OP_F64 = struct.Struct('<Bd')
+
+    # Kinds of in place encoders
+    ENCODE_OP_CODE: int = 0
+    ENCODE_VALUE: int = 1
+    ENCODE_LENGTH: int = 2
+    ENCODE_FLOAT: int = 3
+    ENCODE_TOKEN: int = 4
+
     def __init__(self, out_path: str):
         self._prp_out_path: str = out_path
-        self._prp_symbols_table: [str] = []
+        self._prp_symbols_table: PRPSymbolTable = PRPSymbolTable()
 
     def write(self, prp_flags: int, prp_definitions: [PRPDefinition], prp_instructions: [PRPInstruction], is_raw: bool = False, unk0x13: int = 0):
+        # Symbols are indexed before output is opened, so unknown symbol never leaves half written file
+        self._prp_symbols_table = PRPSymbolTable()
         self._index_symbols_table(prp_definitions, prp_instructions)
+        head, objects_count_offset = self._encode_head(prp_flags, prp_definitions, is_raw, unk0x13, 0)
+
+        with open(self._prp_out_path, "wb") as prp_file:
+            prp_file.write(head)
+
+            # Write instructions. Count of objects is patched when all instructions are encoded
+            objects_count, _ = self._write_instructions(prp_file, prp_flags, prp_instructions)
+
+            prp_file.seek(objects_count_offset)
+            prp_file.write(PRPWriter.OBJECTS_COUNT.pack(objects_count))
+
+    def write_stream(self, prp_flags: int, prp_definitions: [PRPDefinition],
+                     prp_instructions: Iterable[Union[PRPInstruction, PRPBytecodeFragment]],
+                     is_raw: bool = False, unk0x13: int = 0) -> int:
+        """
+        Write instructions which are produced one by one (by generator for example) without collecting them.
+        Symbols are interned while instructions are encoded, so only encoded bytecode is kept in memory until symbols
+        table is known. Already encoded fragments could be mixed with instructions. Returns count of written
+        instructions
+        """
+        self._prp_symbols_table = PRPSymbolTable()
+        self._index_symbols_table(prp_definitions, [])
+
+        bytecode: io.BytesIO = io.BytesIO()
+        objects_count, instructions_count = self._write_instructions(bytecode, prp_flags, prp_instructions,
+                                                                     intern_symbols=True)
 
         with open(self._prp_out_path, "wb") as prp_file:
-            header_size: int = 0x1F
-            symbols_table: bytes = self._generate_symbols_table()
-            data_offset: int = header_size + len(symbols_table) - 0x1F
-            header: bytes = self._generate_header(prp_flags, data_offset, is_raw, unk0x13)
-            prp_file.write(header)
-            prp_file.write(symbols_table)
-            prp_file.write(struct.pack('<i', len([x for x in prp_instructions if x.op_code == PRPOpCode.BeginObject])))  # Write count of objects
-
-            # Write ZDefs
-            prp_file.write(struct.pack('<ci', PRPOpCode.Container.value.to_bytes(1, "little"), len(prp_definitions)))
-            prp_def: PRPDefinition
-            for prp_def in prp_definitions:
-                prp_file.write(prp_def.to_bytes(prp_flags, self._prp_symbols_table))
-
-            # Write instructions
-            prp_instruction: PRPInstruction
-            for prp_instruction in prp_instructions:
-                prp_file.write(prp_instruction.to_bytes(prp_flags, self._prp_symbols_table))
+            head, _ = self._encode_head(prp_flags, prp_definitions, is_raw, unk0x13, objects_count)
+            prp_file.write(head)
+            prp_file.write(bytecode.getbuffer())
+
+        return instructions_count
+
+    @staticmethod
+    def encode_fragment(prp_flags: int, prp_instructions: [PRPInstruction]) -> PRPBytecodeFragment:
+        """Encode instructions with their own symbols table, so they could be spliced into any PRP file later"""
+        fragment_writer: PRPWriter = PRPWriter('')
+        bytecode: io.BytesIO = io.BytesIO()
+        token_fixups: [int] = []
+        objects_count, instructions_count = fragment_writer._write_instructions(bytecode, prp_flags, prp_instructions,
+                                                                                intern_symbols=True,
+                                                                                token_fixups=token_fixups)
+        return PRPBytecodeFragment(bytecode.getvalue(), fragment_writer._prp_symbols_table.symbols, token_fixups,
+                                   objects_count, instructions_count)
+
+    def _encode_head(self, prp_flags: int, prp_definitions: [PRPDefinition], is_raw: bool, unk0x13: int,
+                     objects_count: int) -> (bytearray, int):
+        """Encode everything before instructions (header, symbols, count of objects, ZDefs). Returns bytes and
+        offset of count of objects"""
+        symbols_table: bytes = self._generate_symbols_table()
+        data_offset: int = len(symbols_table)
+
+        head: bytearray = bytearray(self._generate_header(prp_flags, data_offset, is_raw, unk0x13))
+        head += symbols_table
+        objects_count_offset: int = len(head)
+        head += PRPWriter.OBJECTS_COUNT.pack(objects_count)
+
+        # Write ZDefs
+        head += struct.pack('<ci', PRPOpCode.Container.value.to_bytes(1, "little"), len(prp_definitions))
+        prp_def: PRPDefinition
+        for prp_def in prp_definitions:
+            head += PRPDefinitionCodec.encode(prp_def, prp_flags, self._prp_symbols_table)
+
+        return head, objects_count_offset
+
+    def _write_instructions(self, out_file, prp_flags: int,
+                            prp_instructions: Iterable[Union[PRPInstruction, PRPBytecodeFragment]],
+                            intern_symbols: bool = False, token_fixups: Optional[list] = None) -> (int, int):
+        """
+        Encode instructions into chunk buffer and flush it to file when it's filled. Fixed size instructions are packed
+        in place, others (raw strings, raw data) are encoded by PRPInstruction.to_bytes. When intern_symbols is set
+        symbols are added to table while encoding, otherwise table must be indexed before. When token_fixups is given
+        offsets of all written token indices are collected to it.
+        Returns count of objects and count of instructions
+        """
+        encoders: dict = self._make_encoders(prp_flags)
+        symbols_table: PRPSymbolTable = self._prp_symbols_table
+        symbol_index = symbols_table.intern if intern_symbols else symbols_table.index
+        chunk_size: int = PRPWriter.CHUNK_SIZE
+        chunk: bytearray = bytearray(chunk_size + PRPWriter.CHUNK_RESERVE)
+        offset: int = 0
+        flushed: int = 0
+        objects_count: int = 0
+        token_arrays: bool = token_fixups is not None and (prp_flags >> 2) & 1 == 1 and (prp_flags >> 3) & 1 == 1
+
+        # Elements of arrays are taken from source directly while looking for run of values. Instruction which broke
+        # the run is taken too, so it's pushed back to be encoded next
+        source: Iterator[PRPInstruction] = iter(prp_instructions)
+        pushed_back: list = []
+
+        def instructions_with_pushed_back() -> Iterator[PRPInstruction]:
+            for source_instruction in source:
+                yield source_instruction
+                while pushed_back:
+                    yield pushed_back.pop()
+
+        value_run_min_length: int = PRPWriter.VALUE_RUN_MIN_LENGTH
+        begin_object: PRPOpCode = PRPOpCode.BeginObject
+        prp_instruction_index: int = 0
+        for prp_instruction in instructions_with_pushed_back():
+            if offset >= chunk_size:
+                out_file.write(memoryview(chunk)[:offset])
+                flushed += offset
+                offset = 0
+
+            prp_instruction_index += 1
+            op_code: PRPOpCode = prp_instruction.op_code
+            encoder = encoders.get(op_code)
+
+            if encoder is None:
+                if isinstance(prp_instruction, PRPBytecodeFragment):
+                    encoded: bytes = prp_instruction.relocate(symbol_index)
+                    objects_count += prp_instruction.objects_count
+                    prp_instruction_index += prp_instruction.instructions_count - 1
+                    chunk[offset:offset + len(encoded)] = encoded
+                    offset += len(encoded)
+                    continue
+
+                if intern_symbols:
+                    self._intern_instruction_symbols(prp_instruction)
+
+                if token_arrays and op_code == PRPOpCode.StringArray:
+                    # Op-code, count of entries and token index of each entry
+                    token_fixups.extend(range(flushed + offset + 5, flushed + offset + 5 + 4 * len(prp_instruction.op_data), 4))
+
+                encoded: bytes = prp_instruction.to_bytes(prp_flags, symbols_table)
+                chunk[offset:offset + len(encoded)] = encoded
+                offset += len(encoded)
+                continue
+
+            kind, packer, op_code_value = encoder
+            if kind == PRPWriter.ENCODE_OP_CODE:
+                chunk[offset] = op_code_value
+                offset += 1
+                if op_code == begin_object:
+                    objects_count += 1
+            elif kind == PRPWriter.ENCODE_VALUE:
+                packer.pack_into(chunk, offset, op_code_value, prp_instruction.op_data)
+                offset += packer.size
+            elif kind == PRPWriter.ENCODE_LENGTH:
+                count: int = prp_instruction.op_data['length']
+                packer.pack_into(chunk, offset, op_code_value, count)
+                offset += packer.size
+
+                if count >= value_run_min_length and (op_code == PRPOpCode.Array or op_code == PRPOpCode.NamedArray):
+                    encoded_run, run_length, run_breaker = PRPWriter._take_value_run(source, count)
+                    if run_breaker is not None:
+                        pushed_back.append(run_breaker)
+
+                    if run_length > 0:
+                        chunk[offset:offset + len(encoded_run)] = encoded_run
+                        offset += len(encoded_run)
+                        prp_instruction_index += run_length
+            elif kind == PRPWriter.ENCODE_FLOAT:
+                packer.pack_into(chunk, offset, op_code_value, prp_instruction.op_data[0])
+                offset += packer.size
+            else:  # ENCODE_TOKEN
+                if token_fixups is not None:
+                    token_fixups.append(flushed + offset + 1)
+
+                packer.pack_into(chunk, offset, op_code_value, symbol_index(prp_instruction.op_data['data']))
+                offset += packer.size
+
+        if offset > 0:
+            out_file.write(memoryview(chunk)[:offset])
+
+        return objects_count, prp_instruction_index
+
+    @staticmethod
+    def _make_encoders(prp_flags: int) -> dict:
+        """Map op-code -> (kind, struct, op-code value) for op-codes which could be packed in place with given flags"""
+        encoders: dict = dict()
+
+        def add(kind: int, packer: Optional[struct.Struct], op_codes: [PRPOpCode]):
+            for op_code in op_codes:
+                encoders[op_code] = (kind, packer, op_code.value)
+
+        add(PRPWriter.ENCODE_OP_CODE, None, [PRPOpCode.BeginObject, PRPOpCode.BeginNamedObject, PRPOpCode.EndObject,
+                                             PRPOpCode.SkipMark, PRPOpCode.EndOfStream, PRPOpCode.EndArray])
+        add(PRPWriter.ENCODE_LENGTH, PRPWriter.OP_I32, [PRPOpCode.Array, PRPOpCode.NamedArray, PRPOpCode.Container,
+                                                        PRPOpCode.NamedContainer])
+        add(PRPWriter.ENCODE_VALUE, PRPWriter.OP_U8, [PRPOpCode.Bool, PRPOpCode.NamedBool, PRPOpCode.Int8,
+                                                      PRPOpCode.NamedInt8])
+        add(PRPWriter.ENCODE_VALUE, PRPWriter.OP_I16, [PRPOpCode.Int16, PRPOpCode.NamedInt16])
+        add(PRPWriter.ENCODE_VALUE, PRPWriter.OP_U32, [PRPOpCode.Int32, PRPOpCode.NamedInt32, PRPOpCode.Bitfield,
+                                                       PRPOpCode.NameBitfield])
+        add(PRPWriter.ENCODE_FLOAT, PRPWriter.OP_F32, [PRPOpCode.Float32, PRPOpCode.NamedFloat32])
+        add(PRPWriter.ENCODE_FLOAT, PRPWriter.OP_F64, [PRPOpCode.Float64, PRPOpCode.NamedFloat64])
+
+        if (prp_flags >> 3) & 1:
+            add(PRPWriter.ENCODE_TOKEN, PRPWriter.OP_I32, [PRPOpCode.String, PRPOpCode.NamedString])
+
+        if (prp_flags >> 2) & 1:
+            if (prp_flags >> 3) & 1:
+                add(PRPWriter.ENCODE_TOKEN, PRPWriter.OP_I32, [PRPOpCode.StringOrArray_E, PRPOpCode.StringOrArray_8E])
+        else:
+            add(PRPWriter.ENCODE_VALUE, PRPWriter.OP_I32, [PRPOpCode.StringOrArray_E, PRPOpCode.StringOrArray_8E])
+
+        return encoders
+
+    @staticmethod
+    def _take_value_run(prp_instructions: Iterator[PRPInstruction], count: int) -> (bytes, int, Optional[PRPInstruction]):
+        """
+        Take up to count elements of array from instructions while they are fixed size values of same op-code and
+        encode them at once (works for any iterator, instructions are buffered until op-code changes). Returns encoded
+        run, count of taken elements and instruction which broke the run (it's taken, but not encoded) or None
+        """
+        first: Optional[PRPInstruction] = next(prp_instructions, None)
+        if first is None:
+            return b'', 0, None
+
+        op_code: PRPOpCode = first.op_code
+        if not PRPValueRun.is_supported(op_code):
+            return b'', 0, first
+
+        values: list = [first.op_data]
+        for element in itertools.islice(prp_instructions, count - 1):
+            if element.op_code != op_code:
+                return PRPValueRun.pack(op_code, values), len(values), element
+
+            values.append(element.op_data)
+
+        return PRPValueRun.pack(op_code, values), len(values), None
 
     def _index_symbols_table(self, prp_definitions: [PRPDefinition], prp_instructions: [PRPInstruction]):
-        symbols_table: [str] = []
-        result_symbols_table: [str] = []
+        symbols_table: PRPSymbolTable = self._prp_symbols_table
 
         prp_definition: PRPDefinition
-        prp_definition_index: int
-
-        for prp_definition_index, prp_definition in enumerate(prp_definitions):
-            symbols_table.append(prp_definition.def_name)
-            if prp_definition.def_type in [PRPDefinitionType.StringRef_1, PRPDefinitionType.StringRef_2,
-                                           PRPDefinitionType.StringRef_3, PRPDefinitionType.StringRefTab]:
-                if prp_definition.def_type == PRPDefinitionType.StringRefTab:
-                    prp_str: str
-                    for prp_str in prp_definition.def_data:
-                        symbols_table.append(prp_str)
-                else:
-                    symbols_table.append(prp_definition.def_data)
-
-        prp_instruction_index: int
-        prp_instruction: PRPInstruction
+        for prp_definition in prp_definitions:
+            symbols_table.intern(prp_definition.def_name)
+            if prp_definition.def_type == PRPDefinitionType.StringRefTab:
+                prp_str: str
+                for prp_str in prp_definition.def_data:
+                    symbols_table.intern(prp_str)
+            elif prp_definition.def_type in [PRPDefinitionType.StringRef_1, PRPDefinitionType.StringRef_2,
+                                             PRPDefinitionType.StringRef_3]:
+                symbols_table.intern(prp_definition.def_data)
 
-        for prp_instruction_index, prp_instruction in enumerate(prp_instructions):
-            if prp_instruction.op_code in [PRPOpCode.String, PRPOpCode.NamedString, PRPOpCode.StringOrArray_E,
-                                           PRPOpCode.StringOrArray_8E]:
-                symbols_table.append(prp_instruction.op_data['data'])
-            elif prp_instruction.op_code == PRPOpCode.StringArray:
-                symbol_str: str
-                for symbol_str in prp_instruction.op_data:
-                    symbols_table.append(symbol_str)
+        prp_instruction: PRPInstruction
+        for prp_instruction in prp_instructions:
+            self._intern_instruction_symbols(prp_instruction)
 
-        for symbol_str in symbols_table:
-            if symbol_str not in self._prp_symbols_table:
-                self._prp_symbols_table.append(symbol_str)
+    def _intern_instruction_symbols(self, prp_instruction: PRPInstruction):
+        if prp_instruction.op_code in PRPWriter.STRING_OP_CODES:
+            self._prp_symbols_table.intern(prp_instruction.op_data['data'])
+        elif prp_instruction.op_code == PRPOpCode.StringArray:
+            symbol_str: str
+            for symbol_str in prp_instruction.op_data:
+                self._prp_symbols_table.intern(symbol_str)
 
     def _generate_header(self, flags: int, data_offset: int, is_raw: bool = False, unk0x13: int = 0) -> bytes:
         hdr: bytes = bytes()
@@ -71,8 +299,4 @@ class PRPWriter:
         return hdr
 
     def _generate_symbols_table(self) -> bytes:
-        st: bytes = bytes()
-        for string in self._prp_symbols_table:
-            st += string.encode("ascii")
-            st += b"\x00"
-        return st
+        return b"".join(string.encode("ascii") + b"\x00" for string in self._prp_symbols_table)
@@ -1,12 +1,20 @@
 from .PRPOpCode import PRPOpCode
+from .PRPSymbolTable import PRPSymbolTable
 from .PRPInstruction import PRPInstruction
+from .PRPValueRun import PRPValueRun
+from .PRPBytecodeFragment import PRPBytecodeFragment
+from .PRPInstructionStore import PRPInstructionStore
+from .PRPInstructionStream import PRPInstructionStream
 from .PRPBadInstructionError import PRPBadInstructionError
 from .PRPStructureError import PRPStructureError
 from .PRPBadDefinitionError import PRPBadDefinitionError
 from .PRPBadInstructionProcessingError import PRPBadInstructionProcessingError
 from .PRPByteCodeContext import PRPByteCodeContext
 from .PRPByteCode import PRPByteCode
+from .PRPStructureIndex import PRPStructureIndex
 from .PRPDefinitionType import PRPDefinitionType
 from .PRPDefinition import PRPDefinition
+from .PRPDefinitionCodec import PRPDefinitionCodec
+from .PRPSidecarIndex import PRPSidecarIndex
 from .PRPReader import PRPReader
 from .PRPWriter import PRPWriter
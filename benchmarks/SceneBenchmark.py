@@ -0,0 +1,173 @@
+from PRP import PRPReader, PRPWriter
+
+from GMS import GameScene, GeomTable, GeomPropertiesVisitor, SceneCompiler
+from GMS.TDB.TypeDataBase import TypeDataBase
+
+from .SceneGenerator import SceneGenerator
+
+from typing import Any, Callable, Optional
+from contextlib import redirect_stdout
+
+import platform
+import tracemalloc
+import time
+import json
+import math
+import os
+
+
+class SceneBenchmark:
+    """
+    Measures stages of decompile and compile pipelines on generated scenes of different sizes.
+
+    Each stage is timed (best of 'repeat' runs) and, when memory tracing is enabled, run once more under tracemalloc
+    to get peak of allocated memory. Results are plain dict ready to be saved as JSON.
+    """
+
+    # Stage name -> unit of throughput
+    STAGES: dict = {
+        'prp_reader.parse': 'instructions',
+        'geom_table': 'geoms',
+        'geom_properties_visitor.visit': 'geoms',
+        'game_scene.prepare': 'geoms',
+        'game_scene.dump': 'geoms',
+        'scene_compiler.compile': 'instructions',
+        'prp_writer.write': 'instructions'
+    }
+
+    def __init__(self, tdb_path: str, work_dir: str, repeat: int = 1, trace_memory: bool = True, seed: int = 0):
+        self._tdb_path: str = tdb_path
+        self._work_dir: str = work_dir
+        self._repeat: int = max(1, repeat)
+        self._trace_memory: bool = trace_memory
+        self._seed: int = seed
+
+        self._tdb: TypeDataBase = TypeDataBase(tdb_path)
+        if not self._tdb.load():
+            raise RuntimeError(f"Failed to load types database from file {tdb_path}")
+
+    def run(self, sizes: [int]) -> dict:
+        results: dict = {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeat': self._repeat,
+            'seed': self._seed,
+            'sizes': [],
+            'scaling': dict()
+        }
+
+        for geoms_count in sizes:
+            results['sizes'].append(self._run_size(geoms_count))
+
+        for stage in SceneBenchmark.STAGES.keys():
+            results['scaling'][stage] = SceneBenchmark._scaling(results['sizes'], stage)
+
+        return results
+
+    def _run_size(self, geoms_count: int) -> dict:
+        name: str = f"scene{geoms_count}"
+        generator: SceneGenerator = SceneGenerator(self._tdb, self._seed)
+
+        started_at: float = time.perf_counter()
+        gms_path, buf_path, prp_path = generator.write(self._work_dir, name, geoms_count)
+        generate_time: float = time.perf_counter() - started_at
+
+        json_path: str = os.path.join(self._work_dir, f"{name}.json")
+        compiled_prp_path: str = os.path.join(self._work_dir, f"{name}.compiled.PRP")
+        written_prp_path: str = os.path.join(self._work_dir, f"{name}.written.PRP")
+
+        reader: PRPReader = PRPReader(prp_path)
+        reader.parse()
+        instructions_count: int = len(reader.instructions)
+        gms_body: bytes = GameScene.read_gms_body(gms_path)
+        with open(buf_path, "rb") as buf_file:
+            buf_body: bytes = buf_file.read()
+
+        geoms: list = GeomTable(gms_body, buf_body).materialize()
+        scene: Optional[GameScene] = None
+
+        def prepare_scene() -> GameScene:
+            nonlocal scene
+            if scene is not None:
+                scene.close()
+
+            scene = GameScene(gms_path, buf_path, prp_path, self._tdb_path)
+            if not scene.prepare():
+                raise RuntimeError(f"Failed to prepare scene {gms_path}")
+
+            return scene
+
+        def compile_scene():
+            with open(json_path, "r") as json_file:
+                if not SceneCompiler(json.load(json_file), self._tdb_path).compile(compiled_prp_path):
+                    raise RuntimeError(f"Failed to compile scene {json_path}")
+
+        instructions: list = list(reader.instructions)
+        stages: dict = {
+            'prp_reader.parse': lambda: PRPReader(prp_path).parse(),
+            'geom_table': lambda: GeomTable(gms_body, buf_body),
+            'geom_properties_visitor.visit':
+                lambda: GeomPropertiesVisitor(geoms, reader).visit(self._tdb, 'ROOT', GeomPropertiesVisitor.ZROOM),
+            'game_scene.prepare': prepare_scene,
+            'game_scene.dump': lambda: scene.dump(json_path),
+            'scene_compiler.compile': compile_scene,
+            'prp_writer.write': lambda: PRPWriter(written_prp_path).write(reader.flags, reader.definitions,
+                                                                          instructions, reader.is_raw)
+        }
+
+        result: dict = {
+            'geoms': geoms_count,
+            'instructions': instructions_count,
+            'prp_bytes': os.path.getsize(prp_path),
+            'generate_seconds': generate_time,
+            'stages': dict()
+        }
+
+        for stage, stage_function in stages.items():
+            items: int = instructions_count if SceneBenchmark.STAGES[stage] == 'instructions' else geoms_count
+            result['stages'][stage] = self._measure(stage_function, items, SceneBenchmark.STAGES[stage])
+
+        if scene is not None:
+            scene.close()
+
+        return result
+
+    def _measure(self, stage_function: Callable[[], Any], items: int, unit: str) -> dict:
+        seconds: float = math.inf
+
+        # Tools print a lot of progress messages, they are not part of measurement
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            for run_idx in range(0, self._repeat):
+                started_at: float = time.perf_counter()
+                stage_function()
+                seconds = min(seconds, time.perf_counter() - started_at)
+
+            peak_memory: Optional[int] = None
+            if self._trace_memory:
+                tracemalloc.start()
+                try:
+                    stage_function()
+                    peak_memory = tracemalloc.get_traced_memory()[1]
+                finally:
+                    tracemalloc.stop()
+
+        return {
+            'seconds': seconds,
+            'throughput': items / seconds if seconds > 0 else None,
+            'unit': f"{unit}/s",
+            'peak_memory_bytes': peak_memory
+        }
+
+    @staticmethod
+    def _scaling(sizes: [dict], stage: str) -> dict:
+        """Points of scaling curve and growth exponent between neighbour sizes (1.0 means linear time)"""
+        points: [list] = [[size['geoms'], size['stages'][stage]['seconds']] for size in sizes]
+        exponents: [Optional[float]] = []
+
+        for (geoms_a, seconds_a), (geoms_b, seconds_b) in zip(points, points[1:]):
+            if geoms_a > 0 and geoms_b != geoms_a and seconds_a > 0 and seconds_b > 0:
+                exponents.append(math.log(seconds_b / seconds_a) / math.log(geoms_b / geoms_a))
+            else:
+                exponents.append(None)
+
+        return {'points': points, 'exponents': exponents}
@@ -0,0 +1,250 @@
+from PRP import PRPInstruction, PRPOpCode, PRPDefinition, PRPDefinitionType, PRPWriter
+
+from GMS.TDB.TypeDataBase import TypeDataBase
+from GMS.TDB.Type import Type, TypeKind
+
+from typing import Optional, Union
+
+import os
+import random
+import struct
+import zlib
+
+
+class SceneGenerator:
+    """
+    Generator of synthetic but valid scenes (GMS, BUF and PRP files) built from real types of types database.
+
+    Geoms get random exported complex types (only types which could be decompiled and compiled back), random
+    hierarchy (depth is limited) and some of them get controllers. Same seed gives same scene.
+    """
+
+    VALUE_OP_CODES = frozenset([PRPOpCode.Bool, PRPOpCode.Float32, PRPOpCode.Int32, PRPOpCode.Int8, PRPOpCode.Int16,
+                                PRPOpCode.String])
+    MAX_DEPTH: int = 10
+    GEOM_BASE_SIZE: int = 0x60
+    GMS_BODY_HEADER_SIZE: int = 0x20
+
+    def __init__(self, tdb: TypeDataBase, seed: int = 0):
+        self._tdb: TypeDataBase = tdb
+        self._rng: random.Random = random.Random(seed)
+        self._strings: [str] = [f"str_{i}" for i in range(0, 64)]
+
+        # Type ids with high bit are not supported by GeomPropertiesVisitor yet (see GeomHeader)
+        self._geom_types: [(int, Type)] = []
+        for type_id, geom_type in self._tdb.exported_types.items():
+            if geom_type.kind == TypeKind.COMPLEX and geom_type.name != 'ZROOM' and int(type_id, 16) < 0x80000000 \
+                    and self._is_supported_complex(geom_type):
+                self._geom_types.append((int(type_id, 16), geom_type))
+
+        exported_names: set = {exported_type.name for exported_type in self._tdb.exported_types.values()}
+        self._controller_types: [(str, Type)] = []
+        for controller_type in self._tdb.types:
+            if controller_type.kind != TypeKind.COMPLEX or controller_type.name in exported_names or \
+                    controller_type.name[0] not in 'ZC' or not self._is_supported_complex(controller_type):
+                continue
+
+            short_name: str = controller_type.name[1:]
+            if self._tdb.find_type_by_short_name(short_name) is controller_type:
+                self._controller_types.append((short_name, controller_type))
+
+        if not self._geom_types:
+            raise RuntimeError("No geom types suitable for scene generation in types database")
+
+    def generate(self, geoms_count: int) -> (bytes, bytes, [PRPDefinition], [PRPInstruction]):
+        """Returns GMS file contents, BUF file contents, ZDefinitions and instructions of scene with geoms_count geoms"""
+        parents, depths = self._generate_hierarchy(geoms_count)
+        children: [[int]] = [[] for _ in range(0, geoms_count)]
+        for geom in range(1, geoms_count):
+            children[parents[geom]].append(geom)
+
+        geom_types: [Optional[tuple]] = [None] + [self._rng.choice(self._geom_types) for _ in range(1, geoms_count)]
+        root_type: Type = self._tdb.find_type('ZROOM')
+
+        # Properties (in traversal order)
+        instructions: [PRPInstruction] = []
+        traversal_order: [int] = []
+        stack: [int] = [0]
+        while stack:
+            geom: int = stack.pop()
+            traversal_order.append(geom)
+
+            instructions.append(PRPInstruction.trusted(PRPOpCode.BeginObject))
+            self._emit_complex(root_type if geom == 0 else geom_types[geom][1], instructions)
+            instructions.append(PRPInstruction.trusted(PRPOpCode.EndObject))
+
+            controllers_count: int = self._rng.randrange(0, 3) \
+                if self._controller_types and self._rng.random() < 0.3 else 0
+            instructions.append(PRPInstruction(PRPOpCode.Container, {'length': controllers_count}))
+            for controller_idx in range(0, controllers_count):
+                short_name, controller_type = self._rng.choice(self._controller_types)
+                instructions.append(PRPInstruction(PRPOpCode.String, {'length': len(short_name), 'data': short_name}))
+                instructions.append(PRPInstruction.trusted(PRPOpCode.BeginObject))
+                self._emit_complex(controller_type, instructions)
+                instructions.append(PRPInstruction.trusted(PRPOpCode.EndObject))
+
+            instructions.append(PRPInstruction(PRPOpCode.Container, {'length': len(children[geom])}))
+            stack.extend(reversed(children[geom]))
+
+        instructions += [PRPInstruction(PRPOpCode.Bool, False), PRPInstruction.trusted(PRPOpCode.EndOfStream)]
+
+        gms, buf = self._generate_geom_table(traversal_order[1:], geom_types, depths)
+        definitions: [PRPDefinition] = [
+            PRPDefinition("RoomIds", PRPDefinitionType.Array_Int32, [1, 2, 3]),
+            PRPDefinition("RoomBounds", PRPDefinitionType.Array_Float32, [(0.5,), (1.25,)]),
+            PRPDefinition("DefaultName", PRPDefinitionType.StringRef_1, ""),
+            PRPDefinition("RoomNames", PRPDefinitionType.StringRefTab, ["Lobby", "Kitchen"])
+        ]
+
+        return gms, buf, definitions, instructions
+
+    def write(self, out_dir: str, name: str, geoms_count: int, flags: int = 0xD) -> (str, str, str):
+        """Generate scene and save it as <name>.GMS/.BUF/.PRP in out_dir. Returns paths to GMS, BUF and PRP files"""
+        gms, buf, definitions, instructions = self.generate(geoms_count)
+        base_path: str = os.path.join(out_dir, name)
+
+        with open(f"{base_path}.GMS", "wb") as gms_file:
+            gms_file.write(gms)
+
+        with open(f"{base_path}.BUF", "wb") as buf_file:
+            buf_file.write(buf)
+
+        PRPWriter(f"{base_path}.PRP").write(flags, definitions, instructions)
+        return f"{base_path}.GMS", f"{base_path}.BUF", f"{base_path}.PRP"
+
+    def _generate_hierarchy(self, geoms_count: int) -> ([int], [int]):
+        parents: [int] = [-1]
+        depths: [int] = [0]
+
+        for geom in range(1, geoms_count):
+            parent: int = self._rng.randrange(max(0, geom - 6), geom)
+            if depths[parent] >= SceneGenerator.MAX_DEPTH:
+                parent = 0
+
+            parents.append(parent)
+            depths.append(depths[parent] + 1)
+
+        return parents, depths
+
+    def _generate_geom_table(self, geoms: [int], geom_types: [Optional[tuple]], depths: [int]) -> (bytes, bytes):
+        buf: bytearray = bytearray(b'\x00')
+        geom_bases: bytearray = bytearray()
+        table: bytearray = bytearray(struct.pack('<i', len(geoms)))
+        stats: dict = dict()
+
+        for geom in geoms:
+            type_id, geom_type = geom_types[geom]
+
+            name_offset: int = len(buf)
+            buf += f"{geom_type.name}_{geom}".encode("ascii") + b'\x00'
+
+            geom_base_offset: int = SceneGenerator.GMS_BODY_HEADER_SIZE + len(geom_bases)
+            geom_base: [int] = [0] * (SceneGenerator.GEOM_BASE_SIZE // 4)
+            geom_base[0] = name_offset
+            geom_base[5] = struct.unpack('<i', struct.pack('<I', type_id))[0]
+            geom_bases += struct.pack(f'<{len(geom_base)}i', *geom_base)
+
+            table += struct.pack('<ii', (depths[geom] << 25) | (geom_base_offset // 4), 0)
+            stats[type_id] = stats.get(type_id, 0) + 1
+
+        body: bytearray = bytearray(SceneGenerator.GMS_BODY_HEADER_SIZE) + geom_bases
+        struct.pack_into('<i', body, 0, len(body))
+        body += table
+
+        struct.pack_into('<i', body, 0x10, len(body))
+        body += struct.pack('<i', len(stats))
+        for type_id, count in sorted(stats.items()):
+            body += struct.pack('<Iii', type_id, count, 0)
+
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+        compressed: bytes = compressor.compress(bytes(body)) + compressor.flush()
+        gms: bytes = struct.pack('<iib', len(body), len(compressed), 0) + compressed
+
+        return gms, bytes(buf)
+
+    def _emit_complex(self, complex_type: Type, instructions: [PRPInstruction]):
+        chain: [Type] = []
+        while complex_type is not None:
+            chain.append(complex_type)
+            complex_type = complex_type.data.parent
+
+        for chain_type in reversed(chain):
+            for prop in chain_type.data.properties:
+                self._emit_value(prop.type_def, instructions)
+
+    def _emit_value(self, type_def: Union[Type, PRPOpCode], instructions: [PRPInstruction]):
+        if isinstance(type_def, PRPOpCode):
+            instructions.append(PRPInstruction(type_def, self._random_value(type_def)))
+            return
+
+        data = type_def.data
+        if type_def.kind == TypeKind.ENUM:
+            value: str = self._rng.choice(list(data.values))
+            instructions.append(PRPInstruction(PRPOpCode.StringOrArray_E, {'length': len(value), 'data': value}))
+        elif type_def.kind == TypeKind.ALIAS:
+            instructions.append(PRPInstruction(data.final_type, self._random_value(data.final_type)))
+        elif type_def.kind == TypeKind.ARRAY:
+            length: int = data.expected_length if data.expected_length is not None else self._rng.randrange(0, 5)
+            instructions.append(PRPInstruction(PRPOpCode.Array, {'length': length}))
+            for element_idx in range(0, length):
+                instructions.append(PRPInstruction(data.inner_op_code, self._random_value(data.inner_op_code)))
+            instructions.append(PRPInstruction.trusted(PRPOpCode.EndArray))
+        elif type_def.kind == TypeKind.CONTAINER:
+            length: int = self._rng.randrange(0, 3)
+            instructions.append(PRPInstruction(PRPOpCode.Container, {'length': length}))
+            for element_idx in range(0, length):
+                instructions.append(PRPInstruction(PRPOpCode.Int32, self._random_value(PRPOpCode.Int32)))
+        elif type_def.kind == TypeKind.RAW_DATA:
+            length: int = self._rng.randrange(0, 6)
+            instructions.append(PRPInstruction(PRPOpCode.Container, {'length': length}))
+            if length > 0:
+                data_bytes: bytes = bytes(self._rng.randrange(0, 256) for _ in range(0, length))
+                instructions.append(PRPInstruction(PRPOpCode.RawData, {'length': length, 'data': data_bytes}))
+        elif type_def.kind == TypeKind.BITFIELD:
+            masks: [str] = list(data.masks)
+            instructions.append(PRPInstruction(PRPOpCode.StringArray,
+                                               self._rng.sample(masks, self._rng.randrange(0, min(3, len(masks)) + 1))))
+        else:
+            raise RuntimeError(f"Unsupported type kind {type_def.kind}")
+
+    def _random_value(self, op_code: PRPOpCode):
+        if op_code == PRPOpCode.Bool:
+            return self._rng.random() < 0.5
+        elif op_code == PRPOpCode.Float32:
+            return self._rng.randrange(-4096, 4096) / 4.0,
+        elif op_code == PRPOpCode.Int32:
+            return self._rng.randrange(0, 1 << 16)
+        elif op_code == PRPOpCode.Int8:
+            return self._rng.randrange(0, 128)
+        elif op_code == PRPOpCode.Int16:
+            return self._rng.randrange(0, 1000)
+        elif op_code == PRPOpCode.String:
+            value: str = self._rng.choice(self._strings)
+            return {'length': len(value), 'data': value}
+
+        raise RuntimeError(f"Unsupported value op-code {op_code}")
+
+    @staticmethod
+    def _is_supported_type(type_def: Union[Type, PRPOpCode]) -> bool:
+        if isinstance(type_def, PRPOpCode):
+            return type_def in SceneGenerator.VALUE_OP_CODES
+
+        if type_def.kind == TypeKind.COMPLEX:
+            return False
+        elif type_def.kind == TypeKind.ALIAS:
+            return isinstance(type_def.data.final_type, PRPOpCode) and \
+                type_def.data.final_type in SceneGenerator.VALUE_OP_CODES
+        elif type_def.kind == TypeKind.ARRAY:
+            return type_def.data.inner_op_code in SceneGenerator.VALUE_OP_CODES
+
+        return True
+
+    @staticmethod
+    def _is_supported_complex(complex_type: Optional[Type]) -> bool:
+        while complex_type is not None:
+            if not all(SceneGenerator._is_supported_type(prop.type_def) for prop in complex_type.data.properties):
+                return False
+
+            complex_type = complex_type.data.parent
+
+        return True
@@ -0,0 +1,2 @@
+from .SceneGenerator import SceneGenerator
+from .SceneBenchmark import SceneBenchmark
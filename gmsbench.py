@@ -0,0 +1,38 @@
+import argparse
+import tempfile
+import json
+import sys
+
+from benchmarks import SceneBenchmark
+
+
+def cli_main():
+    cli_parser = argparse.ArgumentParser(description='Measure throughput of GMS/PRP tools on generated scenes')
+    cli_parser.add_argument('--tdb',       help='Path to TypesRegistry.json file', default='types/TypesRegistry.json')
+    cli_parser.add_argument('--sizes',     help='Counts of geoms in generated scenes', type=int, nargs='+',
+                                           default=[1000, 10000, 100000])
+    cli_parser.add_argument('--repeat',    help='Count of timed runs of each stage (best is reported)', type=int,
+                                           default=1)
+    cli_parser.add_argument('--seed',      help='Seed of scene generator', type=int, default=0)
+    cli_parser.add_argument('--no-memory', help='Do not measure peak memory (skips extra traced run of each stage)',
+                                           action='store_true')
+    cli_parser.add_argument('--work-dir',  help='Where to keep generated scenes (temporary directory by default)',
+                                           nargs='?', default=None)
+    cli_parser.add_argument('--out',       help='Path to JSON report (stdout by default)', nargs='?', default=None)
+    cli_args = cli_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        benchmark: SceneBenchmark = SceneBenchmark(cli_args.tdb, cli_args.work_dir or temp_dir, cli_args.repeat,
+                                                   not cli_args.no_memory, cli_args.seed)
+        results: dict = benchmark.run(cli_args.sizes)
+
+    if cli_args.out is None:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        with open(cli_args.out, "w") as out_file:
+            json.dump(results, out_file, indent=2)
+
+
+if __name__ == "__main__":
+    cli_main()
@@ -1,5 +1,6 @@
 import argparse
 import logging
+import os
 import struct
 import zlib
 
@@ -8,35 +9,82 @@ from typing import Optional
 from dataclasses import dataclass
 
 from PRP import PRPReader, PRPInstruction, PRPOpCode
-from GMS import GeomBase, GeomStat, GeomStats, GeomHeader, GeomTable, GameScene, SceneCompiler
+from GMS import GeomBase, GeomStat, GeomStats, GeomHeader, GeomTable, GameScene, SceneCompiler, \
+    SceneCompileCache, SceneBatch, SceneBatchJob, PhaseProfiler, ArtifactCache, SceneTracer
 
 
 class ToolMode(Enum):
     Compile = 'compile'
     Decompile = 'decompile'
+    Batch = 'batch'
 
     def __str__(self):
         return self.value
 
 
-def cli_decompile(gms_path: str, buf_path: str, prp_path: str, tdb_path: str, scene_file: str):
-    scene: GameScene = GameScene(gms_path, buf_path, prp_path, tdb_path)
-    if not scene.prepare():
-        raise RuntimeError(f"Failed to decompile G1 scene {gms_path}")
+def cli_decompile(gms_path: str, buf_path: str, prp_path: str, tdb_path: str, scene_file: str, streaming: bool = False,
+                  write_prp_index: bool = False, jobs: int = 1, profiler: Optional[PhaseProfiler] = None,
+                  cache: Optional[ArtifactCache] = None, tracer: Optional[SceneTracer] = None):
+    with GameScene(gms_path, buf_path, prp_path, tdb_path, streaming, write_prp_index, jobs, profiler, cache=cache,
+                   tracer=tracer) as scene:
+        if scene.restore_dump(scene_file):
+            return
+
+        if not scene.prepare():
+            raise RuntimeError(f"Failed to decompile G1 scene {gms_path}")
 
-    scene.dump(scene_file)
+        scene.dump(scene_file)
 
 
-def cli_compile(json_scene_path: str, out_prp_file_path: str, tdb_file: str):
+def cli_decompile_geom(gms_path: str, buf_path: str, prp_path: str, tdb_path: str, scene_file: str, geom: int,
+                       profiler: Optional[PhaseProfiler] = None, cache: Optional[ArtifactCache] = None,
+                       tracer: Optional[SceneTracer] = None):
     import json
 
-    with open(json_scene_path, "r") as scene_file:
+    with GameScene(gms_path, buf_path, prp_path, tdb_path, profiler=profiler, cache=cache, tracer=tracer) as scene:
+        visited_geom: Optional[dict] = scene.visit_geom(geom)
+
+    if visited_geom is None:
+        print(f"PRP file {prp_path} has no valid index. Make it by decompile with '--index' option first")
+        return
+
+    with open(scene_file, "w") as out_geom_file:
+        json.dump(visited_geom, out_geom_file, indent=2)
+
+    print(f"Geom {geom} saved to file {scene_file}")
+
+
+def cli_compile(json_scene_path: str, out_prp_file_path: str, tdb_file: str, profiler: Optional[PhaseProfiler] = None,
+                incremental: bool = False):
+    import json
+
+    profiler = profiler if profiler is not None else PhaseProfiler()
+    with profiler.phase('json.load') as phase, open(json_scene_path, "r") as scene_file:
         scene_tree = json.load(scene_file)
-        scene_compiler: SceneCompiler = SceneCompiler(scene_tree, tdb_file)
-        if scene_compiler.compile(out_prp_file_path):
-            print(f"Compile finished. PRP file: {out_prp_file_path}")
-        else:
-            print(f"Failed to compile scene {json_scene_path} to PRP file {out_prp_file_path}. See log for details")
+        phase['bytes'] = scene_file.tell()
+
+    cache_path: Optional[str] = out_prp_file_path + SceneCompileCache.FILE_EXTENSION if incremental else None
+    scene_compiler: SceneCompiler = SceneCompiler(scene_tree, tdb_file, profiler, cache_path)
+    if scene_compiler.compile(out_prp_file_path):
+        print(f"Compile finished. PRP file: {out_prp_file_path}")
+    else:
+        print(f"Failed to compile scene {json_scene_path} to PRP file {out_prp_file_path}. See log for details")
+
+
+def cli_batch(levels_path: str, tdb_file: str, batch_op: str, out_dir: Optional[str] = None, jobs: int = 1,
+              force: bool = False):
+    if os.path.isdir(levels_path):
+        if batch_op == SceneBatchJob.COMPILE and out_dir is None:
+            print("For 'compile' of levels directory '--out-dir' option is required")
+            return
+
+        batch_jobs: [SceneBatchJob] = SceneBatch.jobs_from_directory(levels_path, batch_op, out_dir)
+    else:
+        batch_jobs: [SceneBatchJob] = SceneBatch.jobs_from_manifest(levels_path)
+
+    batch: SceneBatch = SceneBatch(tdb_file, jobs, force)
+    summary: dict = batch.run(batch_jobs)
+    print(SceneBatch.report(summary))
 
 
 def cli_main():
@@ -48,10 +96,47 @@ def cli_main():
     cli_parser.add_argument('--tdb',      help='Path to TypesRegistry.json file')
     cli_parser.add_argument('--json',     help='Path to decompiled scene as JSON (decompile); '
                                                'Path to source scene to compile (compile)', nargs='?', default=None)
+    cli_parser.add_argument('--stream',   help='Decode PRP instructions while visiting scene instead of decoding '
+                                               'them all before (decompile only)', action='store_true')
+    cli_parser.add_argument('--index',    help='Save sidecar index of geoms next to PRP file (decompile only, '
+                                               'ignored with --stream)', action='store_true')
+    cli_parser.add_argument('--geom',     help='Decompile only subtree of geom with this traversal index (ROOT is 0) '
+                                               'using index of PRP file made by --index', type=int, default=None)
+    cli_parser.add_argument('--jobs',     help='Count of processes to visit top level geoms in parallel '
+                                               '(decompile, ignored with --stream); count of levels processed in '
+                                               'parallel (batch)', type=int, default=1)
+    cli_parser.add_argument('--levels',   help='Manifest JSON file or directory of levels (batch only)', nargs='?',
+                                          default=None)
+    cli_parser.add_argument('--batch-op', help='What to do with levels found in directory (batch only)',
+                                          choices=[SceneBatchJob.COMPILE, SceneBatchJob.DECOMPILE],
+                                          default=SceneBatchJob.DECOMPILE)
+    cli_parser.add_argument('--out-dir',  help='Where to save outputs of levels found in directory (batch only, '
+                                               'required for compile, next to levels by default for decompile)',
+                                          nargs='?', default=None)
+    cli_parser.add_argument('--force',    help='Process levels whose outputs are newer than inputs too (batch only)',
+                                          action='store_true')
+    cli_parser.add_argument('--incremental', help='Keep compiled entities in cache next to PRP file and compile only '
+                                                  'entities changed since last compile (compile only)',
+                                             action='store_true')
+    cli_parser.add_argument('--no-cache', help='Do not use cache of decompile artifacts (decompile only)',
+                                          action='store_true')
+    cli_parser.add_argument('--cache-dir', help='Directory of cache of decompile artifacts', nargs='?',
+                                           default=ArtifactCache.DEFAULT_DIR)
+    cli_parser.add_argument('--cache-size', help='Max size of cache of decompile artifacts in megabytes', type=int,
+                                            default=ArtifactCache.DEFAULT_MAX_SIZE >> 20)
+    cli_parser.add_argument('--trace',    help='Level of decompile messages (debug - each visited geom, trace - each '
+                                               'step of visitor)', choices=list(SceneTracer.LEVELS), default='info')
+    cli_parser.add_argument('--flight-recorder', help='Keep last N steps of visitor and report them when decompile '
+                                                      'fails (0 - disabled)', type=int, default=256)
+    cli_parser.add_argument('--profile',  help='Report wall time, CPU time and processed data of each phase',
+                                          action='store_true')
+    cli_parser.add_argument('--profile-pstats', help='With --profile: save cProfile stats of each phase to this '
+                                                     'directory as <phase>.pstats', nargs='?', default=None)
     cli_parser.add_argument('mode', help='What shall we do?', type=ToolMode, choices=list(ToolMode))
     cli_args = cli_parser.parse_args()
 
     cli_mode: ToolMode = cli_args.mode
+    profiler: PhaseProfiler = PhaseProfiler(cli_args.profile, cli_args.profile_pstats)
 
     if cli_mode == ToolMode.Decompile:
         scene_file: str = cli_args.json
@@ -80,7 +165,25 @@ def cli_main():
             print("For 'decompile' option '--json' option is required")
             return
 
-        cli_decompile(gms_path, buf_path, prp_path, tdb_path, scene_file)
+        tracer: SceneTracer = SceneTracer(SceneTracer.LEVELS[cli_args.trace], cli_args.flight_recorder)
+        cache: Optional[ArtifactCache] = ArtifactCache(cli_args.cache_dir, cli_args.cache_size << 20, tracer) \
+            if not cli_args.no_cache else None
+        if cli_args.geom is not None:
+            cli_decompile_geom(gms_path, buf_path, prp_path, tdb_path, scene_file, cli_args.geom, profiler, cache,
+                               tracer)
+        else:
+            cli_decompile(gms_path, buf_path, prp_path, tdb_path, scene_file, cli_args.stream, cli_args.index,
+                          cli_args.jobs, profiler, cache, tracer)
+    elif cli_mode == ToolMode.Batch:
+        if cli_args.levels is None:
+            print("For 'batch' operation '--levels' option is required")
+            return
+
+        if cli_args.tdb is None:
+            print("For 'batch' operation '--tdb' option is required")
+            return
+
+        cli_batch(cli_args.levels, cli_args.tdb, cli_args.batch_op, cli_args.out_dir, cli_args.jobs, cli_args.force)
     else:
         scene_file: Optional[str] = cli_args.json
         prp_file: Optional[str] = cli_args.prp
@@ -98,7 +201,10 @@ def cli_main():
             print("For 'compile' option '--tdb' option is required!")
             return
 
-        cli_compile(scene_file, prp_file, tdb_file)
+        cli_compile(scene_file, prp_file, tdb_file, profiler, cli_args.incremental)
+
+    if profiler.enabled:
+        print(profiler.report())
 
 
 if __name__ == "__main__":